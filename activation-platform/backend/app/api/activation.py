@@ -1,63 +1,197 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import platform
-from app.database import get_db
+from app.database import get_async_db, get_db
 from app.schemas import (
     ActivationCodeCreate, ActivationCodeResponse, ActivationCodeVerify,
     ActivationCodeVerifyResponse, PaymentCreate, PaymentResponse,
     HardwareBindingRequest, HardwareBindingResponse,
     HardwareVerificationRequest, HardwareVerificationResponse,
     HardwareUnbindRequest, HardwareFingerprintResponse,
+    HardwareHeartbeatRequest, HardwareHeartbeatResponse,
     UnifiedActivationRequest, UnifiedActivationResponse,
-    ActivationCodeUseRequest
+    ActivationCodeUseRequest, GenerationJobCreate, GenerationJobResponse,
+    ActivationCodeBatchVerify, ActivationCodeBatchVerifyResponse,
+    ActivationCodeBatchUse, ActivationCodeBatchUseResponse,
+    ActivationCodeActivateRequest, ActivationCodeActivateResponse,
+    LicenseTokenRefreshRequest, LicenseTokenResponse
 )
-from app.services.activation_service import ActivationCodeService
+from app.services.activation_service import ActivationCodeService, AsyncActivationCodeService
+from app.services.generation_jobs import GenerationJobService
+from app.services.code_export import EXPORT_MEDIA_TYPES, stream_code_export
+from app.services.code_cache import get_activation_code_cache
+from app.services.device_lease import get_device_lease_table
+from app.services.license_token import get_license_token_service
 from app.payment.service import PaymentService
-from app.models import ActivationCodeStatus
+from app.middleware.auth import get_current_admin_user
+from app.models import ActivationCodeStatus, GenerationJobStatus, User
 
 router = APIRouter()
 
 # 原有的激活码接口保持不变
+# 导出格式参数：csv 或 ndjson
+EXPORT_FORMAT_PATTERN = "^(csv|ndjson)$"
+
+def _export_response(export_format: str, filename: str, batch_id: str = None, product_id: str = None) -> StreamingResponse:
+    """构建流式导出响应"""
+    return StreamingResponse(
+        stream_code_export(export_format, batch_id=batch_id, product_id=product_id),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'}
+    )
+
 @router.post("/generate", response_model=List[ActivationCodeResponse])
-async def generate_activation_codes(
+def generate_activation_codes(
     request: ActivationCodeCreate,
+    export_format: Optional[str] = Query(None, alias="format", pattern=EXPORT_FORMAT_PATTERN),
     db: Session = Depends(get_db)
 ):
-    """生成激活码（软件激活码系统）"""
+    """生成激活码（软件激活码系统），指定 format 时以 CSV/NDJSON 流式返回"""
     service = ActivationCodeService(db)
+    if export_format:
+        batch_id = service.create_activation_code_batch(request)
+        return _export_response(export_format, f"activation_codes_{batch_id}", batch_id=batch_id)
+    
     activation_codes = service.create_activation_codes(request)
     return activation_codes
 
+@router.get("/export")
+def export_activation_codes(
+    batch_id: str,
+    product_id: Optional[str] = None,
+    export_format: str = Query("csv", alias="format", pattern=EXPORT_FORMAT_PATTERN),
+    admin_user: User = Depends(get_current_admin_user)
+):
+    """按批次流式导出已有激活码（code、product_id、expires_at），仅管理员可用，可再按产品筛选"""
+    return _export_response(export_format, f"activation_codes_{batch_id}", batch_id=batch_id, product_id=product_id)
+
+@router.post("/generate/jobs", response_model=GenerationJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def create_generation_job(
+    request: GenerationJobCreate,
+    db: Session = Depends(get_db),
+    admin_user: User = Depends(get_current_admin_user)
+):
+    """创建异步生成任务（大批量），立即返回任务ID，仅管理员可用"""
+    service = GenerationJobService(db)
+    job = service.create_job(request)
+    return GenerationJobResponse(**service.get_progress(job))
+
+@router.get("/generate/jobs/{job_id}", response_model=GenerationJobResponse)
+def get_generation_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    admin_user: User = Depends(get_current_admin_user)
+):
+    """查询生成任务进度，仅管理员可用"""
+    service = GenerationJobService(db)
+    job = service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="生成任务不存在")
+    return GenerationJobResponse(**service.get_progress(job))
+
+@router.get("/generate/jobs/{job_id}/download")
+def download_generation_job(
+    job_id: str,
+    export_format: str = Query("csv", alias="format", pattern=EXPORT_FORMAT_PATTERN),
+    db: Session = Depends(get_db),
+    admin_user: User = Depends(get_current_admin_user)
+):
+    """下载生成任务的激活码（CSV/NDJSON），仅管理员可用"""
+    job = GenerationJobService(db).get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="生成任务不存在")
+    if job.status != GenerationJobStatus.COMPLETED:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="生成任务尚未完成")
+    
+    return _export_response(export_format, f"activation_codes_{job_id}", batch_id=job_id)
+
+@router.post("/verify/batch", response_model=ActivationCodeBatchVerifyResponse)
+async def verify_activation_codes_batch(
+    request: ActivationCodeBatchVerify,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """批量验证激活码，结果顺序与请求一致"""
+    service = AsyncActivationCodeService(db)
+    results = await service.verify_activation_codes(request.codes)
+    return ActivationCodeBatchVerifyResponse(results=results)
+
 @router.get("/verify/{code}", response_model=ActivationCodeVerifyResponse)
 async def verify_activation_code(
     code: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """验证激活码（软件激活码系统）"""
-    service = ActivationCodeService(db)
-    result = service.verify_activation_code(ActivationCodeVerify(code=code))
+    service = AsyncActivationCodeService(db)
+    result = await service.verify_activation_code(ActivationCodeVerify(code=code))
     return ActivationCodeVerifyResponse(**result)
 
+@router.get("/cache/stats")
+async def get_verify_cache_stats():
+    """激活码验证缓存命中率统计"""
+    cache = get_activation_code_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+@router.get("/hardware/lease/stats")
+async def get_device_lease_stats():
+    """设备租约续约命中率统计"""
+    leases = get_device_lease_table()
+    if leases is None:
+        return {"enabled": False}
+    return {"enabled": True, **leases.stats()}
+
+@router.post("/activate", response_model=ActivationCodeActivateResponse)
+async def activate_activation_code(
+    request: ActivationCodeActivateRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    验证并激活（一次请求完成 /verify 和 /use）
+    校验与计数在同一条条件更新中完成，返回激活后的激活码信息和剩余激活次数
+    """
+    service = AsyncActivationCodeService(db)
+    result = await service.use_activation_code(
+        request.code,
+        request.user_id,
+        request.device_info,
+        request.ip_address
+    )
+    return ActivationCodeActivateResponse(valid=result["success"], **result)
+
+@router.post("/use/batch", response_model=ActivationCodeBatchUseResponse)
+async def use_activation_codes_batch(
+    request: ActivationCodeBatchUse,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """批量使用激活码（单个事务提交），结果顺序与请求一致，单个条目失败不影响其他条目"""
+    service = AsyncActivationCodeService(db)
+    results = await service.use_activation_codes([item.model_dump() for item in request.items])
+    return ActivationCodeBatchUseResponse(results=results)
+
 @router.post("/use/{code}")
 async def use_activation_code(
     code: str,
     user_id: str = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """使用激活码（软件激活码系统）"""
-    service = ActivationCodeService(db)
-    result = service.use_activation_code(code, user_id)
+    service = AsyncActivationCodeService(db)
+    result = await service.use_activation_code(code, user_id)
     return result
 
 @router.post("/use")
 async def use_activation_code_with_details(
     request: ActivationCodeUseRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """使用激活码（带详细信息）"""
-    service = ActivationCodeService(db)
-    result = service.use_activation_code(
+    service = AsyncActivationCodeService(db)
+    result = await service.use_activation_code(
         request.code,
         request.user_id,
         request.device_info,
@@ -68,21 +202,44 @@ async def use_activation_code_with_details(
 @router.get("/records/{code}")
 async def get_activation_records(
     code: str,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """获取激活记录"""
-    service = ActivationCodeService(db)
-    result = service.get_activation_records(code)
+    """获取激活记录（分页，传入上一页返回的 next_cursor 获取下一页）"""
+    service = AsyncActivationCodeService(db)
+    result = await service.get_activation_records(code, cursor, limit)
     return result
 
+@router.get("/license/jwks")
+async def get_license_jwks():
+    """离线许可令牌验证公钥（JWKS）"""
+    service = get_license_token_service()
+    if service is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="许可令牌未启用")
+    return service.jwks()
+
+@router.post("/license/refresh", response_model=LicenseTokenResponse)
+async def refresh_license_token(
+    request: LicenseTokenRefreshRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """刷新离线许可令牌（按激活码当前状态重新签发）"""
+    service = AsyncActivationCodeService(db)
+    result = await service.refresh_license_token(request.license_token)
+    return LicenseTokenResponse(**result)
+
 # 硬件绑定接口保持不变
 @router.post("/hardware/generate-fingerprint", response_model=HardwareFingerprintResponse)
 async def generate_hardware_fingerprint():
-    """生成硬件指纹"""
+    """生成硬件指纹（硬件信息在线程池中采集，不阻塞事件循环）"""
     from app.services.activation_service import HardwareFingerprint
+    from app.services.hardware_collector import get_hardware_collector
     from datetime import datetime
     
-    fingerprint = HardwareFingerprint.generate_hardware_fingerprint()
+    hardware_info = await run_in_threadpool(get_hardware_collector().collect)
+    fingerprint = HardwareFingerprint.fingerprint_from_info(hardware_info)
+    components = HardwareFingerprint.components_from_info(hardware_info)
     device_info = {
         "platform": platform.platform(),
         "machine": platform.machine(),
@@ -92,6 +249,7 @@ async def generate_hardware_fingerprint():
     
     return HardwareFingerprintResponse(
         fingerprint=fingerprint,
+        components=components,
         device_info=device_info,
         generated_at=datetime.utcnow()
     )
@@ -99,58 +257,73 @@ async def generate_hardware_fingerprint():
 @router.post("/hardware/bind", response_model=HardwareBindingResponse)
 async def bind_activation_code_to_hardware(
     request: HardwareBindingRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """将激活码绑定到硬件"""
-    service = ActivationCodeService(db)
-    result = service.bind_to_hardware(
+    service = AsyncActivationCodeService(db)
+    result = await service.bind_to_hardware(
         request.activation_code,
         request.hardware_fingerprint,
-        request.user_id
+        request.user_id,
+        request.hardware_components
     )
     
     return HardwareBindingResponse(
         success=result["success"],
         message=result["message"],
-        binding_info=result.get("binding_info")
+        binding_info=result.get("binding_info"),
+        license_token=result.get("license_token")
     )
 
 @router.post("/hardware/verify", response_model=HardwareVerificationResponse)
 async def verify_hardware_binding(
     request: HardwareVerificationRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """验证硬件绑定"""
-    service = ActivationCodeService(db)
-    result = service.verify_hardware_binding(
+    service = AsyncActivationCodeService(db)
+    result = await service.verify_hardware_binding(
         request.activation_code,
-        request.hardware_fingerprint
+        request.hardware_fingerprint,
+        request.hardware_components
     )
     
     return HardwareVerificationResponse(
         valid=result["valid"],
         message=result["message"],
-        binding_info=result.get("binding_info")
+        binding_info=result.get("binding_info"),
+        match_score=result.get("match_score"),
+        lease_expires_at=result.get("lease_expires_at")
     )
 
+@router.post("/hardware/heartbeat", response_model=HardwareHeartbeatResponse, response_model_exclude_none=True)
+async def hardware_heartbeat(
+    request: HardwareHeartbeatRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """批量验证硬件绑定（设备心跳），结果顺序与请求一致"""
+    service = AsyncActivationCodeService(db)
+    results = await service.verify_hardware_bindings([item.model_dump() for item in request.items])
+    return HardwareHeartbeatResponse(results=results)
+
 @router.get("/hardware/binding-info/{code}")
 async def get_hardware_binding_info(
     code: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取硬件绑定信息"""
-    service = ActivationCodeService(db)
-    result = service.get_hardware_binding_info(code)
+    service = AsyncActivationCodeService(db)
+    result = await service.get_hardware_binding_info(code)
     return result
 
 @router.post("/hardware/unbind")
 async def unbind_hardware(
     request: HardwareUnbindRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """解绑硬件（管理员功能）"""
-    service = ActivationCodeService(db)
-    result = service.unbind_hardware(
+    service = AsyncActivationCodeService(db)
+    result = await service.unbind_hardware(
         request.activation_code,
         request.admin_key
     )
@@ -160,13 +333,13 @@ async def unbind_hardware(
 @router.post("/unified/activate", response_model=UnifiedActivationResponse)
 async def unified_activation(
     request: UnifiedActivationRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     统一激活码接口
     根据产品类型自动选择激活码系统
     """
-    service = ActivationCodeService(db)
+    service = AsyncActivationCodeService(db)
     
     # 检查产品是否需要硬件绑定
     product_requires_hardware = request.product_type == "hardware_bound"
@@ -180,9 +353,10 @@ async def unified_activation(
             )
         
         # 验证硬件绑定
-        verify_result = service.verify_hardware_binding(
+        verify_result = await service.verify_hardware_binding(
             request.activation_code,
-            request.hardware_fingerprint
+            request.hardware_fingerprint,
+            request.hardware_components
         )
         
         return UnifiedActivationResponse(
@@ -194,7 +368,7 @@ async def unified_activation(
     
     else:
         # 使用软件激活码系统
-        verify_result = service.verify_activation_code(
+        verify_result = await service.verify_activation_code(
             ActivationCodeVerify(code=request.activation_code)
         )
         
@@ -208,13 +382,13 @@ async def unified_activation(
 @router.post("/unified/bind")
 async def unified_bind_activation(
     request: UnifiedActivationRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     统一绑定接口
     根据产品类型自动选择绑定方式
     """
-    service = ActivationCodeService(db)
+    service = AsyncActivationCodeService(db)
     
     # 检查产品是否需要硬件绑定
     product_requires_hardware = request.product_type == "hardware_bound"
@@ -227,22 +401,24 @@ async def unified_bind_activation(
                 detail="硬件绑定产品需要提供硬件指纹"
             )
         
-        result = service.bind_to_hardware(
+        result = await service.bind_to_hardware(
             request.activation_code,
             request.hardware_fingerprint,
-            request.user_id
+            request.user_id,
+            request.hardware_components
         )
         
         return UnifiedActivationResponse(
             success=result["success"],
             message=result["message"],
             activation_type="hardware_bound",
-            binding_info=result.get("binding_info")
+            binding_info=result.get("binding_info"),
+            license_token=result.get("license_token")
         )
     
     else:
         # 使用软件激活码
-        result = service.use_activation_code(
+        result = await service.use_activation_code(
             request.activation_code,
             request.user_id
         )
@@ -251,12 +427,13 @@ async def unified_bind_activation(
             success=result["success"],
             message=result["message"],
             activation_type="software",
-            activation_code=result.get("activation_code")
+            activation_code=result.get("activation_code"),
+            license_token=result.get("license_token")
         )
 
 # 产品管理接口
 @router.get("/products")
-async def get_products(db: Session = Depends(get_db)):
+def get_products(db: Session = Depends(get_db)):
     """获取产品列表"""
     # 这里可以返回产品配置，包括是否需要硬件绑定
     products = [
@@ -285,7 +462,7 @@ async def get_products(db: Session = Depends(get_db)):
     return products
 
 @router.get("/stats")
-async def get_activation_code_stats(
+def get_activation_code_stats(
     product_id: str = None,
     db: Session = Depends(get_db)
 ):
@@ -295,7 +472,7 @@ async def get_activation_code_stats(
     return stats
 
 @router.get("/security-info")
-async def get_activation_code_security_info(
+def get_activation_code_security_info(
     db: Session = Depends(get_db)
 ):
     """获取激活码安全信息"""
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.schemas import (
@@ -12,7 +13,7 @@ from app.models import PaymentStatus
 router = APIRouter()
 
 @router.get("/methods")
-async def get_supported_payment_methods(
+def get_supported_payment_methods(
     db: Session = Depends(get_db)
 ):
     """获取支持的支付方式"""
@@ -21,7 +22,7 @@ async def get_supported_payment_methods(
     return {"methods": methods}
 
 @router.post("/create", response_model=PaymentResponse)
-async def create_payment(
+def create_payment(
     request: PaymentCreate,
     request_client: Request,
     db: Session = Depends(get_db)
@@ -57,7 +58,7 @@ async def create_payment(
         )
 
 @router.get("/status/{payment_id}", response_model=PaymentResponse)
-async def get_payment_status(
+def get_payment_status(
     payment_id: str,
     db: Session = Depends(get_db)
 ):
@@ -105,7 +106,7 @@ async def wechat_payment_callback(
         callback_data=callback_dict
     )
     
-    result = service.handle_payment_callback(callback)
+    result = await run_in_threadpool(service.handle_payment_callback, callback)
     
     if result["success"]:
         return {"return_code": "SUCCESS", "return_msg": "OK"}
@@ -133,7 +134,7 @@ async def alipay_payment_callback(
         callback_data=callback_dict
     )
     
-    result = service.handle_payment_callback(callback)
+    result = await run_in_threadpool(service.handle_payment_callback, callback)
     
     if result["success"]:
         return "success"
@@ -141,7 +142,7 @@ async def alipay_payment_callback(
         return "fail"
 
 @router.post("/create-with-product")
-async def create_payment_with_product(
+def create_payment_with_product(
     request: PaymentCreateWithProduct,
     request_client: Request,
     db: Session = Depends(get_db)
@@ -179,7 +180,7 @@ async def create_payment_with_product(
         )
 
 @router.get("/success/{payment_id}", response_model=PaymentSuccessResponse)
-async def get_payment_success_info(
+def get_payment_success_info(
     payment_id: str,
     db: Session = Depends(get_db)
 ):
@@ -196,7 +197,7 @@ async def get_payment_success_info(
         )
 
 @router.post("/refund")
-async def refund_payment(
+def refund_payment(
     request: PaymentRefundRequest,
     db: Session = Depends(get_db)
 ):
@@ -213,7 +214,7 @@ async def refund_payment(
         )
 
 @router.get("/statistics", response_model=PaymentStatistics)
-async def get_payment_statistics(
+def get_payment_statistics(
     db: Session = Depends(get_db)
 ):
     """获取支付统计信息"""
@@ -222,7 +223,7 @@ async def get_payment_statistics(
     return PaymentStatistics(**stats)
 
 @router.get("/list")
-async def get_payment_list(
+def get_payment_list(
     skip: int = 0,
     limit: int = 100,
     status: str = None,
@@ -256,7 +257,7 @@ async def get_payment_list(
     ]
 
 @router.post("/test/mock-payment")
-async def create_mock_payment(
+def create_mock_payment(
     request: PaymentCreateWithProduct,
     request_client: Request,
     db: Session = Depends(get_db)
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.schemas import PaymentCallback
@@ -7,7 +8,7 @@ from app.payment.service import PaymentService
 router = APIRouter()
 
 @router.post("/payment/wechat")
-async def wechat_webhook(
+def wechat_webhook(
     request: dict,
     db: Session = Depends(get_db)
 ):
@@ -31,7 +32,7 @@ async def wechat_webhook(
         return {"return_code": "FAIL", "return_msg": result["message"]}
 
 @router.post("/payment/alipay")
-async def alipay_webhook(
+def alipay_webhook(
     request: dict,
     db: Session = Depends(get_db)
 ):
@@ -70,13 +71,13 @@ async def pingxx_webhook(
         "body": body.decode("utf-8", errors="ignore"),
         "headers": headers
     }
-    result = service.handle_payment_callback(callback)
+    result = await run_in_threadpool(service.handle_payment_callback, callback)
     if result.get("success"):
         return {"status": "ok"}
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=result.get("message") or "invalid signature")
 
 @router.post("/activation/notify")
-async def activation_notify(
+def activation_notify(
     request: dict,
     db: Session = Depends(get_db)
 ):
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 import os
 
 class Settings(BaseSettings):
@@ -9,9 +9,12 @@ class Settings(BaseSettings):
     APP_NAME: str = "激活码平台"
     APP_VERSION: str = "1.0.0"
     DEBUG: bool = False
+    WEB_CONCURRENCY: int = 1  # 工作进程数（uvicorn --workers、gunicorn -w 默认读取同名环境变量），大于 1 时激活码缓存和设备租约使用 Redis 共享层
     
     # 数据库配置
     DATABASE_URL: str = "sqlite:///./activation_platform.db"
+    ASYNC_DATABASE_URL: Optional[str] = None  # 异步路由使用的数据库地址，未配置时由 DATABASE_URL 换用 asyncpg/aiosqlite 驱动
+    RUN_MIGRATIONS_ON_STARTUP: bool = True  # 启动时执行数据迁移；多实例部署可关闭，改为发布时执行 python -m app.migrations
     
     # Redis 配置
     REDIS_URL: str = "redis://localhost:6379/0"
@@ -43,15 +46,90 @@ class Settings(BaseSettings):
     ACTIVATION_CODE_PREFIX: str = "ACT"
     ACTIVATION_CODE_EXPIRE_DAYS: int = 365
     ACTIVATION_CODE_SALT_KEY: str = "activation_platform_salt_2024"  # 加盐密钥
+    # 激活码校验位密钥（JSON 列表），第一个用于签发，其余仅用于验证；为空时使用 ACTIVATION_CODE_SALT_KEY
+    ACTIVATION_CODE_TAG_KEYS: List[str] = []
+    ACTIVATION_CODE_TAG_ENFORCE: bool = False  # 验证/使用时拒绝校验位不匹配的激活码（存量无校验位激活码全部过期或重新签发后再开启）
+
+    # 大批量生成配置
+    CODE_GENERATION_WORKERS: int = 0  # 生成进程数，0 表示使用全部CPU核心
+    CODE_GENERATION_CHUNK_SIZE: int = 100000  # 每个分片（进程任务）生成的激活码数量
+    CODE_BULK_INSERT_CHUNK_SIZE: int = 5000  # 批量写入时每块的行数
+    CODE_BULK_INSERT_USE_COPY: bool = True  # PostgreSQL 上使用 COPY 批量写入
+    
+    # 生成模式: random（随机生成+查重）或 permutation（节点ID+序号经密钥置换，天然唯一）
+    CODE_GENERATION_MODE: str = "random"
+    CODE_NODE_ID: int = 0  # 当前实例的节点ID（0 ~ 65535）
+    CODE_SEQUENCE_BLOCK_SIZE: int = 10000  # 每次从数据库预留的序号数量
+    CODE_PERMUTATION_KEY: Optional[str] = None  # 置换密钥，未配置时由 ACTIVATION_CODE_SALT_KEY 派生
+    
+    # 已发放激活码过滤器（布隆过滤器，随机生成模式下替代整批数据库查重）
+    CODE_FILTER_ENABLED: bool = True
+    CODE_FILTER_PATH: str = "data/issued_codes.bloom"
+    CODE_FILTER_CAPACITY: int = 10000000  # 预期容量，超出后按实际数量的2倍重建
+    CODE_FILTER_ERROR_RATE: float = 0.001  # 误判率
+    CODE_FILTER_SAVE_EVERY: int = 10000  # 累计新增多少个激活码后持久化一次
+    
+    # 激活码验证缓存（进程内 LRU/TTL，可选 Redis 共享缓存，地址使用 REDIS_URL）
+    CODE_CACHE_ENABLED: bool = True
+    CODE_CACHE_MAX_ENTRIES: int = 100000
+    CODE_CACHE_TTL: float = 60.0  # 进程内缓存存活时间（秒）
+    CODE_CACHE_SHARED: bool = False  # 是否启用 Redis 共享缓存（WEB_CONCURRENCY 大于 1 时总是启用）
+    CODE_CACHE_SHARED_TTL: int = 300  # 共享缓存存活时间（秒）
+    
+    # 预生成激活码池配置（支付时直接领取，不在请求路径上生成激活码）
+    CODE_POOL_ENABLED: bool = True
+    CODE_POOL_LOW_WATER: int = 100  # 池内数量低于该值时补充
+    CODE_POOL_REFILL_SIZE: int = 500  # 每次补充到 低水位 + 该数量
+    CODE_POOL_REFILL_INTERVAL: float = 10.0  # 后台补充检查间隔（秒）
+    
+    # 过期激活码清扫（后台线程按批将已过期的未使用激活码标记为 EXPIRED）
+    EXPIRY_SWEEP_ENABLED: bool = True
+    EXPIRY_SWEEP_INTERVAL: float = 60.0  # 清扫间隔（秒）
+    EXPIRY_SWEEP_BATCH_SIZE: int = 1000  # 每条 UPDATE 最多标记的激活码数量
+    
+    # 异步生成任务配置
+    CELERY_BROKER_URL: Optional[str] = None  # 未配置时使用进程内执行器
+    GENERATION_JOB_LOCAL_WORKERS: int = 1  # 进程内执行器的并发任务数
+    GENERATION_JOB_MAX_QUANTITY: int = 20000000  # 单个任务最大生成数量
+    GENERATION_JOB_STALE_SECONDS: int = 600  # 运行中任务超过该时长未更新进度时视为已中断
+
+    # 离线许可令牌（ES256 签名，客户端使用 /license/jwks 公布的公钥在本地验证）
+    LICENSE_TOKEN_ENABLED: bool = True
+    LICENSE_TOKEN_PRIVATE_KEY: Optional[str] = None  # PEM 私钥，未配置时使用密钥文件
+    LICENSE_TOKEN_KEY_PATH: str = "data/license_token_key.pem"  # 密钥文件，仅 DEBUG 模式下不存在时自动生成
+    LICENSE_TOKEN_PREVIOUS_PUBLIC_KEYS: List[str] = []  # 轮换前的 PEM 公钥，继续在 JWKS 中公布
+    LICENSE_TOKEN_ISSUER: str = "activation-platform"
+    LICENSE_TOKEN_TTL: int = 2592000  # 令牌有效期（秒），不晚于激活码过期时间
+    LICENSE_TOKEN_REFRESH_INTERVAL: int = 86400  # 建议客户端刷新令牌的间隔（秒）
+    
+    # 批量接口配置
+    VERIFY_BATCH_MAX_CODES: int = 5000  # 单次批量验证的最大激活码数量
+    USE_BATCH_MAX_ITEMS: int = 1000  # 单次批量激活的最大条目数量
+    HEARTBEAT_BATCH_MAX_ITEMS: int = 5000  # 单次硬件心跳的最大设备数量
     
     # 安全配置
-    MAX_ACTIVATION_ATTEMPTS: int = 5
-    RATE_LIMIT_PER_MINUTE: int = 60
+    MAX_ACTIVATION_ATTEMPTS: int = 5  # 每个客户端IP对同一激活码每分钟最多失败次数
+    RATE_LIMIT_PER_MINUTE: int = 60  # 每个客户端IP每分钟最多请求次数（激活相关接口）
+    
+    # 限流配置（滑动窗口，进程内计数，可选 Redis 共享计数，地址使用 REDIS_URL）
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_SHARED: bool = False  # 是否启用 Redis 共享计数
+    RATE_LIMIT_MAX_KEYS: int = 100000  # 进程内最多保存的计数键数量
+    CODE_LOCKOUT_SECONDS: int = 300  # 超过失败次数后该客户端对激活码的锁定时间（秒）
     
     # 硬件绑定配置
     ENABLE_HARDWARE_BINDING: bool = True
     ADMIN_UNBIND_KEY: str = "admin_unbind_key_2024"  # 管理员解绑密钥
     HARDWARE_TOLERANCE: float = 0.8  # 硬件指纹相似度容忍度
+    HARDWARE_PROBE_TIMEOUT: float = 2.0  # 硬件信息采集超时（秒），超时的采集项使用默认值
+    HARDWARE_CACHE_TTL: float = 300.0  # 稳定硬件信息（磁盘、主板、MAC 等）缓存时间（秒）
+    
+    # 设备租约（硬件验证通过后发放租约，有效期内的续约在内存中应答，可选 Redis 共享租约表，地址使用 REDIS_URL）
+    DEVICE_LEASE_ENABLED: bool = True
+    DEVICE_LEASE_TTL: int = 300  # 每次续约后的租约有效期（秒）
+    DEVICE_LEASE_MAX_AGE: int = 3600  # 发放后最长可续约时间（秒），之后重新查询数据库验证
+    DEVICE_LEASE_MAX_ENTRIES: int = 100000
+    DEVICE_LEASE_SHARED: bool = False  # 是否启用 Redis 共享租约表（WEB_CONCURRENCY 大于 1 时总是启用）
     
     # 日志配置
     LOG_LEVEL: str = "INFO"
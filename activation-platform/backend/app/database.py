@@ -1,8 +1,28 @@
-from sqlalchemy import create_engine
+import threading
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
 
+# 同步数据库对应的异步驱动
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def get_async_database_url() -> str:
+    """异步数据库地址：优先使用 ASYNC_DATABASE_URL，否则将 DATABASE_URL 的驱动替换为异步驱动"""
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    
+    url = make_url(settings.DATABASE_URL)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise Exception(f"不支持异步访问的数据库: {url.get_backend_name()}")
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
 # 创建数据库引擎
 engine = create_engine(
     settings.DATABASE_URL,
@@ -14,6 +34,37 @@ engine = create_engine(
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 异步数据库引擎和会话工厂（asyncpg / aiosqlite），供异步路由使用，查询期间不阻塞事件循环；
+# 首次使用时才创建，数据库不支持异步驱动时只影响异步路由，不影响应用导入和同步路由
+_async_engine = None
+_async_session_factory = None
+_async_engine_lock = threading.Lock()
+
+def get_async_engine():
+    """获取异步数据库引擎，首次调用时创建"""
+    global _async_engine, _async_session_factory
+    with _async_engine_lock:
+        if _async_engine is None:
+            engine = create_async_engine(
+                get_async_database_url(),
+                echo=settings.DEBUG,
+                pool_pre_ping=True,
+                pool_recycle=300
+            )
+            _async_session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+            _async_engine = engine
+        return _async_engine
+
+def AsyncSessionLocal() -> AsyncSession:
+    """创建异步数据库会话（与 SessionLocal 用法相同）"""
+    get_async_engine()
+    return _async_session_factory()
+
+async def dispose_async_engine():
+    """关闭异步数据库连接池（未创建时不做任何事）"""
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
 # 创建基础模型类
 Base = declarative_base()
 
@@ -25,4 +76,30 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """获取异步数据库会话"""
+    async with AsyncSessionLocal() as db:
+        yield db
 
+def init_db():
+    """
+    初始化数据库
+    创建缺失的数据表，并为已有数据表补齐新增的可空列和索引
+    """
+    import app.models  # 确保所有模型已注册到 Base.metadata
+    
+    Base.metadata.create_all(bind=engine)
+    
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns and column.nullable:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(conn)
@@ -3,14 +3,21 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
 import uvicorn
 from app.config import settings
-from app.database import engine, Base
+from app.database import dispose_async_engine, init_db
+from app.migrations import run_migrations
 from app.api import activation, payment, webhook
 from app.api import auth, admin
 from app.middleware.auth import get_current_user
 from app.middleware.cors import setup_cors
+from app.middleware.rate_limit import setup_rate_limit
+from app.services.code_filter import get_issued_code_filter
+from app.services.license_token import get_license_token_service
+from app.services.code_pool import get_code_pool_refiller
+from app.services.expiry_sweeper import get_expiry_sweeper
+from app.services.generation_jobs import recover_generation_jobs
 
 # 创建数据库表
-Base.metadata.create_all(bind=engine)
+init_db()
 
 # 创建 FastAPI 应用
 app = FastAPI(
@@ -21,6 +28,9 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# 设置限流（先添加，位于 CORS 内层，429 响应同样带有 CORS 头）
+setup_rate_limit(app)
+
 # 设置 CORS
 setup_cors(app)
 
@@ -58,6 +68,63 @@ app.include_router(
     tags=["管理后台"]
 )
 
+@app.on_event("startup")
+def run_data_migrations():
+    """启动时执行数据迁移，多个工作进程同时启动时只有一个执行"""
+    if settings.RUN_MIGRATIONS_ON_STARTUP:
+        run_migrations()
+
+@app.on_event("startup")
+def start_code_pool_refiller():
+    """启动激活码池后台补充线程"""
+    if settings.CODE_POOL_ENABLED:
+        get_code_pool_refiller().start()
+
+@app.on_event("shutdown")
+def stop_code_pool_refiller():
+    """停止激活码池后台补充线程"""
+    get_code_pool_refiller().stop()
+
+@app.on_event("startup")
+def recover_interrupted_generation_jobs():
+    """恢复上次运行时中断的生成任务"""
+    recover_generation_jobs()
+
+@app.on_event("startup")
+def start_expiry_sweeper():
+    """启动过期激活码后台清扫线程"""
+    if settings.EXPIRY_SWEEP_ENABLED:
+        get_expiry_sweeper().start()
+
+@app.on_event("shutdown")
+def stop_expiry_sweeper():
+    """停止过期激活码后台清扫线程"""
+    get_expiry_sweeper().stop()
+
+@app.on_event("startup")
+def load_license_token_key():
+    """启动时加载许可令牌签名私钥，生产环境未配置私钥时记录警告并不签发令牌"""
+    get_license_token_service()
+
+@app.on_event("startup")
+def load_issued_code_filter():
+    """启动时在后台加载已发放激活码过滤器"""
+    code_filter = get_issued_code_filter()
+    if code_filter is not None:
+        code_filter.start()
+
+@app.on_event("shutdown")
+def save_issued_code_filter():
+    """关闭时持久化已发放激活码过滤器"""
+    code_filter = get_issued_code_filter()
+    if code_filter is not None:
+        code_filter.save()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    """关闭异步数据库连接池"""
+    await dispose_async_engine()
+
 @app.get("/")
 async def root():
     """根路径健康检查"""
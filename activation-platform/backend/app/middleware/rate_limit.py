@@ -0,0 +1,199 @@
+import json
+import re
+from fastapi import FastAPI
+from starlette.responses import JSONResponse
+from app.services.rate_limit import get_rate_limiter, retry_after_header
+
+ACTIVATION_PREFIX = "/api/v1/activation"
+
+# 激活码在路径中的接口：/verify/{code}、/use/{code}、/records/{code}
+PATH_CODE_PATTERN = re.compile(rf"^{ACTIVATION_PREFIX}/(?:verify|use|records)/(?P<code>[^/]+)$")
+
+# 激活码在 JSON 请求体中的接口（字段 code 或 activation_code）
+BODY_CODE_PATHS = {
+    f"{ACTIVATION_PREFIX}/use",
+    f"{ACTIVATION_PREFIX}/activate",
+    f"{ACTIVATION_PREFIX}/unified/activate",
+    f"{ACTIVATION_PREFIX}/unified/bind",
+    f"{ACTIVATION_PREFIX}/hardware/bind",
+    f"{ACTIVATION_PREFIX}/hardware/verify",
+}
+
+# 只按客户端IP限流的接口
+CLIENT_ONLY_PATHS = {
+    f"{ACTIVATION_PREFIX}/verify/batch",
+    f"{ACTIVATION_PREFIX}/use/batch",
+    f"{ACTIVATION_PREFIX}/hardware/heartbeat",
+}
+
+# 读取请求体提取激活码、读取响应体判断尝试是否失败的最大字节数，超出时停止读取
+MAX_INSPECTED_BODY = 4 * 1024
+
+
+class _AttemptOutcome:
+    """记录响应状态码和 JSON 响应体，判断一次激活码尝试是否失败"""
+
+    def __init__(self, send):
+        self._send = send
+        self.status = None
+        self._json = False
+        self._body = bytearray()
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+            self._json = any(
+                name == b"content-type" and value.startswith(b"application/json")
+                for name, value in message.get("headers", ())
+            )
+        elif message["type"] == "http.response.body" and self._json and len(self._body) <= MAX_INSPECTED_BODY:
+            self._body += message.get("body", b"")
+        await self._send(message)
+
+    @property
+    def failed(self) -> bool:
+        """错误状态码，或响应体中 success / valid 为 false"""
+        if self.status is None:
+            return False
+        if self.status >= 400:
+            return True
+        if not self._json or len(self._body) > MAX_INSPECTED_BODY:
+            return False
+        try:
+            data = json.loads(self._body)
+        except ValueError:
+            return False
+        return isinstance(data, dict) and (data.get("success") is False or data.get("valid") is False)
+
+
+class RateLimitMiddleware:
+    """
+    激活相关接口限流中间件（ASGI）
+
+    在路由和依赖注入之前执行，超限请求直接返回 429 和 Retry-After，
+    不会从 get_db 打开数据库会话。带激活码的请求处理完成后检查响应，失败的尝试才计入该客户端对激活码的锁定计数。
+    客户端IP取自连接地址，部署在反向代理之后时应由 uvicorn --proxy-headers 处理 X-Forwarded-For。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        limiter = get_rate_limiter()
+        path = scope.get("path", "") if scope["type"] == "http" else ""
+        if limiter is None or not path.startswith(ACTIVATION_PREFIX):
+            await self.app(scope, receive, send)
+            return
+
+        path_match = PATH_CODE_PATTERN.match(path)
+        guarded = (
+            path in CLIENT_ONLY_PATHS
+            or path in BODY_CODE_PATHS
+            or (path_match is not None and path_match.group("code") != "batch")
+        )
+        if not guarded:
+            await self.app(scope, receive, send)
+            return
+
+        client_ip = scope["client"][0] if scope.get("client") else "unknown"
+        retry_after = await limiter.check_client(client_ip)
+        if retry_after:
+            await self._reject(scope, receive, send, retry_after, "请求过于频繁，请稍后再试")
+            return
+
+        code = None
+        if path in BODY_CODE_PATHS:
+            if scope["method"] == "POST" and not self._oversized(scope):
+                body, receive = await self._buffer_body(receive)
+                code = self._code_from_body(body)
+        elif path not in CLIENT_ONLY_PATHS:
+            code = path_match.group("code")
+
+        if not code:
+            await self.app(scope, receive, send)
+            return
+
+        retry_after = await limiter.code_locked(code, client_ip)
+        if retry_after:
+            await self._reject(scope, receive, send, retry_after, "该激活码尝试次数过多，已暂时锁定")
+            return
+
+        outcome = _AttemptOutcome(send)
+        await self.app(scope, receive, outcome.send)
+        if outcome.failed:
+            await limiter.record_code_failure(code, client_ip)
+
+    @staticmethod
+    def _oversized(scope) -> bool:
+        """Content-Length 超出检查上限时不读取请求体"""
+        for name, value in scope.get("headers", ()):
+            if name == b"content-length":
+                try:
+                    return int(value) > MAX_INSPECTED_BODY
+                except ValueError:
+                    return False
+        return False
+
+    @staticmethod
+    async def _buffer_body(receive):
+        """
+        读取请求体，最多读取 MAX_INSPECTED_BODY 字节
+
+        Returns:
+            请求体（超出上限或客户端已断开时为空）和可供后续处理重放的 receive；
+            超出上限时已读取的消息先重放，其余部分由后续处理继续从原 receive 读取
+        """
+        messages = []
+        size = 0
+        complete = False
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                # 客户端已断开，交给后续处理
+                break
+            size += len(message.get("body", b""))
+            if size > MAX_INSPECTED_BODY:
+                break
+            if not message.get("more_body", False):
+                complete = True
+                break
+
+        body = b"".join(message.get("body", b"") for message in messages) if complete else b""
+        if complete:
+            messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+        async def replay():
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        return body, replay
+
+    @staticmethod
+    def _code_from_body(body: bytes):
+        """从 JSON 请求体中提取激活码"""
+        if not body:
+            return None
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return None
+        if not isinstance(data, dict):
+            return None
+        code = data.get("code") or data.get("activation_code")
+        return code if isinstance(code, str) else None
+
+    @staticmethod
+    async def _reject(scope, receive, send, retry_after: float, detail: str):
+        response = JSONResponse(
+            status_code=429,
+            content={"detail": detail},
+            headers={"Retry-After": retry_after_header(retry_after)}
+        )
+        await response(scope, receive, send)
+
+
+def setup_rate_limit(app: FastAPI):
+    """设置限流中间件"""
+    app.add_middleware(RateLimitMiddleware)
@@ -0,0 +1,318 @@
+"""
+数据迁移
+
+多实例部署时关闭 RUN_MIGRATIONS_ON_STARTUP，在发布时执行一次:
+    python -m app.migrations
+"""
+import json
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import delete, insert, select, text, update
+from app.config import settings
+from app.database import SessionLocal, engine
+from app.models import ActivationCode, ActivationEvent, DataMigration, HardwareBinding, HardwareBindingSignature
+
+
+# 数据迁移咨询锁的键
+MIGRATION_LOCK_KEY = 7201301
+
+
+def _parse_activation_time(value: Any, default: Optional[datetime]) -> datetime:
+    """解析旧激活记录中的激活时间，缺失或格式错误时使用激活码的使用时间"""
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return default or datetime.utcnow()
+
+
+def _events_from_blob(code_id: int, blob: str, default_time: Optional[datetime]) -> List[Dict[str, Any]]:
+    """将旧的激活记录JSON转换为激活事件行，无法解析的记录被跳过"""
+    try:
+        records = json.loads(blob)
+    except ValueError:
+        return []
+    if not isinstance(records, list):
+        return []
+
+    events = []
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        device_info = record.get("device_info")
+        events.append({
+            "activation_code_id": code_id,
+            "user_id": record.get("user_id"),
+            "ip_address": record.get("ip_address"),
+            "device_info": json.dumps(device_info) if device_info is not None else None,
+            "created_at": _parse_activation_time(record.get("activation_time"), default_time),
+        })
+    return events
+
+
+def migrate_activation_records(batch_size: int = 1000) -> int:
+    """
+    将 activation_codes.activation_records 中的JSON记录迁移到 activation_events
+
+    按主键键集分批流式读取仍有旧记录的激活码，每批写入事件并清空旧字段后提交，
+    内存占用与数据总量无关；中断后重新执行会从剩余的激活码继续。旧字段以条件更新清空，
+    只为本事务实际清空的激活码写入事件，并发执行时不会重复迁移。
+    全部完成后记录到 data_migrations，之后启动不再扫描。
+
+    Args:
+        batch_size: 每批处理的激活码数量
+
+    Returns:
+        迁移的激活事件数量
+    """
+    name = "activation_records_to_events"
+    table = ActivationCode.__table__
+    migrated = 0
+    last_id = 0
+    db = SessionLocal()
+    try:
+        if db.get(DataMigration, name) is not None:
+            return 0
+
+        while True:
+            rows = db.execute(
+                select(ActivationCode.id, ActivationCode.activation_records, ActivationCode.used_at)
+                .where(ActivationCode.id > last_id, ActivationCode.activation_records.isnot(None))
+                .order_by(ActivationCode.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            events = []
+            for row in rows:
+                cleared = db.execute(
+                    update(table)
+                    .where(table.c.id == row.id, table.c.activation_records.isnot(None))
+                    .values(activation_records=None)
+                ).rowcount
+                if cleared:
+                    events.extend(_events_from_blob(row.id, row.activation_records, row.used_at))
+
+            if events:
+                db.execute(insert(ActivationEvent.__table__), events)
+            db.commit()
+            migrated += len(events)
+
+        db.add(DataMigration(name=name, completed_at=datetime.utcnow()))
+        db.commit()
+    finally:
+        db.close()
+
+    return migrated
+
+
+def _binding_from_metadata(code_id: int, blob: str, default_time: Optional[datetime]) -> Optional[Dict[str, Any]]:
+    """从激活码 metadata_json 中提取旧的硬件绑定，没有绑定或无法解析时返回 None"""
+    try:
+        metadata = json.loads(blob)
+    except ValueError:
+        return None
+    if not isinstance(metadata, dict):
+        return None
+
+    fingerprint = metadata.get("hardware_fingerprint")
+    if not isinstance(fingerprint, str) or not fingerprint:
+        return None
+    return {
+        "activation_code_id": code_id,
+        "hardware_fingerprint": fingerprint,
+        "user_id": metadata.get("user_id"),
+        "created_at": _parse_activation_time(metadata.get("binding_time"), default_time),
+    }
+
+
+def backfill_hardware_bindings(batch_size: int = 1000) -> int:
+    """
+    将 activation_codes.metadata_json 中的硬件绑定回填到 hardware_bindings
+
+    按主键键集分批流式读取带有 metadata_json 的激活码，每批提交一次。已有绑定记录的激活码被跳过，
+    中断后重新执行不会重复写入；旧数据中同一硬件指纹绑定了多个激活码时保留ID最小的一条。
+    全部完成后记录到 data_migrations，之后启动不再扫描。
+
+    Args:
+        batch_size: 每批处理的激活码数量
+
+    Returns:
+        回填的绑定数量
+    """
+    name = "backfill_hardware_bindings"
+    backfilled = 0
+    skipped = 0
+    last_id = 0
+    db = SessionLocal()
+    try:
+        if db.get(DataMigration, name) is not None:
+            return 0
+
+        while True:
+            rows = db.execute(
+                select(ActivationCode.id, ActivationCode.metadata_json, ActivationCode.used_at)
+                .where(ActivationCode.id > last_id, ActivationCode.metadata_json.isnot(None))
+                .order_by(ActivationCode.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            bindings = {}
+            for row in rows:
+                binding = _binding_from_metadata(row.id, row.metadata_json, row.used_at)
+                if binding is None:
+                    continue
+                if binding["hardware_fingerprint"] in bindings:
+                    skipped += 1
+                    continue
+                bindings[binding["hardware_fingerprint"]] = binding
+            if not bindings:
+                continue
+
+            bound_codes = set(db.execute(
+                select(HardwareBinding.activation_code_id)
+                .where(HardwareBinding.activation_code_id.in_([binding["activation_code_id"] for binding in bindings.values()]))
+            ).scalars())
+            bound_fingerprints = set(db.execute(
+                select(HardwareBinding.hardware_fingerprint)
+                .where(HardwareBinding.hardware_fingerprint.in_(list(bindings)))
+            ).scalars())
+
+            new_bindings = []
+            for fingerprint, binding in bindings.items():
+                if binding["activation_code_id"] in bound_codes:
+                    continue
+                if fingerprint in bound_fingerprints:
+                    skipped += 1
+                    continue
+                new_bindings.append(binding)
+
+            if new_bindings:
+                db.execute(insert(HardwareBinding.__table__), new_bindings)
+            db.commit()
+            backfilled += len(new_bindings)
+
+        db.add(DataMigration(name=name, completed_at=datetime.utcnow()))
+        db.commit()
+    finally:
+        db.close()
+
+    if skipped:
+        print(f"硬件绑定回填跳过 {skipped} 个重复的硬件指纹")
+    return backfilled
+
+
+def rebuild_hardware_signatures(batch_size: int = 1000) -> int:
+    """
+    按当前 HARDWARE_TOLERANCE 重建 hardware_binding_signatures
+
+    签名的组件子集大小由容差决定，调整容差后旧签名无法命中。完成后以 "hardware_signatures:<容差>"
+    记录到 data_migrations，容差不变时启动不再扫描。
+
+    Args:
+        batch_size: 每批处理的绑定数量
+
+    Returns:
+        重建签名的绑定数量
+    """
+    from app.services.activation_service import HardwareFingerprint
+
+    tolerance = settings.HARDWARE_TOLERANCE
+    name = f"hardware_signatures:{tolerance}"
+    rebuilt = 0
+    last_id = 0
+    db = SessionLocal()
+    try:
+        if db.get(DataMigration, name) is not None:
+            return 0
+
+        db.execute(delete(HardwareBindingSignature.__table__))
+        while True:
+            rows = db.execute(
+                select(HardwareBinding.id, HardwareBinding.component_hashes)
+                .where(HardwareBinding.id > last_id, HardwareBinding.component_hashes.isnot(None))
+                .order_by(HardwareBinding.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            signatures = []
+            for row in rows:
+                try:
+                    components = json.loads(row.component_hashes)
+                except ValueError:
+                    continue
+                if not isinstance(components, dict):
+                    continue
+                signatures.extend(
+                    {"binding_id": row.id, "signature": signature}
+                    for signature in HardwareFingerprint.binding_signatures(components, tolerance)
+                )
+                rebuilt += 1
+
+            if signatures:
+                db.execute(insert(HardwareBindingSignature.__table__), signatures)
+            db.commit()
+
+        db.execute(delete(DataMigration.__table__).where(DataMigration.name.like("hardware_signatures:%")))
+        db.add(DataMigration(name=name, completed_at=datetime.utcnow()))
+        db.commit()
+    finally:
+        db.close()
+
+    return rebuilt
+
+
+@contextmanager
+def _migration_lock():
+    """
+    迁移互斥锁：PostgreSQL 上使用会话级咨询锁，多个进程同时启动时依次执行，
+    后执行的进程看到完成标记后直接返回；其他数据库不加锁
+    """
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            yield
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+
+def run_migrations() -> None:
+    """执行全部数据迁移，多个进程同时调用时依次执行"""
+    with _migration_lock():
+        _run_migrations()
+
+
+def _run_migrations() -> None:
+    """依次执行各项数据迁移，已完成的迁移由 data_migrations 标记跳过"""
+    migrated = migrate_activation_records()
+    if migrated:
+        print(f"已迁移 {migrated} 条激活记录到 activation_events")
+
+    backfilled = backfill_hardware_bindings()
+    if backfilled:
+        print(f"已回填 {backfilled} 条硬件绑定到 hardware_bindings")
+
+    rebuilt = rebuild_hardware_signatures()
+    if rebuilt:
+        print(f"已按容差 {settings.HARDWARE_TOLERANCE} 重建 {rebuilt} 个硬件绑定的相似度签名")
+
+
+if __name__ == "__main__":
+    from app.database import init_db
+
+    init_db()
+    run_migrations()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, Text, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.types import DECIMAL as Decimal
@@ -12,6 +12,13 @@ class ActivationCodeStatus(enum.Enum):
     EXPIRED = "expired"   # 已过期
     DISABLED = "disabled" # 已禁用
 
+class GenerationJobStatus(enum.Enum):
+    """生成任务状态枚举"""
+    PENDING = "pending"     # 等待执行
+    RUNNING = "running"     # 执行中
+    COMPLETED = "completed" # 已完成
+    FAILED = "failed"       # 执行失败
+
 class PaymentStatus(enum.Enum):
     """支付状态枚举"""
     PENDING = "pending"   # 待支付
@@ -43,13 +50,22 @@ class ActivationCode(Base):
     # 激活次数相关字段
     max_activations = Column(Integer, default=1, nullable=False)  # 最大激活次数
     current_activations = Column(Integer, default=0, nullable=False)  # 当前激活次数
-    activation_records = Column(Text, nullable=True)  # 激活记录JSON
+    activation_records = Column(Text, nullable=True)  # 激活记录JSON（已迁移到 activation_events，仅保留兼容）
+    batch_id = Column(String(36), nullable=True, index=True)  # 生成批次ID
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     
     # 关联支付记录
     payments = relationship("Payment", back_populates="activation_code")
 
+# 过期时间索引：只包含设置了过期时间的未使用激活码（部分索引），过期清扫和统计按该索引定位，不扫描全表
+Index(
+    "ix_activation_codes_expires_at",
+    ActivationCode.expires_at,
+    postgresql_where=(ActivationCode.status == ActivationCodeStatus.UNUSED) & ActivationCode.expires_at.isnot(None),
+    sqlite_where=(ActivationCode.status == ActivationCodeStatus.UNUSED) & ActivationCode.expires_at.isnot(None)
+)
+
 class Payment(Base):
     """支付记录模型"""
     __tablename__ = "payments"
@@ -96,3 +112,76 @@ class Product(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+class GenerationJob(Base):
+    """激活码生成任务模型"""
+    __tablename__ = "generation_jobs"
+    
+    id = Column(String(36), primary_key=True)  # 任务ID，同时作为激活码批次ID
+    status = Column(Enum(GenerationJobStatus), default=GenerationJobStatus.PENDING, nullable=False)
+    product_id = Column(String(50), nullable=False, index=True)
+    quantity = Column(Integer, nullable=False)  # 计划生成数量
+    rows_written = Column(Integer, default=0, nullable=False)  # 已写入数量
+    request_json = Column(Text, nullable=False)  # 生成请求参数JSON
+    error = Column(Text, nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+class CodeSequence(Base):
+    """激活码序号分配表（置换生成模式下每个节点一行）"""
+    __tablename__ = "code_sequences"
+    
+    node_id = Column(Integer, primary_key=True)
+    next_value = Column(BigInteger, default=0, nullable=False)  # 下一个未分配的序号
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+class ActivationCodePool(Base):
+    """预生成激活码池（每个产品一组已写入、未发放的激活码，支付时直接领取）"""
+    __tablename__ = "activation_code_pool"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(String(50), nullable=False, index=True)
+    activation_code_id = Column(Integer, ForeignKey("activation_codes.id"), unique=True, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+
+class ActivationEvent(Base):
+    """激活事件（只追加，每次激活一行）"""
+    __tablename__ = "activation_events"
+    __table_args__ = (
+        Index("ix_activation_events_code_created", "activation_code_id", "created_at"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    activation_code_id = Column(Integer, ForeignKey("activation_codes.id"), nullable=False)
+    user_id = Column(String(100), nullable=True)
+    ip_address = Column(String(64), nullable=True)
+    device_info = Column(Text, nullable=True)  # 设备信息JSON
+    created_at = Column(DateTime, nullable=False)  # 激活时间
+
+class HardwareBinding(Base):
+    """硬件绑定（每个激活码最多绑定一台设备，每台设备最多绑定一个激活码）"""
+    __tablename__ = "hardware_bindings"
+    
+    id = Column(Integer, primary_key=True)
+    activation_code_id = Column(Integer, ForeignKey("activation_codes.id"), unique=True, index=True, nullable=False)
+    hardware_fingerprint = Column(String(64), unique=True, index=True, nullable=False)
+    component_hashes = Column(Text, nullable=True)  # 各硬件组件哈希JSON（cpu/memory/disk/mac/board），用于容差匹配
+    user_id = Column(String(100), nullable=True)
+    created_at = Column(DateTime, nullable=False)  # 绑定时间
+
+class HardwareBindingSignature(Base):
+    """硬件绑定相似度签名（组件子集哈希的倒排索引，用于查找容差范围内的已绑定设备）"""
+    __tablename__ = "hardware_binding_signatures"
+    
+    id = Column(Integer, primary_key=True)
+    binding_id = Column(Integer, ForeignKey("hardware_bindings.id"), nullable=False, index=True)
+    signature = Column(String(64), nullable=False, index=True)
+
+class DataMigration(Base):
+    """已完成的一次性数据迁移"""
+    __tablename__ = "data_migrations"
+    
+    name = Column(String(100), primary_key=True)
+    completed_at = Column(DateTime, nullable=False)
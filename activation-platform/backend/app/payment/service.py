@@ -2,6 +2,7 @@ from typing import Dict, Any, List
 from sqlalchemy.orm import Session
 from datetime import datetime
 
+from app.services.code_pool import CodePoolService
 from .manager import PaymentManager
 from . import PaymentMethod
 
@@ -59,12 +60,27 @@ class PaymentService:
     amount = float(kwargs.get("price", 0))
     description = kwargs.get("product_name") or "Activation"
     client_ip = kwargs.get("client_ip", "127.0.0.1")
+
+    # 从预生成激活码池领取，下单路径上不做生成和查重
+    pool = CodePoolService(self.db)
+    product_id = kwargs.get("product_id")
+    activation_code = pool.issue(
+      product_id=product_id,
+      product_name=description,
+      price=amount,
+      currency=kwargs.get("currency", "CNY"),
+      max_activations=kwargs.get("max_activations", 1),
+    )
+
     result = self.manager.create_payment(method, amount, description, client_ip)
+    if not result.success:
+      pool.release(product_id, activation_code["id"])
     return {
       "success": result.success,
+      "message": result.message,
       "payment_id": result.payment_id,
-      "activation_code_id": kwargs.get("activation_code_id", 1),
-      "activation_code": kwargs.get("activation_code", ""),
+      "activation_code_id": activation_code["id"],
+      "activation_code": activation_code["code"],
       "payment_url": result.payment_url,
       "qr_code": result.qr_code,
       "amount": result.amount or amount,
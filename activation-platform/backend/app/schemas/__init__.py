@@ -2,7 +2,8 @@ from pydantic import BaseModel, Field, validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from decimal import Decimal
-from app.models import ActivationCodeStatus, PaymentStatus, PaymentMethod
+from app.models import ActivationCodeStatus, PaymentStatus, PaymentMethod, GenerationJobStatus
+from app.config import settings
 
 class ActivationCodeBase(BaseModel):
     """激活码基础模式"""
@@ -27,12 +28,32 @@ class ActivationCodeResponse(ActivationCodeBase):
     used_by: Optional[str]
     current_activations: int = 0
     activation_records: Optional[str] = None
+    batch_id: Optional[str] = None
     created_at: datetime
     updated_at: datetime
     
     class Config:
         from_attributes = True
 
+class GenerationJobCreate(ActivationCodeBase):
+    """创建激活码生成任务请求"""
+    quantity: int = Field(..., ge=1, le=settings.GENERATION_JOB_MAX_QUANTITY, description="生成数量")
+
+class GenerationJobResponse(BaseModel):
+    """激活码生成任务响应"""
+    job_id: str
+    status: GenerationJobStatus
+    product_id: str
+    quantity: int
+    rows_written: int
+    progress: float  # 完成比例 0~1
+    throughput: Optional[float] = None  # 写入速度（个/秒）
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    download_url: Optional[str] = None
+
 class ActivationCodeVerify(BaseModel):
     """激活码验证请求"""
     code: str = Field(..., description="激活码")
@@ -45,6 +66,18 @@ class ActivationCodeVerifyResponse(BaseModel):
     activation_code: Optional[ActivationCodeResponse] = None
     remaining_activations: Optional[int] = None  # 剩余激活次数
 
+class ActivationCodeBatchVerify(BaseModel):
+    """激活码批量验证请求"""
+    codes: List[str] = Field(..., min_length=1, max_length=settings.VERIFY_BATCH_MAX_CODES, description="激活码列表")
+
+class ActivationCodeBatchVerifyItem(ActivationCodeVerifyResponse):
+    """单个激活码的批量验证结果"""
+    code: str
+
+class ActivationCodeBatchVerifyResponse(BaseModel):
+    """激活码批量验证响应，结果顺序与请求一致"""
+    results: List[ActivationCodeBatchVerifyItem]
+
 class ActivationRecord(BaseModel):
     """激活记录"""
     user_id: str
@@ -59,6 +92,38 @@ class ActivationCodeUseRequest(BaseModel):
     device_info: Optional[Dict[str, Any]] = Field(None, description="设备信息")
     ip_address: Optional[str] = Field(None, description="IP地址")
 
+class ActivationCodeActivateRequest(BaseModel):
+    """激活码验证并激活请求"""
+    code: str = Field(..., description="激活码")
+    user_id: Optional[str] = Field(None, description="用户ID")
+    device_info: Optional[Dict[str, Any]] = Field(None, description="设备信息")
+    ip_address: Optional[str] = Field(None, description="IP地址")
+
+class ActivationCodeActivateResponse(BaseModel):
+    """激活码验证并激活响应（包含验证接口和使用接口返回的信息）"""
+    success: bool
+    valid: bool
+    message: str
+    activation_code: Optional[ActivationCodeResponse] = None
+    remaining_activations: Optional[int] = None
+    activation_record: Optional[Dict[str, Any]] = None
+    license_token: Optional[str] = None  # 离线许可令牌
+
+class ActivationCodeBatchUse(BaseModel):
+    """激活码批量使用请求"""
+    items: List[ActivationCodeUseRequest] = Field(..., min_length=1, max_length=settings.USE_BATCH_MAX_ITEMS, description="激活条目列表")
+
+class ActivationCodeBatchUseItem(BaseModel):
+    """单个条目的批量使用结果"""
+    code: str
+    success: bool
+    message: str
+    remaining_activations: Optional[int] = None
+
+class ActivationCodeBatchUseResponse(BaseModel):
+    """激活码批量使用响应，结果顺序与请求一致"""
+    results: List[ActivationCodeBatchUseItem]
+
 class PaymentCreate(BaseModel):
     """创建支付请求"""
     activation_code_id: int = Field(..., description="激活码ID")
@@ -173,6 +238,7 @@ class HardwareBindingRequest(BaseModel):
     """硬件绑定请求"""
     activation_code: str = Field(..., description="激活码")
     hardware_fingerprint: str = Field(..., description="硬件指纹")
+    hardware_components: Optional[Dict[str, str]] = Field(None, description="各硬件组件哈希（cpu/memory/disk/mac/board），用于容差匹配")
     user_id: Optional[str] = Field(None, description="用户ID")
 
 class HardwareBindingResponse(BaseModel):
@@ -180,17 +246,36 @@ class HardwareBindingResponse(BaseModel):
     success: bool
     message: str
     binding_info: Optional[Dict[str, Any]] = None
+    license_token: Optional[str] = None  # 离线许可令牌
 
 class HardwareVerificationRequest(BaseModel):
     """硬件验证请求"""
     activation_code: str = Field(..., description="激活码")
     hardware_fingerprint: str = Field(..., description="硬件指纹")
+    hardware_components: Optional[Dict[str, str]] = Field(None, description="各硬件组件哈希（cpu/memory/disk/mac/board），用于容差匹配")
 
 class HardwareVerificationResponse(BaseModel):
     """硬件验证响应"""
     valid: bool
     message: str
     binding_info: Optional[Dict[str, Any]] = None
+    match_score: Optional[float] = None  # 组件匹配度（完整指纹一致时为 1.0）
+    lease_expires_at: Optional[datetime] = None  # 设备租约到期时间，到期前再次验证由内存续约
+
+class HardwareHeartbeatRequest(BaseModel):
+    """硬件心跳请求（批量验证硬件绑定）"""
+    items: List[HardwareVerificationRequest] = Field(..., min_length=1, max_length=settings.HEARTBEAT_BATCH_MAX_ITEMS, description="设备列表")
+
+class HardwareHeartbeatItem(BaseModel):
+    """单台设备的心跳结果"""
+    code: str
+    valid: bool
+    verdict: str  # ok / tolerated / mismatch / unbound / inactive / expired / not_found / invalid
+    match_score: Optional[float] = None
+
+class HardwareHeartbeatResponse(BaseModel):
+    """硬件心跳响应，结果顺序与请求一致"""
+    results: List[HardwareHeartbeatItem]
 
 class HardwareUnbindRequest(BaseModel):
     """硬件解绑请求"""
@@ -200,6 +285,7 @@ class HardwareUnbindRequest(BaseModel):
 class HardwareFingerprintResponse(BaseModel):
     """硬件指纹响应"""
     fingerprint: str
+    components: Optional[Dict[str, str]] = None  # 各硬件组件哈希
     device_info: Dict[str, Any]
     generated_at: datetime
 
@@ -208,6 +294,7 @@ class UnifiedActivationRequest(BaseModel):
     activation_code: str = Field(..., description="激活码")
     product_type: str = Field(..., description="产品类型: software 或 hardware_bound")
     hardware_fingerprint: Optional[str] = Field(None, description="硬件指纹（硬件绑定产品必需）")
+    hardware_components: Optional[Dict[str, str]] = Field(None, description="各硬件组件哈希（cpu/memory/disk/mac/board），用于容差匹配")
     user_id: Optional[str] = Field(None, description="用户ID")
 
 class UnifiedActivationResponse(BaseModel):
@@ -217,6 +304,17 @@ class UnifiedActivationResponse(BaseModel):
     activation_type: str  # "software" 或 "hardware_bound"
     activation_code: Optional[Dict[str, Any]] = None
     binding_info: Optional[Dict[str, Any]] = None
+    license_token: Optional[str] = None  # 离线许可令牌（激活或绑定成功时返回）
+
+class LicenseTokenRefreshRequest(BaseModel):
+    """许可令牌刷新请求"""
+    license_token: str = Field(..., description="当前许可令牌")
+
+class LicenseTokenResponse(BaseModel):
+    """许可令牌刷新响应"""
+    success: bool
+    message: str
+    license_token: Optional[str] = None
 
 class TokenData(BaseModel):
     """令牌数据"""
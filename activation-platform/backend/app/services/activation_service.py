@@ -1,3 +1,4 @@
+import os
 import secrets
 import string
 import hashlib
@@ -5,15 +6,50 @@ import hmac
 import time
 import uuid
 import json
+import io
+import csv
+import math
 import platform
-import psutil
-from typing import List, Optional, Set, Dict, Any
+from itertools import combinations, islice
+from typing import List, Optional, Set, Dict, Any, Iterable, Iterator
 from datetime import datetime, timedelta
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import DateTime, String, case, delete, insert, literal, or_, select, text, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.models import ActivationCode, ActivationCodeStatus, Product
-from app.schemas import ActivationCodeCreate, ActivationCodeVerify
+from app.models import ActivationCode, ActivationCodeStatus, ActivationEvent, HardwareBinding, HardwareBindingSignature, Product
+from app.schemas import ActivationCodeBase, ActivationCodeCreate, ActivationCodeResponse, ActivationCodeVerify
 from app.config import settings
-import json
+from app.services.code_filter import get_issued_code_filter
+from app.services.device_lease import get_device_lease_table, revoke_device_lease
+from app.services.hardware_collector import get_hardware_collector
+from app.services.code_cache import get_activation_code_cache, invalidate_activation_code, snapshot_activation_code
+from app.services.license_token import get_license_token_service, issue_license_token
+
+# IN 查询每块的参数数量（SQLite 默认上限 32766）
+IN_QUERY_CHUNK_SIZE = 5000
+
+# 批量写入违反唯一约束时，单块替换重复激活码后的最大重试次数
+BULK_INSERT_MAX_RETRIES = 5
+
+# 参与容差匹配的硬件组件
+HARDWARE_COMPONENTS = ("cpu", "memory", "disk", "mac", "board")
+
+# 参与容差匹配的最少组件数，可识别组件更少的设备只做完整指纹匹配
+MIN_FUZZY_COMPONENTS = 3
+
+# 无法获取组件信息时的占位值，不作为组件参与匹配
+UNKNOWN_COMPONENT_VALUES = {"", "unknown_disk", "unknown_mac", "unknown_motherboard"}
+
+def _iter_chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """将可迭代对象按固定大小切块"""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
 
 class HardwareFingerprint:
     """硬件指纹生成器"""
@@ -25,97 +61,16 @@ class HardwareFingerprint:
         基于多个硬件特征生成唯一标识
         """
         try:
-            # 收集硬件信息
-            hardware_info = {
-                # CPU信息
-                'cpu_count': psutil.cpu_count(),
-                'cpu_freq': psutil.cpu_freq().current if psutil.cpu_freq() else 0,
-                
-                # 内存信息
-                'memory_total': psutil.virtual_memory().total,
-                
-                # 磁盘信息
-                'disk_info': HardwareFingerprint._get_disk_serial(),
-                
-                # 网络信息
-                'mac_address': HardwareFingerprint._get_mac_address(),
-                
-                # 系统信息
-                'platform': platform.platform(),
-                'machine': platform.machine(),
-                'processor': platform.processor(),
-                
-                # 主板信息（如果可用）
-                'motherboard': HardwareFingerprint._get_motherboard_info(),
-            }
-            
-            # 生成指纹
-            fingerprint_data = json.dumps(hardware_info, sort_keys=True)
-            fingerprint = hashlib.sha256(fingerprint_data.encode()).hexdigest()
-            
-            return fingerprint
-            
+            return HardwareFingerprint.fingerprint_from_info(get_hardware_collector().collect())
         except Exception as e:
             # 如果无法获取硬件信息，使用备用方案
             return HardwareFingerprint._generate_fallback_fingerprint()
     
     @staticmethod
-    def _get_disk_serial() -> str:
-        """获取磁盘序列号"""
-        try:
-            # 仅在 Windows 平台尝试使用 wmi 获取磁盘序列号
-            if platform.system().lower() == 'windows':
-                try:
-                    import wmi  # 延迟导入，避免非 Windows 平台依赖问题
-                    c = wmi.WMI()
-                    for disk in c.Win32_DiskDrive():
-                        if getattr(disk, 'SerialNumber', None):
-                            return disk.SerialNumber
-                except Exception:
-                    pass
-        except:
-            pass
-        
-        try:
-            # Linux/Mac 备用方案
-            import subprocess
-            result = subprocess.run(['lsblk', '-o', 'SERIAL'], 
-                                 capture_output=True, text=True)
-            if result.returncode == 0:
-                return result.stdout
-        except:
-            pass
-        
-        return "unknown_disk"
-    
-    @staticmethod
-    def _get_mac_address() -> str:
-        """获取MAC地址"""
-        try:
-            import uuid
-            mac = uuid.getnode()
-            return ':'.join(('%012X' % mac)[i:i+2] for i in range(0, 12, 2))
-        except:
-            return "unknown_mac"
-    
-    @staticmethod
-    def _get_motherboard_info() -> str:
-        """获取主板信息"""
-        try:
-            # 仅在 Windows 平台尝试使用 wmi 获取主板序列号
-            if platform.system().lower() == 'windows':
-                try:
-                    import wmi  # 延迟导入，避免非 Windows 平台依赖问题
-                    c = wmi.WMI()
-                    for board in c.Win32_BaseBoard():
-                        if getattr(board, 'SerialNumber', None):
-                            return board.SerialNumber
-                except Exception:
-                    pass
-        except:
-            pass
-        
-        return "unknown_motherboard"
+    def fingerprint_from_info(hardware_info: Dict[str, Any]) -> str:
+        """由采集到的硬件信息生成指纹"""
+        fingerprint_data = json.dumps(hardware_info, sort_keys=True)
+        return hashlib.sha256(fingerprint_data.encode()).hexdigest()
     
     @staticmethod
     def _generate_fallback_fingerprint() -> str:
@@ -152,14 +107,177 @@ class HardwareFingerprint:
             return True
         except ValueError:
             return False
+    
+    @staticmethod
+    def generate_hardware_components() -> Dict[str, str]:
+        """
+        生成各硬件组件哈希（cpu/memory/disk/mac/board）
+        单个组件变化（如内存升级、系统补丁）只影响对应的一项，无法获取的组件不返回
+        """
+        try:
+            return HardwareFingerprint.components_from_info(get_hardware_collector().collect())
+        except Exception:
+            return {}
+    
+    @staticmethod
+    def components_from_info(hardware_info: Dict[str, Any]) -> Dict[str, str]:
+        """由采集到的硬件信息生成组件哈希，未采集到的信息对应的组件不返回"""
+        cpu_complete = hardware_info.get('cpu_count') and 'machine' in hardware_info and 'processor' in hardware_info
+        values = {
+            'cpu': f"{hardware_info['cpu_count']}|{hardware_info['machine']}|{hardware_info['processor']}"
+                   if cpu_complete else '',
+            'memory': str(hardware_info.get('memory_total') or ''),
+            'disk': hardware_info.get('disk_info'),
+            'mac': hardware_info.get('mac_address'),
+            'board': hardware_info.get('motherboard'),
+        }
+        return HardwareFingerprint.hash_components({
+            name: value for name, value in values.items()
+            if value and value.strip() not in UNKNOWN_COMPONENT_VALUES
+        })
+    
+    @staticmethod
+    def hash_components(values: Dict[str, str]) -> Dict[str, str]:
+        """组件原始值转换为组件哈希"""
+        return {
+            name: hashlib.sha256(f"{name}:{value}".encode()).hexdigest()
+            for name, value in values.items()
+        }
+    
+    @staticmethod
+    def validate_components(components: Dict[str, str]) -> bool:
+        """验证组件哈希格式"""
+        return isinstance(components, dict) and all(
+            name in HARDWARE_COMPONENTS and HardwareFingerprint.validate_fingerprint(value)
+            for name, value in components.items()
+        )
+    
+    @staticmethod
+    def match_score(bound: Dict[str, str], presented: Dict[str, str]) -> float:
+        """已绑定组件中与当前设备相同的比例"""
+        if not bound:
+            return 0.0
+        return sum(1 for name, value in bound.items() if presented.get(name) == value) / len(bound)
+    
+    @staticmethod
+    def signature_size(component_count: int, tolerance: float) -> int:
+        """组件数为 component_count 的绑定在容差 tolerance 下至少需要匹配的组件数"""
+        return min(max(math.ceil(tolerance * component_count - 1e-9), 1), component_count)
+    
+    @staticmethod
+    def component_signatures(components: Dict[str, str], size: int) -> List[str]:
+        """组件中每个大小为 size 的子集的哈希"""
+        items = sorted(components.items())
+        return [
+            hashlib.sha256("|".join(f"{name}={value}" for name, value in subset).encode()).hexdigest()
+            for subset in combinations(items, size)
+        ]
+    
+    @staticmethod
+    def binding_signatures(components: Dict[str, str], tolerance: float) -> List[str]:
+        """
+        绑定时写入倒排索引的签名
+        
+        组件数为 n 的绑定至少需要 k = ceil(tolerance * n) 个组件相同才算同一设备，
+        因此任何容差范围内的设备都与它共享至少一个大小为 k 的组件子集，即共享一个签名。
+        """
+        if len(components) < MIN_FUZZY_COMPONENTS:
+            return []
+        return HardwareFingerprint.component_signatures(
+            components, HardwareFingerprint.signature_size(len(components), tolerance)
+        )
+    
+    @staticmethod
+    def lookup_signatures(components: Dict[str, str], tolerance: float) -> List[str]:
+        """查找候选绑定时使用的签名（覆盖已绑定设备所有可能的组件数量）"""
+        sizes = {
+            HardwareFingerprint.signature_size(count, tolerance)
+            for count in range(MIN_FUZZY_COMPONENTS, len(HARDWARE_COMPONENTS) + 1)
+        }
+        return [
+            signature
+            for size in sorted(sizes) if size <= len(components)
+            for signature in HardwareFingerprint.component_signatures(components, size)
+        ]
+
+class _PendingLicenseToken:
+    """尚未签发的许可令牌，由异步服务在线程池中签发，ES256 签名不占用事件循环"""
+    
+    __slots__ = ("snapshot",)
+    
+    def __init__(self, snapshot: Dict[str, Any]):
+        self.snapshot = snapshot
+
+
+def _license_token(snapshot: Dict[str, Any], defer: bool):
+    """签发许可令牌；defer 为 True 时返回 _PendingLicenseToken，未启用时返回 None"""
+    if not defer:
+        return issue_license_token(snapshot)
+    if get_license_token_service() is None:
+        return None
+    return _PendingLicenseToken(snapshot)
+
 
 class HardwareBindingService:
     """硬件绑定服务"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, defer_license_tokens: bool = False):
         self.db = db
+        self.defer_license_tokens = defer_license_tokens
+    
+    @staticmethod
+    def _binding_components(binding: HardwareBinding) -> Dict[str, str]:
+        """绑定记录中的组件哈希"""
+        if not binding.component_hashes:
+            return {}
+        try:
+            components = json.loads(binding.component_hashes)
+        except ValueError:
+            return {}
+        return components if isinstance(components, dict) else {}
     
-    def bind_activation_code_to_hardware(self, activation_code_id: int, hardware_fingerprint: str, user_id: str = None) -> Dict[str, Any]:
+    def _store_components(self, binding: HardwareBinding, hardware_components: Dict[str, str]) -> None:
+        """写入绑定的组件哈希和相似度签名（调用方提交事务）"""
+        binding.component_hashes = json.dumps(hardware_components, sort_keys=True)
+        self.db.flush()
+        signatures = HardwareFingerprint.binding_signatures(hardware_components, settings.HARDWARE_TOLERANCE)
+        if signatures:
+            self.db.execute(insert(HardwareBindingSignature.__table__), [
+                {"binding_id": binding.id, "signature": signature} for signature in signatures
+            ])
+    
+    def find_matching_bindings(self, hardware_components: Dict[str, str]) -> List[Dict[str, Any]]:
+        """
+        查找与当前设备组件匹配度达到容差的已绑定设备
+        
+        按组件子集签名的倒排索引取出候选绑定（一次索引 IN 查询），再逐个计算匹配度，
+        查询代价与已绑定设备总数无关。
+        
+        Args:
+            hardware_components: 当前设备的组件哈希
+            
+        Returns:
+            匹配的绑定 [{"binding", "score"}]
+        """
+        signatures = HardwareFingerprint.lookup_signatures(hardware_components, settings.HARDWARE_TOLERANCE)
+        if not signatures:
+            return []
+        
+        candidates = self.db.execute(
+            select(HardwareBinding).where(HardwareBinding.id.in_(
+                select(HardwareBindingSignature.binding_id).where(HardwareBindingSignature.signature.in_(signatures))
+            ))
+        ).scalars().all()
+        
+        matches = []
+        for binding in candidates:
+            score = HardwareFingerprint.match_score(self._binding_components(binding), hardware_components)
+            if score >= settings.HARDWARE_TOLERANCE:
+                matches.append({"binding": binding, "score": score})
+        return matches
+    
+    def bind_activation_code_to_hardware(self, activation_code_id: int, hardware_fingerprint: str, user_id: str = None,
+                                         hardware_components: Dict[str, str] = None) -> Dict[str, Any]:
         """
         将激活码绑定到硬件
         
@@ -167,6 +285,7 @@ class HardwareBindingService:
             activation_code_id: 激活码ID
             hardware_fingerprint: 硬件指纹
             user_id: 用户ID
+            hardware_components: 各硬件组件哈希（可选，提供后支持容差匹配）
             
         Returns:
             绑定结果
@@ -180,6 +299,12 @@ class HardwareBindingService:
                     "message": "无效的硬件指纹格式"
                 }
             
+            if hardware_components and not HardwareFingerprint.validate_components(hardware_components):
+                return {
+                    "success": False,
+                    "message": "无效的硬件组件指纹"
+                }
+            
             # 获取激活码
             activation_code = self.db.query(ActivationCode).filter(
                 ActivationCode.id == activation_code_id
@@ -198,30 +323,24 @@ class HardwareBindingService:
                     "message": "激活码已被使用或不可用"
                 }
             
-            # 检查是否已绑定其他硬件
-            existing_binding = self.db.query(ActivationCode).filter(
-                ActivationCode.id == activation_code_id,
-                ActivationCode.metadata_json.isnot(None)
+            # 检查是否已绑定其他硬件（按激活码ID索引查询）
+            existing_binding = self.db.execute(
+                select(HardwareBinding.id).where(HardwareBinding.activation_code_id == activation_code_id)
             ).first()
             
-            if existing_binding and existing_binding.metadata_json:
-                try:
-                    metadata = json.loads(existing_binding.metadata_json)
-                    if metadata.get('hardware_fingerprint'):
-                        return {
-                            "success": False,
-                            "message": "激活码已绑定到其他硬件设备"
-                        }
-                except:
-                    pass
-            
-            # 检查该硬件是否已绑定其他激活码
-            hardware_bindings = self.db.query(ActivationCode).filter(
-                ActivationCode.metadata_json.like(f'%{hardware_fingerprint}%'),
-                ActivationCode.status == ActivationCodeStatus.USED
-            ).all()
+            if existing_binding:
+                return {
+                    "success": False,
+                    "message": "激活码已绑定到其他硬件设备"
+                }
+            
+            # 检查该硬件是否已绑定其他激活码（按硬件指纹唯一索引查询）
+            hardware_binding = self.db.execute(
+                select(HardwareBinding.id).where(HardwareBinding.hardware_fingerprint == hardware_fingerprint)
+            ).first()
             
-            if hardware_bindings:
+            # 部分硬件变更后的同一设备（完整指纹不同，组件匹配度达到容差）
+            if hardware_binding or (hardware_components and self.find_matching_bindings(hardware_components)):
                 return {
                     "success": False,
                     "message": "该硬件设备已绑定其他激活码"
@@ -240,18 +359,41 @@ class HardwareBindingService:
                 }
             }
             
+            if hardware_components:
+                binding_metadata["hardware_components"] = hardware_components
+            
             activation_code.metadata_json = json.dumps(binding_metadata)
             activation_code.status = ActivationCodeStatus.USED
             activation_code.used_at = datetime.utcnow()
             activation_code.used_by = user_id
+            binding = HardwareBinding(
+                activation_code_id=activation_code_id,
+                hardware_fingerprint=hardware_fingerprint,
+                user_id=user_id,
+                created_at=activation_code.used_at
+            )
+            self.db.add(binding)
             
-            self.db.commit()
+            try:
+                if hardware_components:
+                    self._store_components(binding, hardware_components)
+                self.db.commit()
+            except IntegrityError:
+                # 并发绑定同一激活码或同一设备时由唯一索引拒绝
+                self.db.rollback()
+                return {
+                    "success": False,
+                    "message": "激活码或该硬件设备已被绑定"
+                }
+            invalidate_activation_code(activation_code.code)
+            revoke_device_lease(activation_code.code)
             
             return {
                 "success": True,
                 "message": "硬件绑定成功",
                 "activation_code": activation_code,
-                "binding_info": binding_metadata
+                "binding_info": binding_metadata,
+                "license_token": _license_token(snapshot_activation_code(activation_code), self.defer_license_tokens)
             }
             
         except Exception as e:
@@ -261,16 +403,40 @@ class HardwareBindingService:
                 "message": f"硬件绑定失败: {str(e)}"
             }
     
-    def verify_hardware_binding(self, activation_code: str, hardware_fingerprint: str) -> Dict[str, Any]:
+    @staticmethod
+    def _verified_message(score: float) -> str:
+        """验证通过的提示信息"""
+        if score >= 1.0:
+            return "硬件绑定验证通过"
+        return f"硬件绑定验证通过（部分硬件已变更，匹配度 {score:.0%}）"
+    
+    @classmethod
+    def _lease_result(cls, lease: Dict[str, Any]) -> Dict[str, Any]:
+        """由设备租约生成验证结果"""
+        return {
+            "valid": True,
+            "message": cls._verified_message(lease["match_score"]),
+            "match_score": lease["match_score"],
+            "binding_info": lease["binding_info"],
+            "lease_expires_at": datetime.utcfromtimestamp(lease["expires_at"])
+        }
+    
+    def verify_hardware_binding(self, activation_code: str, hardware_fingerprint: str,
+                                hardware_components: Dict[str, str] = None) -> Dict[str, Any]:
         """
         验证硬件绑定
         
+        完整指纹一致时直接通过；不一致时按组件匹配度判断，已绑定组件中相同的比例
+        达到 HARDWARE_TOLERANCE 即视为同一设备（如内存升级、系统补丁后）。
+        验证通过后发放设备租约，租约有效期内同一设备再次验证直接续约，不查询数据库。
+        
         Args:
             activation_code: 激活码
             hardware_fingerprint: 硬件指纹
+            hardware_components: 各硬件组件哈希（可选）
             
         Returns:
-            验证结果
+            验证结果（通过时包含 lease_expires_at）
         """
         try:
             # 验证硬件指纹格式
@@ -280,17 +446,33 @@ class HardwareBindingService:
                     "message": "无效的硬件指纹格式"
                 }
             
-            # 获取激活码
-            code_record = self.db.query(ActivationCode).filter(
-                ActivationCode.code == activation_code
+            if hardware_components and not HardwareFingerprint.validate_components(hardware_components):
+                return {
+                    "valid": False,
+                    "message": "无效的硬件组件指纹"
+                }
+            
+            leases = get_device_lease_table()
+            lease = leases.renew(activation_code, hardware_fingerprint) if leases is not None else None
+            if lease is not None and lease["binding_info"] is not None:
+                return self._lease_result(lease)
+            generation = leases.generation() if leases is not None else None
+            
+            # 激活码和绑定记录在一次索引查询中取出
+            row = self.db.execute(
+                select(ActivationCode, HardwareBinding)
+                .outerjoin(HardwareBinding, HardwareBinding.activation_code_id == ActivationCode.id)
+                .where(ActivationCode.code == activation_code)
             ).first()
             
-            if not code_record:
+            if not row:
                 return {
                     "valid": False,
                     "message": "激活码不存在"
                 }
             
+            code_record, binding = row
+            
             # 检查激活码状态
             if code_record.status != ActivationCodeStatus.USED:
                 return {
@@ -298,47 +480,148 @@ class HardwareBindingService:
                     "message": "激活码未激活"
                 }
             
+            if code_record.expires_at and code_record.expires_at < datetime.utcnow():
+                return {
+                    "valid": False,
+                    "message": "激活码已过期"
+                }
+            
             # 检查硬件绑定
-            if not code_record.metadata_json:
+            if binding is None:
                 return {
                     "valid": False,
                     "message": "激活码未绑定硬件"
                 }
             
-            try:
-                metadata = json.loads(code_record.metadata_json)
-                bound_fingerprint = metadata.get('hardware_fingerprint')
-                
-                if not bound_fingerprint:
-                    return {
-                        "valid": False,
-                        "message": "激活码未绑定硬件"
-                    }
-                
-                if bound_fingerprint != hardware_fingerprint:
+            bound_components = self._binding_components(binding)
+            score = 1.0
+            if binding.hardware_fingerprint != hardware_fingerprint:
+                if len(bound_components) >= MIN_FUZZY_COMPONENTS and hardware_components:
+                    score = HardwareFingerprint.match_score(bound_components, hardware_components)
+                else:
+                    score = 0.0
+                if score < settings.HARDWARE_TOLERANCE:
                     return {
                         "valid": False,
-                        "message": "硬件指纹不匹配，可能在其他设备上使用"
+                        "message": "硬件指纹不匹配，可能在其他设备上使用",
+                        "match_score": score
                     }
-                
-                return {
-                    "valid": True,
-                    "message": "硬件绑定验证通过",
-                    "binding_info": metadata
-                }
-                
+            elif not bound_components and hardware_components:
+                # 旧绑定没有组件哈希：完整指纹一致时补齐，之后支持容差匹配
+                self._store_components(binding, hardware_components)
+                self.db.commit()
+            
+            try:
+                metadata = json.loads(code_record.metadata_json) if code_record.metadata_json else None
             except json.JSONDecodeError:
-                return {
-                    "valid": False,
-                    "message": "激活码绑定信息损坏"
-                }
+                metadata = None
+            
+            binding_info = metadata if isinstance(metadata, dict) else {
+                "hardware_fingerprint": binding.hardware_fingerprint,
+                "binding_time": binding.created_at.isoformat(),
+                "user_id": binding.user_id
+            }
+            if leases is not None:
+                return self._lease_result(leases.grant(
+                    activation_code, hardware_fingerprint, score, binding_info, code_record.expires_at, generation
+                ))
+            
+            return {
+                "valid": True,
+                "message": self._verified_message(score),
+                "match_score": score,
+                "binding_info": binding_info
+            }
                 
         except Exception as e:
+            self.db.rollback()
             return {
                 "valid": False,
                 "message": f"验证失败: {str(e)}"
             }
     
+    def verify_hardware_bindings(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        批量验证硬件绑定（设备心跳）
+        
+        持有有效设备租约的设备直接在内存中续约；其余激活码去重后按块使用 IN 查询一次取回激活码状态和绑定记录
+        （只取需要的列，不解析 metadata_json），再逐项按与 verify_hardware_binding 相同的规则判断，通过的设备发放租约。
+        心跳不写数据库，旧绑定补齐组件哈希仍由单个验证完成。
+        
+        Args:
+            items: 验证条目列表，每项包含 activation_code、hardware_fingerprint，可选 hardware_components
+            
+        Returns:
+            与输入顺序一致的结果列表，每项包含 code、valid、verdict，容差匹配时包含 match_score。
+            verdict 取值：ok（完整指纹一致）、tolerated（部分硬件已变更）、mismatch、unbound、
+            inactive（激活码未激活）、expired（激活码已过期）、not_found、invalid（激活码或指纹格式不正确）
+        """
+        # 租约有效的设备直接续约，其余设备的激活码才查询数据库
+        leases = get_device_lease_table()
+        renewed: Dict[int, Dict[str, Any]] = {}
+        if leases is not None:
+            for index, item in enumerate(items):
+                lease = leases.renew(item["activation_code"], item["hardware_fingerprint"])
+                if lease is not None:
+                    renewed[index] = lease
+        generation = leases.generation() if leases is not None else None
+        
+        codes = {
+            item["activation_code"] for index, item in enumerate(items)
+            if index not in renewed
+            and EnhancedActivationCodeGenerator.is_authentic_code(item["activation_code"], settings.ACTIVATION_CODE_PREFIX)
+        }
+        rows = {}
+        for chunk in _iter_chunks(codes, IN_QUERY_CHUNK_SIZE):
+            for row in self.db.execute(
+                select(ActivationCode.code, ActivationCode.status, ActivationCode.expires_at,
+                       HardwareBinding.hardware_fingerprint, HardwareBinding.component_hashes)
+                .outerjoin(HardwareBinding, HardwareBinding.activation_code_id == ActivationCode.id)
+                .where(ActivationCode.code.in_(chunk))
+            ):
+                rows[row.code] = row
+        
+        now = datetime.utcnow()
+        results = []
+        bound_components: Dict[str, Dict[str, str]] = {}
+        for index, item in enumerate(items):
+            code = item["activation_code"]
+            presented = item.get("hardware_components")
+            row = rows.get(code)
+            result = {"code": code, "valid": False}
+            if index in renewed:
+                score = renewed[index]["match_score"]
+                result.update(valid=True, verdict="ok" if score >= 1.0 else "tolerated")
+                if score < 1.0:
+                    result["match_score"] = score
+            elif not HardwareFingerprint.validate_fingerprint(item["hardware_fingerprint"])\
+                    or (presented and not HardwareFingerprint.validate_components(presented)):
+                result["verdict"] = "invalid"
+            elif row is None:
+                result["verdict"] = "not_found" if code in codes else "invalid"
+            elif row.status != ActivationCodeStatus.USED:
+                result["verdict"] = "inactive"
+            elif row.expires_at and row.expires_at < now:
+                result["verdict"] = "expired"
+            elif row.hardware_fingerprint is None:
+                result["verdict"] = "unbound"
+            elif row.hardware_fingerprint == item["hardware_fingerprint"]:
+                result.update(valid=True, verdict="ok")
+                if leases is not None:
+                    leases.grant(code, item["hardware_fingerprint"], 1.0, code_expires_at=row.expires_at, generation=generation)
+            else:
+                if code not in bound_components:
+                    bound_components[code] = self._binding_components(row)
+                components = bound_components[code]
+                score = HardwareFingerprint.match_score(components, presented)\
+                    if presented and len(components) >= MIN_FUZZY_COMPONENTS else 0.0
+                valid = score >= settings.HARDWARE_TOLERANCE
+                result.update(valid=valid, verdict="tolerated" if valid else "mismatch", match_score=score)
+                if valid and leases is not None:
+                    leases.grant(code, item["hardware_fingerprint"], score, code_expires_at=row.expires_at, generation=generation)
+            results.append(result)
+        return results
+    
     def get_hardware_binding_info(self, activation_code: str) -> Dict[str, Any]:
         """
         获取硬件绑定信息
@@ -421,12 +704,17 @@ class HardwareBindingService:
                 }
             
             # 清除绑定信息
+            binding_ids = select(HardwareBinding.id).where(HardwareBinding.activation_code_id == code_record.id)
+            self.db.execute(delete(HardwareBindingSignature).where(HardwareBindingSignature.binding_id.in_(binding_ids)))
+            self.db.execute(delete(HardwareBinding).where(HardwareBinding.activation_code_id == code_record.id))
             code_record.metadata_json = None
             code_record.status = ActivationCodeStatus.UNUSED
             code_record.used_at = None
             code_record.used_by = None
             
             self.db.commit()
+            invalidate_activation_code(code_record.code)
+            revoke_device_lease(code_record.code)
             
             return {
                 "success": True,
@@ -448,7 +736,16 @@ class EnhancedActivationCodeGenerator:
     
     # 字符集 - 排除容易混淆的字符
     CHARACTERS = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"  # 排除 I, O, 0, 1
-    
+
+    # 字节到安全字符的映射表：取每个字节的低5位作为字符集下标（256可被32整除，分布均匀）
+    _BYTE_TO_CHARACTER = CHARACTERS.encode('ascii') * 8
+
+    # 校验位长度（字符数），每个字符5位，伪造激活码通过校验的概率约为 1/2^30
+    TAG_LENGTH = 6
+
+    # 校验位密钥缓存：(配置中的密钥, 派生后的密钥)
+    _tag_key_cache = ((), [])
+
     @classmethod
     def generate_secure_code(cls, length: int = 32, prefix: str = "ACT") -> str:
         """
@@ -477,10 +774,10 @@ class EnhancedActivationCodeGenerator:
         # 使用HMAC加盐加密
         encrypted_code = cls._encrypt_with_salt(raw_string)
         
-        # 截取到指定长度并格式化
-        final_code = cls._format_code(encrypted_code, length, prefix)
+        # 截取到指定长度并格式化（末尾预留校验位）
+        final_code = cls._format_code(encrypted_code, length - cls.TAG_LENGTH, prefix)
         
-        return final_code
+        return cls.sign_code(final_code)
     
     @classmethod
     def _encrypt_with_salt(cls, raw_string: str) -> str:
@@ -546,16 +843,125 @@ class EnhancedActivationCodeGenerator:
         codes: Set[str] = set()
         max_attempts = count * 10  # 最大尝试次数，防止无限循环
         attempts = 0
-        
+
+        # 使用批量熵切片生成，重复时只补齐缺少的部分
         while len(codes) < count and attempts < max_attempts:
-            code = cls.generate_secure_code(length, prefix)
-            codes.add(code)
-            attempts += 1
-        
+            missing = count - len(codes)
+            codes.update(cls.generate_bulk_codes(missing, length, prefix))
+            attempts += missing
+
         if len(codes) < count:
             raise Exception(f"无法生成足够的唯一激活码，尝试了 {max_attempts} 次")
-        
+
         return list(codes)
+
+    @classmethod
+    def generate_bulk_codes(cls, count: int, length: int = 32, prefix: str = "ACT") -> List[str]:
+        """
+        批量熵切片生成激活码
+
+        每批只读取一次 os.urandom，将每个字节的低5位切分为字符集符号（字符集正好32个字符），
+        整批通过 bytes.translate 完成映射，不做逐字符过滤，末尾追加校验位。
+        不保证批内去重，去重由调用方负责。
+
+        Args:
+            count: 生成数量
+            length: 激活码总长度（包含前缀）
+            prefix: 前缀
+
+        Returns:
+            激活码列表
+        """
+        random_length = length - len(prefix) - cls.TAG_LENGTH
+        if count <= 0 or random_length <= 0:
+            return []
+
+        symbols = cls.generate_symbols(count * random_length)
+        key = cls._tag_keys()[0]
+        blake2b, tag_length, table = hashlib.blake2b, cls.TAG_LENGTH, cls._BYTE_TO_CHARACTER
+        codes = []
+        for i in range(0, count * random_length, random_length):
+            body = prefix + symbols[i:i + random_length]
+            codes.append(body + blake2b(body.encode('utf-8'), key=key, digest_size=tag_length).digest().translate(table).decode('ascii'))
+        return codes
+
+    @classmethod
+    def generate_symbols(cls, count: int) -> str:
+        """
+        生成指定数量的随机安全字符
+
+        Args:
+            count: 字符数量
+
+        Returns:
+            由安全字符集组成的随机字符串
+        """
+        return os.urandom(count).translate(cls._BYTE_TO_CHARACTER).decode('ascii')
+
+    @classmethod
+    def _tag_keys(cls) -> List[bytes]:
+        """
+        获取校验位密钥列表
+
+        第一个密钥用于签发新激活码，其余密钥只用于验证，轮换密钥时旧批次仍可通过校验。
+        未配置 ACTIVATION_CODE_TAG_KEYS 时使用 ACTIVATION_CODE_SALT_KEY。
+        """
+        keys = tuple(settings.ACTIVATION_CODE_TAG_KEYS or [settings.ACTIVATION_CODE_SALT_KEY])
+        if cls._tag_key_cache[0] != keys:
+            derived = [hmac.digest(key.encode('utf-8'), b"code-tag", hashlib.sha256) for key in keys]
+            cls._tag_key_cache = (keys, derived)
+        return cls._tag_key_cache[1]
+
+    @classmethod
+    def _compute_tag(cls, body: str, key: bytes) -> str:
+        """计算校验位：带密钥的 BLAKE2b 截断后映射为安全字符"""
+        digest = hashlib.blake2b(body.encode('utf-8'), key=key, digest_size=cls.TAG_LENGTH).digest()
+        return digest.translate(cls._BYTE_TO_CHARACTER).decode('ascii')
+
+    @classmethod
+    def sign_code(cls, body: str) -> str:
+        """
+        为激活码主体追加校验位
+
+        Args:
+            body: 激活码主体（包含前缀）
+
+        Returns:
+            带校验位的激活码
+        """
+        return body + cls._compute_tag(body, cls._tag_keys()[0])
+
+    @classmethod
+    def verify_code_tag(cls, code: str) -> bool:
+        """
+        验证激活码校验位，不访问数据库
+
+        Args:
+            code: 激活码
+
+        Returns:
+            校验位是否与任一有效密钥匹配
+        """
+        if not code or len(code) <= cls.TAG_LENGTH:
+            return False
+        body, tag = code[:-cls.TAG_LENGTH], code[-cls.TAG_LENGTH:]
+        return any(hmac.compare_digest(cls._compute_tag(body, key), tag) for key in cls._tag_keys())
+
+    @classmethod
+    def is_authentic_code(cls, code: str, expected_prefix: str = "ACT") -> bool:
+        """
+        格式和校验位验证（未开启 ACTIVATION_CODE_TAG_ENFORCE 时只验证格式）
+
+        Args:
+            code: 激活码
+            expected_prefix: 期望的前缀
+
+        Returns:
+            是否可能为已签发的激活码
+        """
+        if not cls.verify_code_format(code, expected_prefix):
+            return False
+        return not settings.ACTIVATION_CODE_TAG_ENFORCE or cls.verify_code_tag(code)
     
     @classmethod
     def verify_code_format(cls, code: str, expected_prefix: str = "ACT") -> bool:
@@ -610,50 +1016,232 @@ class ActivationCodeGenerator:
 class ActivationCodeService:
     """激活码服务 - 支持硬件绑定"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, defer_license_tokens: bool = False):
         self.db = db
-        self.hardware_service = HardwareBindingService(db)
+        self.defer_license_tokens = defer_license_tokens
+        self.hardware_service = HardwareBindingService(db, defer_license_tokens)
     
-    def create_activation_codes(self, request: ActivationCodeCreate) -> List[ActivationCode]:
+    def create_activation_codes(self, request: ActivationCodeCreate) -> List[ActivationCodeResponse]:
         """创建激活码 - 增强版本，确保唯一性"""
-        # 使用增强的生成器
-        codes = EnhancedActivationCodeGenerator.generate_batch_codes(
-            request.quantity,
-            length=32,  # 增加长度到32位
-            prefix=settings.ACTIVATION_CODE_PREFIX
-        )
+        rows = []
+        batch_id = str(uuid.uuid4())
+        for chunk_rows in self.insert_activation_codes(self._generate_unique_codes(request.quantity), request, batch_id=batch_id):
+            rows.extend(chunk_rows)
+        
+        self.db.commit()
+        return [ActivationCodeResponse(**row) for row in rows]
+    
+    def create_activation_code_batch(self, request: ActivationCodeCreate) -> str:
+        """
+        创建激活码但不构建响应对象，用于流式导出
+        
+        Returns:
+            生成批次ID，可通过导出服务按批次读取
+        """
+        batch_id = str(uuid.uuid4())
+        for _ in self.insert_activation_codes(self._generate_unique_codes(request.quantity), request, batch_id=batch_id):
+            pass
+        
+        self.db.commit()
+        return batch_id
+    
+    def _generate_unique_codes(self, quantity: int) -> List[str]:
+        """按生成模式生成指定数量、数据库中不存在的激活码"""
+        if settings.CODE_GENERATION_MODE == "permutation":
+            # 置换模式生成的激活码天然唯一，无需查重
+            from app.services.code_permutation import get_permuted_code_generator
+            codes = get_permuted_code_generator().generate(quantity)
+        else:
+            # 使用增强的生成器
+            codes = EnhancedActivationCodeGenerator.generate_batch_codes(
+                quantity,
+                length=32,  # 增加长度到32位
+                prefix=settings.ACTIVATION_CODE_PREFIX
+            )
+            
+            # 排除数据库中已存在的激活码
+            codes = self._exclude_issued_codes(codes)
+        
+        return codes
+    
+    def insert_activation_codes(self, codes: Iterable[str], request: ActivationCodeBase,
+                                chunk_size: int = None, batch_id: str = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        分块批量写入激活码（不提交事务）
         
-        # 检查数据库中是否已存在这些激活码
-        existing_codes = self._check_existing_codes(codes)
-        if existing_codes:
-            # 如果存在重复，重新生成
-            codes = self._regenerate_unique_codes(request.quantity, existing_codes)
+        使用 Core insert 批量执行并通过 RETURNING 取回 id 和创建时间，
+        PostgreSQL 上使用 COPY 写入临时表后再插入。不创建 ORM 对象，
+        因此提交后构建响应时不会逐行重新查询；按块产出结果，超大批量时内存占用平稳。
         
-        activation_codes = []
+        Args:
+            codes: 激活码（可迭代，支持流式输入）
+            request: 激活码公共属性
+            chunk_size: 每块写入数量
+            batch_id: 生成批次ID
+            
+        Yields:
+            每块写入后的完整行数据列表
+        """
+        chunk_size = chunk_size or settings.CODE_BULK_INSERT_CHUNK_SIZE
+        template = {
+            "product_id": request.product_id,
+            "product_name": request.product_name,
+            "price": request.price,
+            "currency": request.currency,
+            "expires_at": request.expires_at,
+            "metadata_json": json.dumps(request.metadata_json) if request.metadata_json else None,
+            "max_activations": request.max_activations,
+            "current_activations": 0,
+            "status": ActivationCodeStatus.UNUSED,
+            "batch_id": batch_id,
+        }
+        
+        dialect = self.db.get_bind().dialect
+        if dialect.name == "postgresql" and settings.CODE_BULK_INSERT_USE_COPY:
+            insert_chunk = self._copy_insert_chunk
+        else:
+            insert_chunk = self._executemany_insert_chunk
+        
+        code_filter = get_issued_code_filter()
+        for chunk in _iter_chunks(codes, chunk_size):
+            returned = self._insert_chunk_with_retry(insert_chunk, chunk, template)
+            if code_filter is not None:
+                code_filter.add_many(returned)
+            yield [
+                dict(
+                    template,
+                    metadata_json=request.metadata_json,
+                    code=row.code,
+                    id=row.id,
+                    created_at=row.created_at,
+                    updated_at=row.updated_at,
+                    used_at=None,
+                    used_by=None,
+                    activation_records=None
+                )
+                for row in returned
+            ]
+    
+    def _insert_chunk_with_retry(self, insert_chunk, codes: List[str], template: Dict[str, Any]) -> list:
+        """
+        在保存点中写入一块激活码，违反唯一约束时替换已存在的激活码后重试该块
+        
+        已发放激活码过滤器不与其他进程实时同步，生成时判定不存在的激活码仍可能与并发写入的重复，
+        由数据库唯一约束兜底；重试只回滚当前块，之前写入的块保留在事务中。
+        """
+        for attempt in range(BULK_INSERT_MAX_RETRIES + 1):
+            savepoint = self.db.begin_nested()
+            try:
+                returned = insert_chunk(codes, template)
+                savepoint.commit()
+                return returned
+            except IntegrityError:
+                savepoint.rollback()
+                if attempt == BULK_INSERT_MAX_RETRIES:
+                    raise
+            
+            existing_codes = self._check_existing_codes(codes)
+            unique_codes = list(dict.fromkeys(code for code in codes if code not in existing_codes))
+            codes = unique_codes + EnhancedActivationCodeGenerator.generate_bulk_codes(
+                len(codes) - len(unique_codes), 32, settings.ACTIVATION_CODE_PREFIX
+            )
+    
+    def _executemany_insert_chunk(self, codes: List[str], template: Dict[str, Any]) -> list:
+        """使用 insert().values 批量执行写入一块激活码"""
+        table = ActivationCode.__table__
+        returning = (table.c.id, table.c.code, table.c.created_at, table.c.updated_at)
+        params = [dict(template, code=code) for code in codes]
+        
+        if self.db.get_bind().dialect.insert_executemany_returning:
+            return self.db.execute(table.insert().returning(*returning), params).all()
+        
+        # 数据库不支持批量 RETURNING 时，整块回查一次
+        self.db.execute(table.insert(), params)
+        return self.db.execute(select(*returning).where(table.c.code.in_(codes))).all()
+    
+    def _copy_insert_chunk(self, codes: List[str], template: Dict[str, Any]) -> list:
+        """PostgreSQL：COPY 到临时表，再 INSERT ... SELECT ... RETURNING 写入一块激活码"""
+        columns = ["code"] + [name for name in template]
+        column_list = ", ".join(columns)
+        
+        self.db.execute(text(
+            f"CREATE TEMP TABLE IF NOT EXISTS activation_codes_staging "
+            f"AS SELECT {column_list} FROM activation_codes WITH NO DATA"
+        ))
+        self.db.execute(text("TRUNCATE activation_codes_staging"))
+        
+        row_values = []
+        for name in template:
+            value = template[name]
+            if isinstance(value, ActivationCodeStatus):
+                value = value.name  # 数据库中枚举按名称存储
+            row_values.append(value)
+        
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
         for code in codes:
-            activation_code = ActivationCode(
-                code=code,
-                product_id=request.product_id,
-                product_name=request.product_name,
-                price=request.price,
-                currency=request.currency,
-                expires_at=request.expires_at,
-                metadata_json=json.dumps(request.metadata_json) if request.metadata_json else None,
-                max_activations=request.max_activations,
-                current_activations=0
+            writer.writerow([code] + row_values)
+        buffer.seek(0)
+        
+        cursor = self.db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY activation_codes_staging ({column_list}) FROM STDIN WITH (FORMAT csv)",
+                buffer
             )
-            self.db.add(activation_code)
-            activation_codes.append(activation_code)
+        finally:
+            cursor.close()
         
-        self.db.commit()
-        return activation_codes
+        return self.db.execute(text(
+            f"INSERT INTO activation_codes ({column_list}, created_at, updated_at) "
+            f"SELECT {column_list}, now(), now() FROM activation_codes_staging "
+            f"RETURNING id, code, created_at, updated_at"
+        )).all()
+    
+    def _exclude_issued_codes(self, codes: List[str]) -> List[str]:
+        """
+        排除已发放的激活码，并在内存中补齐到原数量
+        
+        启用已发放激活码过滤器时，过滤器判定不存在的激活码直接通过，
+        只有少量判定可能存在的激活码才查询数据库确认。
+        """
+        code_filter = get_issued_code_filter()
+        if code_filter is None:
+            existing_codes = self._check_existing_codes(codes)
+            if existing_codes:
+                # 如果存在重复，重新生成
+                codes = self._regenerate_unique_codes(len(codes), existing_codes)
+            return codes
+        
+        count = len(codes)
+        accepted: Set[str] = set()
+        candidates = codes
+        attempts = 0
+        while True:
+            positives = [code for code in candidates if code_filter.might_contain(code)]
+            existing_codes = self._check_existing_codes(positives) if positives else set()
+            accepted.update(code for code in candidates if code not in existing_codes)
+            
+            missing = count - len(accepted)
+            if missing <= 0:
+                return list(accepted)
+            
+            attempts += 1
+            if attempts > 20:
+                raise Exception("无法生成足够的唯一激活码")
+            candidates = EnhancedActivationCodeGenerator.generate_bulk_codes(
+                missing, 32, settings.ACTIVATION_CODE_PREFIX
+            )
     
     def _check_existing_codes(self, codes: List[str]) -> Set[str]:
-        """检查激活码是否已存在"""
-        existing = self.db.query(ActivationCode.code).filter(
-            ActivationCode.code.in_(codes)
-        ).all()
-        return {code[0] for code in existing}
+        """检查激活码是否已存在（分块 IN 查询，避免超出数据库参数数量上限）"""
+        existing = set()
+        for chunk in _iter_chunks(codes, IN_QUERY_CHUNK_SIZE):
+            rows = self.db.query(ActivationCode.code).filter(
+                ActivationCode.code.in_(chunk)
+            ).all()
+            existing.update(code[0] for code in rows)
+        return existing
     
     def _regenerate_unique_codes(self, count: int, existing_codes: Set[str]) -> List[str]:
         """重新生成唯一的激活码"""
@@ -662,10 +1250,12 @@ class ActivationCodeService:
         attempts = 0
         
         while len(codes) < count and attempts < max_attempts:
-            code = EnhancedActivationCodeGenerator.generate_secure_code(32, settings.ACTIVATION_CODE_PREFIX)
-            if code not in existing_codes and code not in codes:
-                codes.add(code)
-            attempts += 1
+            missing = count - len(codes)
+            candidates = EnhancedActivationCodeGenerator.generate_bulk_codes(
+                missing, 32, settings.ACTIVATION_CODE_PREFIX
+            )
+            codes.update(code for code in candidates if code not in existing_codes)
+            attempts += missing
         
         if len(codes) < count:
             raise Exception(f"无法生成足够的唯一激活码")
@@ -676,38 +1266,111 @@ class ActivationCodeService:
         """获取激活码"""
         return self.db.query(ActivationCode).filter(ActivationCode.code == code).first()
     
+    def get_activation_code_snapshot(self, code: str) -> Optional[Dict[str, Any]]:
+        """
+        获取激活码快照（读穿缓存）
+        
+        命中缓存时不访问数据库；写操作（使用、绑定、解绑、状态变更）会删除对应缓存。
+        """
+        cache = get_activation_code_cache()
+        generation = None
+        if cache is not None:
+            snapshot = cache.get(code)
+            if snapshot is not None:
+                return snapshot
+            generation = cache.generation()
+        
+        activation_code = self.get_activation_code(code)
+        if not activation_code:
+            return None
+        
+        snapshot = snapshot_activation_code(activation_code)
+        if cache is not None:
+            cache.set(code, snapshot, generation)
+        return snapshot
+    
     def verify_activation_code(self, request: ActivationCodeVerify) -> dict:
         """验证激活码"""
-        # 首先验证格式
-        if not EnhancedActivationCodeGenerator.verify_code_format(request.code):
+        # 首先验证格式和校验位，伪造或输错的激活码无需查询数据库
+        if not EnhancedActivationCodeGenerator.is_authentic_code(request.code, settings.ACTIVATION_CODE_PREFIX):
             return {
                 "valid": False,
                 "message": "激活码格式不正确"
             }
         
-        activation_code = self.get_activation_code(request.code)
+        snapshot = self.get_activation_code_snapshot(request.code)
         
-        if not activation_code:
+        if not snapshot:
             return {
                 "valid": False,
                 "message": "激活码不存在"
             }
         
+        return self._verify_snapshot(snapshot)
+    
+    def verify_activation_codes(self, codes: List[str]) -> List[dict]:
+        """
+        批量验证激活码
+        
+        格式或校验位不正确的激活码直接判为无效；其余先查缓存，未命中的激活码
+        按块使用 IN 查询一次取回，再逐个判断激活次数、状态和过期时间。
+        
+        Args:
+            codes: 激活码列表（可以重复）
+        
+        Returns:
+            与输入顺序一致的验证结果列表，每项包含 code 字段
+        """
+        cache = get_activation_code_cache()
+        snapshots: Dict[str, Optional[Dict[str, Any]]] = {}
+        missing = []
+        for code in dict.fromkeys(codes):
+            if not EnhancedActivationCodeGenerator.is_authentic_code(code, settings.ACTIVATION_CODE_PREFIX):
+                continue
+            snapshot = cache.get(code) if cache is not None else None
+            if snapshot is None:
+                missing.append(code)
+            else:
+                snapshots[code] = snapshot
+        
+        generation = cache.generation() if cache is not None else None
+        for chunk in _iter_chunks(missing, IN_QUERY_CHUNK_SIZE):
+            for activation_code in self.db.query(ActivationCode).filter(ActivationCode.code.in_(chunk)):
+                snapshot = snapshot_activation_code(activation_code)
+                snapshots[activation_code.code] = snapshot
+                if cache is not None:
+                    cache.set(activation_code.code, snapshot, generation)
+        
+        missing = set(missing)
+        results = []
+        for code in codes:
+            snapshot = snapshots.get(code)
+            if snapshot is not None:
+                result = self._verify_snapshot(snapshot)
+            elif code in missing:
+                result = {"valid": False, "message": "激活码不存在"}
+            else:
+                result = {"valid": False, "message": "激活码格式不正确"}
+            results.append({"code": code, **result})
+        return results
+    
+    def _verify_snapshot(self, snapshot: Dict[str, Any]) -> dict:
+        """根据激活码快照判断是否可用"""
         # 检查激活次数
-        if activation_code.current_activations >= activation_code.max_activations:
+        if snapshot["current_activations"] >= snapshot["max_activations"]:
             return {
                 "valid": False,
-                "message": f"激活码已达到最大激活次数({activation_code.max_activations}次)"
+                "message": f"激活码已达到最大激活次数({snapshot['max_activations']}次)"
             }
         
-        if activation_code.status == ActivationCodeStatus.DISABLED:
+        if snapshot["status"] == ActivationCodeStatus.DISABLED:
             return {
                 "valid": False,
                 "message": "激活码已被禁用"
             }
         
-        # 检查过期时间
-        if activation_code.expires_at and activation_code.expires_at < datetime.utcnow():
+        # 检查过期时间（已被清扫标记为过期，或尚未清扫但已到期）
+        if snapshot["status"] == ActivationCodeStatus.EXPIRED or (snapshot["expires_at"] and snapshot["expires_at"] < datetime.utcnow()):
             return {
                 "valid": False,
                 "message": "激活码已过期"
@@ -716,77 +1379,191 @@ class ActivationCodeService:
         return {
             "valid": True,
             "message": "激活码有效",
-            "activation_code": activation_code,
-            "remaining_activations": activation_code.max_activations - activation_code.current_activations
+            "activation_code": snapshot,
+            "remaining_activations": snapshot["max_activations"] - snapshot["current_activations"]
         }
     
     def use_activation_code(self, code: str, user_id: str = None, device_info: dict = None, ip_address: str = None) -> dict:
         """使用激活码（支持多激活次数）"""
-        # 首先验证格式
-        if not EnhancedActivationCodeGenerator.verify_code_format(code):
+        # 首先验证格式和校验位，伪造或输错的激活码无需查询数据库
+        if not EnhancedActivationCodeGenerator.is_authentic_code(code, settings.ACTIVATION_CODE_PREFIX):
             return {
                 "success": False,
                 "message": "激活码格式不正确"
             }
         
-        activation_code = self.get_activation_code(code)
+        now = datetime.utcnow()
+        activation_record = {
+            "user_id": user_id,
+            "activation_time": now.isoformat(),
+            "device_info": device_info,
+            "ip_address": ip_address
+        }
         
-        if not activation_code:
-            return {
-                "success": False,
-                "message": "激活码不存在"
-            }
+        # 单条条件 UPDATE 完成校验和计数，并发激活不会丢失计数
+        row = self.db.execute(self._activation_update({code: user_id}, now)).first()
         
-        # 验证激活码
-        verify_result = self.verify_activation_code(ActivationCodeVerify(code=code, user_id=user_id))
-        if not verify_result["valid"]:
+        if row is None:
+            # 冷路径：未更新任何行时再查询一次，给出具体原因
+            self.db.rollback()
+            activation_code = self.get_activation_code(code)
+            if not activation_code:
+                return {
+                    "success": False,
+                    "message": "激活码不存在"
+                }
+            verify_result = self._verify_snapshot(snapshot_activation_code(activation_code))
             return {
                 "success": False,
-                "message": verify_result["message"]
+                "message": verify_result["message"] if not verify_result["valid"] else "激活码不可用"
             }
         
-        # 增加激活次数
-        activation_code.current_activations += 1
+        # 激活记录写入只追加的事件表（固定大小的插入），与计数在同一事务中提交
+        self.db.execute(insert(ActivationEvent.__table__).values(
+            activation_code_id=row.id,
+            user_id=user_id,
+            ip_address=ip_address,
+            device_info=json.dumps(device_info) if device_info is not None else None,
+            created_at=now
+        ))
+        self.db.commit()
+        invalidate_activation_code(code)
         
-        # 记录激活信息
-        activation_record = {
-            "user_id": user_id,
-            "activation_time": datetime.utcnow().isoformat(),
-            "device_info": device_info,
-            "ip_address": ip_address
+        remaining = row.max_activations - row.current_activations
+        snapshot = snapshot_activation_code(row)
+        return {
+            "success": True,
+            "message": f"激活成功，剩余激活次数: {remaining}",
+            "activation_code": snapshot,
+            "remaining_activations": remaining,
+            "activation_record": activation_record,
+            "license_token": _license_token(snapshot, self.defer_license_tokens)
         }
+    
+    def use_activation_codes(self, items: List[Dict[str, Any]]) -> List[dict]:
+        """
+        批量使用激活码，所有激活在同一事务中提交
         
-        # 更新激活记录
-        existing_records = []
-        if activation_code.activation_records:
-            try:
-                existing_records = json.loads(activation_code.activation_records)
-            except:
-                existing_records = []
+        每轮对所有待激活的激活码执行一条集合式条件 UPDATE（按块），同一激活码
+        出现多次时每轮只消耗一次，直到次数用尽；失败的条目不影响其他条目。
         
-        existing_records.append(activation_record)
-        activation_code.activation_records = json.dumps(existing_records)
+        Args:
+            items: 激活条目列表，每项包含 code、user_id，可选 device_info、ip_address
+            
+        Returns:
+            与输入顺序一致的结果列表，每项包含 code、success、message
+        """
+        now = datetime.utcnow()
+        results: List[Optional[dict]] = [None] * len(items)
+        pending: Dict[str, List[int]] = {}
+        for index, item in enumerate(items):
+            if EnhancedActivationCodeGenerator.is_authentic_code(item["code"], settings.ACTIVATION_CODE_PREFIX):
+                pending.setdefault(item["code"], []).append(index)
+            else:
+                results[index] = {"code": item["code"], "success": False, "message": "激活码格式不正确"}
         
-        # 如果是第一次激活，设置使用时间
-        if activation_code.current_activations == 1:
-            activation_code.used_at = datetime.utcnow()
-            activation_code.used_by = user_id
+        events = []
+        activated: Set[str] = set()
+        rejected: Dict[str, List[int]] = {}
+        while pending:
+            for chunk in _iter_chunks(list(pending), IN_QUERY_CHUNK_SIZE):
+                users = {code: items[pending[code][0]].get("user_id") for code in chunk}
+                rows = {row.code: row for row in self.db.execute(self._activation_update(users, now))}
+                for code in chunk:
+                    row = rows.get(code)
+                    if row is None:
+                        # 条件不再满足，该激活码剩余的条目全部失败
+                        rejected[code] = pending.pop(code)
+                        continue
+                    index = pending[code].pop(0)
+                    if not pending[code]:
+                        del pending[code]
+                    item = items[index]
+                    remaining = row.max_activations - row.current_activations
+                    results[index] = {
+                        "code": code,
+                        "success": True,
+                        "message": f"激活成功，剩余激活次数: {remaining}",
+                        "remaining_activations": remaining
+                    }
+                    events.append({
+                        "activation_code_id": row.id,
+                        "user_id": item.get("user_id"),
+                        "ip_address": item.get("ip_address"),
+                        "device_info": json.dumps(item["device_info"]) if item.get("device_info") is not None else None,
+                        "created_at": now
+                    })
+                    activated.add(code)
         
-        # 如果达到最大激活次数，标记为已使用
-        if activation_code.current_activations >= activation_code.max_activations:
-            activation_code.status = ActivationCodeStatus.USED
+        # 冷路径：按块查询失败的激活码，给出具体原因（反映本批次内已完成的激活）
+        for chunk in _iter_chunks(list(rejected), IN_QUERY_CHUNK_SIZE):
+            activation_codes = self.db.query(ActivationCode)\
+                .filter(ActivationCode.code.in_(chunk))\
+                .execution_options(populate_existing=True)
+            snapshots = {activation_code.code: snapshot_activation_code(activation_code) for activation_code in activation_codes}
+            for code in chunk:
+                if code in snapshots:
+                    verify_result = self._verify_snapshot(snapshots[code])
+                    message = verify_result["message"] if not verify_result["valid"] else "激活码不可用"
+                else:
+                    message = "激活码不存在"
+                for index in rejected[code]:
+                    results[index] = {"code": code, "success": False, "message": message}
         
+        if events:
+            self.db.execute(insert(ActivationEvent.__table__), events)
         self.db.commit()
+        for code in activated:
+            invalidate_activation_code(code)
         
-        return {
-            "success": True,
-            "message": f"激活成功，剩余激活次数: {activation_code.max_activations - activation_code.current_activations}",
-            "activation_code": activation_code,
-            "remaining_activations": activation_code.max_activations - activation_code.current_activations,
-            "activation_record": activation_record
-        }
+        return results
+    
+    @staticmethod
+    def _activation_update(users: Dict[str, Optional[str]], now: datetime):
+        """
+        构建激活语句：
+        UPDATE activation_codes SET current_activations = current_activations + 1, ...
+        WHERE code IN (...) AND current_activations < max_activations AND 状态可用 AND 未过期
+        RETURNING ...
+        
+        users 为 激活码 -> 用户ID，首次激活时写入 used_by；SET 子句中引用的列均为更新前的值。
+        """
+        table = ActivationCode.__table__
+        activations = table.c.current_activations
+        first_activation = activations == 0
+        
+        if len(users) == 1:
+            (code, user_id), = users.items()
+            code_condition = table.c.code == code
+            used_by = literal(user_id, String)
+        else:
+            code_condition = table.c.code.in_(list(users))
+            used_by = case(
+                {code: literal(user_id, String) for code, user_id in users.items()},
+                value=table.c.code
+            )
+        
+        return update(table)\
+            .where(
+                code_condition,
+                activations < table.c.max_activations,
+                table.c.status.notin_([ActivationCodeStatus.DISABLED, ActivationCodeStatus.EXPIRED]),
+                or_(table.c.expires_at.is_(None), table.c.expires_at >= now)
+            )\
+            .values(
+                current_activations=activations + 1,
+                used_at=case((first_activation, literal(now, DateTime)), else_=table.c.used_at),
+                used_by=case((first_activation, used_by), else_=table.c.used_by),
+                status=case(
+                    (activations + 1 >= table.c.max_activations, literal(ActivationCodeStatus.USED, table.c.status.type)),
+                    else_=table.c.status
+                ),
+                updated_at=now
+            )\
+            .returning(*[column for column in table.c if column.name != "activation_records"])
     
-    def bind_to_hardware(self, code: str, hardware_fingerprint: str, user_id: str = None) -> dict:
+    def bind_to_hardware(self, code: str, hardware_fingerprint: str, user_id: str = None,
+                         hardware_components: Dict[str, str] = None) -> dict:
         """将激活码绑定到硬件"""
         activation_code = self.get_activation_code(code)
         
@@ -797,12 +1574,16 @@ class ActivationCodeService:
             }
         
         return self.hardware_service.bind_activation_code_to_hardware(
-            activation_code.id, hardware_fingerprint, user_id
+            activation_code.id, hardware_fingerprint, user_id, hardware_components
         )
     
-    def verify_hardware_binding(self, code: str, hardware_fingerprint: str) -> dict:
+    def verify_hardware_binding(self, code: str, hardware_fingerprint: str, hardware_components: Dict[str, str] = None) -> dict:
         """验证硬件绑定"""
-        return self.hardware_service.verify_hardware_binding(code, hardware_fingerprint)
+        return self.hardware_service.verify_hardware_binding(code, hardware_fingerprint, hardware_components)
+    
+    def verify_hardware_bindings(self, items: List[Dict[str, Any]]) -> List[dict]:
+        """批量验证硬件绑定（设备心跳）"""
+        return self.hardware_service.verify_hardware_bindings(items)
     
     def get_hardware_binding_info(self, code: str) -> dict:
         """获取硬件绑定信息"""
@@ -812,6 +1593,62 @@ class ActivationCodeService:
         """解绑硬件"""
         return self.hardware_service.unbind_hardware(code, admin_key)
     
+    def refresh_license_token(self, license_token: str) -> dict:
+        """
+        刷新离线许可令牌
+        
+        验证当前令牌后按激活码的最新状态重新签发：激活码被禁用、过期或硬件已解绑时拒绝刷新。
+        """
+        service = get_license_token_service()
+        if service is None:
+            return {
+                "success": False,
+                "message": "许可令牌未启用"
+            }
+        
+        try:
+            claims = service.decode(license_token)
+        except Exception as e:
+            return {
+                "success": False,
+                "message": str(e)
+            }
+        
+        activation_code = self.db.get(ActivationCode, claims["cid"])
+        if not activation_code:
+            return {
+                "success": False,
+                "message": "激活码不存在"
+            }
+        
+        snapshot = snapshot_activation_code(activation_code)
+        if snapshot["status"] in (ActivationCodeStatus.DISABLED, ActivationCodeStatus.EXPIRED):
+            return {
+                "success": False,
+                "message": "激活码已被禁用或已过期"
+            }
+        
+        if snapshot["expires_at"] and snapshot["expires_at"] < datetime.utcnow():
+            return {
+                "success": False,
+                "message": "激活码已过期"
+            }
+        
+        bound_fingerprint = self.db.execute(
+            select(HardwareBinding.hardware_fingerprint).where(HardwareBinding.activation_code_id == activation_code.id)
+        ).scalar()
+        if claims.get("hwf") and bound_fingerprint != claims["hwf"]:
+            return {
+                "success": False,
+                "message": "硬件绑定已变更"
+            }
+        
+        return {
+            "success": True,
+            "message": "许可令牌已刷新",
+            "license_token": _license_token(snapshot, self.defer_license_tokens)
+        }
+    
     def get_activation_codes_by_product(self, product_id: str, skip: int = 0, limit: int = 100) -> List[ActivationCode]:
         """根据产品ID获取激活码列表"""
         return self.db.query(ActivationCode)\
@@ -832,6 +1669,11 @@ class ActivationCodeService:
         expired = query.filter(ActivationCode.status == ActivationCodeStatus.EXPIRED).count()
         disabled = query.filter(ActivationCode.status == ActivationCodeStatus.DISABLED).count()
         
+        # 已到期但尚未被清扫的激活码按已过期统计（条件与过期时间部分索引一致）
+        overdue = query.filter(*self._overdue_conditions(datetime.utcnow())).count()
+        unused -= overdue
+        expired += overdue
+        
         return {
             "total": total,
             "unused": unused,
@@ -840,8 +1682,73 @@ class ActivationCodeService:
             "disabled": disabled
         }
     
-    def get_activation_records(self, code: str) -> dict:
-        """获取激活记录"""
+    @staticmethod
+    def _overdue_conditions(now: datetime) -> list:
+        """已到期、仍为未使用状态的激活码条件（由过期时间部分索引覆盖）"""
+        table = ActivationCode.__table__
+        return [
+            table.c.status == ActivationCodeStatus.UNUSED,
+            table.c.expires_at.isnot(None),
+            table.c.expires_at < now
+        ]
+    
+    def expire_activation_codes(self, batch_size: int = None, now: datetime = None) -> int:
+        """
+        将已到期的未使用激活码标记为已过期（按批执行，每批一条 UPDATE 并提交）
+        
+        每批语句：
+        UPDATE activation_codes SET status = 'EXPIRED' WHERE id IN (
+            SELECT id FROM activation_codes WHERE 已到期 ORDER BY expires_at LIMIT :batch_size FOR UPDATE SKIP LOCKED
+        ) AND 已到期 RETURNING code
+        子查询按过期时间部分索引定位，不扫描全表；PostgreSQL 上跳过正在被激活的行，下一轮再处理。
+        
+        Args:
+            batch_size: 每批最多标记的数量，默认 EXPIRY_SWEEP_BATCH_SIZE
+            now: 截止时间（UTC），默认当前时间
+            
+        Returns:
+            标记为已过期的激活码数量
+        """
+        batch_size = batch_size or settings.EXPIRY_SWEEP_BATCH_SIZE
+        now = now or datetime.utcnow()
+        table = ActivationCode.__table__
+        conditions = self._overdue_conditions(now)
+        
+        expired = 0
+        while True:
+            batch = select(table.c.id)\
+                .where(*conditions)\
+                .order_by(table.c.expires_at)\
+                .limit(batch_size)\
+                .with_for_update(skip_locked=True)
+            codes = self.db.execute(
+                update(table)
+                .where(table.c.id.in_(batch), *conditions)
+                .values(status=ActivationCodeStatus.EXPIRED, updated_at=now)
+                .returning(table.c.code)
+            ).scalars().all()
+            self.db.commit()
+            
+            for code in codes:
+                invalidate_activation_code(code)
+                revoke_device_lease(code)
+            expired += len(codes)
+            
+            if len(codes) < batch_size:
+                return expired
+    
+    def get_activation_records(self, code: str, cursor: str = None, limit: int = 100) -> dict:
+        """
+        获取激活记录（按激活时间顺序，键集分页）
+        
+        Args:
+            code: 激活码
+            cursor: 上一页返回的 next_cursor，为空时从第一条开始
+            limit: 每页数量
+            
+        Returns:
+            激活记录及下一页游标（没有更多记录时为 None）
+        """
         activation_code = self.get_activation_code(code)
         
         if not activation_code:
@@ -851,9 +1758,19 @@ class ActivationCodeService:
             }
         
         try:
-            records = []
-            if activation_code.activation_records:
-                records = json.loads(activation_code.activation_records)
+            query = select(ActivationEvent)\
+                .where(ActivationEvent.activation_code_id == activation_code.id)\
+                .order_by(ActivationEvent.created_at, ActivationEvent.id)\
+                .limit(limit + 1)
+            if cursor:
+                created_at, event_id = self._decode_records_cursor(cursor)
+                query = query.where(
+                    tuple_(ActivationEvent.created_at, ActivationEvent.id) > tuple_(literal(created_at, DateTime), literal(event_id))
+                )
+            
+            events = self.db.execute(query).scalars().all()
+            has_more = len(events) > limit
+            events = events[:limit]
             
             return {
                 "success": True,
@@ -861,7 +1778,16 @@ class ActivationCodeService:
                 "max_activations": activation_code.max_activations,
                 "current_activations": activation_code.current_activations,
                 "remaining_activations": activation_code.max_activations - activation_code.current_activations,
-                "records": records
+                "records": [
+                    {
+                        "user_id": event.user_id,
+                        "activation_time": event.created_at.isoformat(),
+                        "device_info": json.loads(event.device_info) if event.device_info else None,
+                        "ip_address": event.ip_address
+                    }
+                    for event in events
+                ],
+                "next_cursor": f"{events[-1].created_at.isoformat()},{events[-1].id}" if has_more else None
             }
         except Exception as e:
             return {
@@ -869,6 +1795,15 @@ class ActivationCodeService:
                 "message": f"获取激活记录失败: {str(e)}"
             }
     
+    @staticmethod
+    def _decode_records_cursor(cursor: str):
+        """解析激活记录分页游标：激活时间,事件ID"""
+        try:
+            created_at, event_id = cursor.rsplit(",", 1)
+            return datetime.fromisoformat(created_at), int(event_id)
+        except ValueError:
+            raise Exception("分页游标无效")
+    
     def get_code_security_info(self) -> dict:
         """获取激活码安全信息"""
         return {
@@ -877,7 +1812,76 @@ class ActivationCodeService:
             "default_length": 32,
             "encryption_method": "HMAC-SHA256",
             "format_validation": True,
+            "tag_length": EnhancedActivationCodeGenerator.TAG_LENGTH,
+            "tag_algorithm": "BLAKE2b-MAC",
+            "tag_enforced": settings.ACTIVATION_CODE_TAG_ENFORCE,
             "hardware_binding": True,
             "fingerprint_algorithm": "SHA256",
             "multi_activation": True
-        }
\ No newline at end of file
+        }
+class AsyncActivationCodeService:
+    """
+    激活码服务（异步会话版本，供异步路由使用）
+    
+    通过 AsyncSession.run_sync 在异步会话上执行 ActivationCodeService 的同一套逻辑：
+    数据库 IO 由异步驱动（asyncpg / aiosqlite）完成，等待期间事件循环继续处理其他请求。
+    硬件绑定相关方法同样经由 ActivationCodeService 委托给 HardwareBindingService。
+    许可令牌在会话操作完成后于线程池中签发，ES256 签名不阻塞事件循环。
+    """
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def _run(self, method, *args):
+        """在异步会话上执行同步服务方法"""
+        result = await self.db.run_sync(
+            lambda session: method(ActivationCodeService(session, defer_license_tokens=True), *args)
+        )
+        if isinstance(result, dict) and isinstance(result.get("license_token"), _PendingLicenseToken):
+            result["license_token"] = await run_in_threadpool(issue_license_token, result["license_token"].snapshot)
+        return result
+    
+    async def verify_activation_code(self, request: ActivationCodeVerify) -> dict:
+        """验证激活码"""
+        return await self._run(ActivationCodeService.verify_activation_code, request)
+    
+    async def verify_activation_codes(self, codes: List[str]) -> List[dict]:
+        """批量验证激活码"""
+        return await self._run(ActivationCodeService.verify_activation_codes, codes)
+    
+    async def use_activation_code(self, code: str, user_id: str = None, device_info: dict = None, ip_address: str = None) -> dict:
+        """使用激活码"""
+        return await self._run(ActivationCodeService.use_activation_code, code, user_id, device_info, ip_address)
+    
+    async def use_activation_codes(self, items: List[Dict[str, Any]]) -> List[dict]:
+        """批量使用激活码"""
+        return await self._run(ActivationCodeService.use_activation_codes, items)
+    
+    async def get_activation_records(self, code: str, cursor: str = None, limit: int = 100) -> dict:
+        """获取激活记录"""
+        return await self._run(ActivationCodeService.get_activation_records, code, cursor, limit)
+    
+    async def refresh_license_token(self, license_token: str) -> dict:
+        """刷新离线许可令牌"""
+        return await self._run(ActivationCodeService.refresh_license_token, license_token)
+    
+    async def bind_to_hardware(self, code: str, hardware_fingerprint: str, user_id: str = None,
+                               hardware_components: Dict[str, str] = None) -> dict:
+        """将激活码绑定到硬件"""
+        return await self._run(ActivationCodeService.bind_to_hardware, code, hardware_fingerprint, user_id, hardware_components)
+    
+    async def verify_hardware_binding(self, code: str, hardware_fingerprint: str, hardware_components: Dict[str, str] = None) -> dict:
+        """验证硬件绑定"""
+        return await self._run(ActivationCodeService.verify_hardware_binding, code, hardware_fingerprint, hardware_components)
+    
+    async def verify_hardware_bindings(self, items: List[Dict[str, Any]]) -> List[dict]:
+        """批量验证硬件绑定（设备心跳）"""
+        return await self._run(ActivationCodeService.verify_hardware_bindings, items)
+    
+    async def get_hardware_binding_info(self, code: str) -> dict:
+        """获取硬件绑定信息"""
+        return await self._run(ActivationCodeService.get_hardware_binding_info, code)
+    
+    async def unbind_hardware(self, code: str, admin_key: str = None) -> dict:
+        """解绑硬件"""
+        return await self._run(ActivationCodeService.unbind_hardware, code, admin_key)
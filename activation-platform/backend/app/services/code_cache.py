@@ -0,0 +1,313 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Optional
+from app.config import settings
+from app.models import ActivationCode, ActivationCodeStatus
+
+# 快照中的时间字段
+_DATETIME_FIELDS = ("expires_at", "used_at", "created_at", "updated_at")
+
+
+def snapshot_activation_code(activation_code: ActivationCode) -> Dict[str, Any]:
+    """
+    生成激活码快照（不含激活记录），与会话无关，可安全缓存
+
+    metadata_json 解析为字典，快照可直接用于构建 ActivationCodeResponse。
+    """
+    metadata = None
+    if activation_code.metadata_json:
+        try:
+            metadata = json.loads(activation_code.metadata_json)
+        except ValueError:
+            metadata = None
+
+    return {
+        "id": activation_code.id,
+        "code": activation_code.code,
+        "product_id": activation_code.product_id,
+        "product_name": activation_code.product_name,
+        "status": activation_code.status,
+        "price": activation_code.price,
+        "currency": activation_code.currency,
+        "expires_at": activation_code.expires_at,
+        "used_at": activation_code.used_at,
+        "used_by": activation_code.used_by,
+        "metadata_json": metadata,
+        "max_activations": activation_code.max_activations,
+        "current_activations": activation_code.current_activations,
+        "batch_id": activation_code.batch_id,
+        "created_at": activation_code.created_at,
+        "updated_at": activation_code.updated_at,
+    }
+
+
+def _dump_snapshot(snapshot: Dict[str, Any]) -> str:
+    """快照序列化为JSON（共享缓存使用）"""
+    data = dict(snapshot)
+    data["status"] = snapshot["status"].name if snapshot["status"] else None
+    data["price"] = str(snapshot["price"]) if snapshot["price"] is not None else None
+    for field in _DATETIME_FIELDS:
+        data[field] = snapshot[field].isoformat() if snapshot[field] else None
+    return json.dumps(data)
+
+
+def _load_snapshot(raw: str) -> Dict[str, Any]:
+    """从JSON还原快照"""
+    data = json.loads(raw)
+    data["status"] = ActivationCodeStatus[data["status"]] if data["status"] else None
+    data["price"] = Decimal(data["price"]) if data["price"] is not None else None
+    for field in _DATETIME_FIELDS:
+        data[field] = datetime.fromisoformat(data[field]) if data[field] else None
+    return data
+
+
+# 在事件循环线程中发起的共享层（Redis）写操作交给该线程执行，保持先后顺序
+_shared_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-cache-writer")
+
+
+def on_event_loop() -> bool:
+    """当前线程是否正在运行事件循环（异步路由经 AsyncSession.run_sync 执行的同步服务代码同样在事件循环线程中）"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def run_shared_write(func, *args) -> None:
+    """执行共享层写操作：在事件循环线程中调用时交给后台线程执行（不等待结果），避免同步 Redis 调用阻塞事件循环"""
+    if on_event_loop():
+        _shared_writer.submit(func, *args)
+    else:
+        func(*args)
+
+
+class LRUTTLCache:
+    """进程内 LRU 缓存，条目超过存活时间后失效"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ActivationCodeCache:
+    """
+    激活码快照缓存
+
+    第一层为进程内 LRU/TTL 缓存，第二层为可选的 Redis 共享缓存。
+    写操作调用 invalidate 删除两层缓存，并通过 Redis 发布失效消息，
+    其他实例收到后删除各自的进程内缓存。Redis 不可用时只使用进程内缓存。
+    未启用共享缓存时失效只作用于当前进程，因此 WEB_CONCURRENCY 大于 1（多工作进程）时总是启用共享缓存。
+
+    读穿写入前先用 generation 取得当前失效序号，set 时若该激活码在此之后已失效（本进程的写操作或其他实例的失效消息）
+    则丢弃这次写入，避免并发的使用、禁用、解绑提交后又被读到的旧快照覆盖。
+    其他实例的失效消息到达之前写入的共享缓存仍可能短暂保留旧快照，最长为 CODE_CACHE_SHARED_TTL。
+
+    共享层使用同步 Redis 客户端：在事件循环线程中（异步路由）不读取共享层，未命中进程内缓存时直接查询数据库
+    （异步驱动，不阻塞事件循环），写入和失效交给后台线程执行。
+    """
+
+    KEY_PREFIX = "activation_code:"
+    INVALIDATION_CHANNEL = "activation_code_cache:invalidate"
+    INVALIDATION_HISTORY = 10000  # 保留最近失效记录的数量
+
+    def __init__(self, max_entries: int, ttl: float, redis_url: Optional[str] = None, shared_ttl: int = 300):
+        self.local = LRUTTLCache(max_entries, ttl)
+        self.shared_ttl = shared_ttl
+        self._redis = None
+        self._counters = {"local_hits": 0, "shared_hits": 0, "misses": 0, "invalidations": 0,
+                          "stale_writes": 0, "shared_errors": 0}
+        self._counter_lock = threading.Lock()
+        self._generation = 0  # 失效序号，每次失效加一
+        self._invalidated: "OrderedDict[str, int]" = OrderedDict()  # 最近失效的激活码 -> 失效时的序号
+        self._forgotten_generation = 0  # 已移出记录的最大失效序号
+        self._generation_lock = threading.Lock()
+        if redis_url:
+            self._connect_shared(redis_url)
+
+    def _connect_shared(self, redis_url: str) -> None:
+        """连接共享缓存并订阅失效消息"""
+        try:
+            import redis  # 延迟导入，未启用共享缓存时不依赖它
+            self._redis = redis.Redis.from_url(redis_url, socket_timeout=0.2, socket_connect_timeout=0.2)
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{self.INVALIDATION_CHANNEL: self._on_invalidation})
+            pubsub.run_in_thread(sleep_time=1, daemon=True)
+        except Exception as e:
+            print(f"共享缓存不可用，仅使用进程内缓存: {e}")
+            self._redis = None
+
+    def _on_invalidation(self, message: Dict[str, Any]) -> None:
+        """收到其他实例的失效消息"""
+        code = message.get("data")
+        if isinstance(code, bytes):
+            code = code.decode("utf-8")
+        if code:
+            self._invalidate_local(code)
+
+    def _count(self, name: str) -> None:
+        with self._counter_lock:
+            self._counters[name] += 1
+
+    def generation(self) -> int:
+        """读取数据库前获取当前失效序号，写入快照时传给 set"""
+        with self._generation_lock:
+            return self._generation
+
+    def _invalidate_local(self, code: str) -> None:
+        """记录失效序号并删除进程内缓存"""
+        with self._generation_lock:
+            self._generation += 1
+            self._invalidated[code] = self._generation
+            self._invalidated.move_to_end(code)
+            while len(self._invalidated) > self.INVALIDATION_HISTORY:
+                # 最早的记录序号最小，移出后以它作为未记录激活码的失效序号
+                self._forgotten_generation = self._invalidated.popitem(last=False)[1]
+            self.local.delete(code)
+
+    def _set_local(self, code: str, snapshot: Dict[str, Any], generation: Optional[int]) -> bool:
+        """写入进程内缓存，激活码在 generation 之后已失效时不写入"""
+        with self._generation_lock:
+            if generation is not None and self._invalidated.get(code, self._forgotten_generation) > generation:
+                self._count("stale_writes")
+                return False
+            self.local.set(code, snapshot)
+            return True
+
+    def get(self, code: str) -> Optional[Dict[str, Any]]:
+        """读取快照，未命中返回 None"""
+        snapshot = self.local.get(code)
+        if snapshot is not None:
+            self._count("local_hits")
+            return snapshot
+
+        if self._redis is not None and not on_event_loop():
+            generation = self.generation()
+            try:
+                raw = self._redis.get(self.KEY_PREFIX + code)
+            except Exception:
+                self._count("shared_errors")
+                raw = None
+            if raw is not None:
+                snapshot = _load_snapshot(raw)
+                self._set_local(code, snapshot, generation)
+                self._count("shared_hits")
+                return snapshot
+
+        self._count("misses")
+        return None
+
+    def set(self, code: str, snapshot: Dict[str, Any], generation: Optional[int] = None) -> None:
+        """
+        写入快照
+
+        Args:
+            code: 激活码
+            snapshot: 快照
+            generation: 读取数据库前由 generation() 取得的失效序号，之后激活码已失效时丢弃这次写入
+        """
+        if self._set_local(code, snapshot, generation) and self._redis is not None:
+            run_shared_write(self._set_shared, code, _dump_snapshot(snapshot))
+
+    def _set_shared(self, code: str, raw: str) -> None:
+        try:
+            self._redis.set(self.KEY_PREFIX + code, raw, ex=self.shared_ttl)
+        except Exception:
+            self._count("shared_errors")
+
+    def invalidate(self, code: str) -> None:
+        """激活码发生变化后删除缓存（使用、绑定、解绑、状态变更）"""
+        self._invalidate_local(code)
+        self._count("invalidations")
+        if self._redis is not None:
+            run_shared_write(self._invalidate_shared, code)
+
+    def _invalidate_shared(self, code: str) -> None:
+        try:
+            self._redis.delete(self.KEY_PREFIX + code)
+            self._redis.publish(self.INVALIDATION_CHANNEL, code)
+        except Exception:
+            self._count("shared_errors")
+
+    def clear(self) -> None:
+        """清空进程内缓存"""
+        self.local.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """命中率统计"""
+        with self._counter_lock:
+            counters = dict(self._counters)
+        lookups = counters["local_hits"] + counters["shared_hits"] + counters["misses"]
+        hits = counters["local_hits"] + counters["shared_hits"]
+        return {
+            **counters,
+            "lookups": lookups,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "local_entries": len(self.local),
+            "shared_enabled": self._redis is not None,
+        }
+
+
+_activation_code_cache: Optional[ActivationCodeCache] = None
+_activation_code_cache_lock = threading.Lock()
+
+
+def get_activation_code_cache() -> Optional[ActivationCodeCache]:
+    """获取进程内共享的激活码缓存，未启用时返回 None"""
+    global _activation_code_cache
+    if not settings.CODE_CACHE_ENABLED:
+        return None
+    with _activation_code_cache_lock:
+        if _activation_code_cache is None:
+            _activation_code_cache = ActivationCodeCache(
+                settings.CODE_CACHE_MAX_ENTRIES,
+                settings.CODE_CACHE_TTL,
+                settings.REDIS_URL if settings.CODE_CACHE_SHARED or settings.WEB_CONCURRENCY > 1 else None,
+                settings.CODE_CACHE_SHARED_TTL
+            )
+        return _activation_code_cache
+
+
+def invalidate_activation_code(code: str) -> None:
+    """删除激活码缓存（缓存未启用时不做任何事）"""
+    cache = get_activation_code_cache()
+    if cache is not None:
+        cache.invalidate(code)
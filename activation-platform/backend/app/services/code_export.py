@@ -0,0 +1,97 @@
+import csv
+import io
+import json
+from typing import Iterator, Optional, Sequence
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import ActivationCode
+
+# 导出格式及对应的响应类型
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+# 导出字段（印刷厂只需要这三列）
+EXPORT_FIELDS = ("code", "product_id", "expires_at")
+
+
+def stream_code_export(export_format: str, batch_id: Optional[str] = None,
+                       product_id: Optional[str] = None) -> Iterator[str]:
+    """使用独立会话流式导出激活码，会话生命周期与响应流一致"""
+    db = SessionLocal()
+    try:
+        yield from CodeExportService(db).iter_export(export_format, batch_id=batch_id, product_id=product_id)
+    finally:
+        db.close()
+
+
+class CodeExportService:
+    """激活码流式导出服务"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def iter_export(self, export_format: str, batch_id: Optional[str] = None,
+                    product_id: Optional[str] = None, chunk_size: int = None) -> Iterator[str]:
+        """
+        按批次或产品流式导出激活码
+
+        使用服务端游标（yield_per）分块读取，每块格式化为一段文本后立即产出，
+        内存占用只与块大小有关，与导出总量无关。
+
+        Args:
+            export_format: 导出格式（csv / ndjson）
+            batch_id: 生成批次ID
+            product_id: 产品ID
+            chunk_size: 每块读取的行数
+
+        Yields:
+            格式化后的文本块
+        """
+        if export_format not in EXPORT_MEDIA_TYPES:
+            raise Exception(f"不支持的导出格式: {export_format}")
+        if batch_id is None and product_id is None:
+            raise Exception("必须指定批次ID或产品ID")
+
+        chunk_size = chunk_size or settings.CODE_BULK_INSERT_CHUNK_SIZE
+        query = select(ActivationCode.code, ActivationCode.product_id, ActivationCode.expires_at)
+        if batch_id is not None:
+            query = query.where(ActivationCode.batch_id == batch_id)
+        if product_id is not None:
+            query = query.where(ActivationCode.product_id == product_id)
+        query = query.order_by(ActivationCode.id).execution_options(yield_per=chunk_size)
+
+        if export_format == "csv":
+            yield ",".join(EXPORT_FIELDS) + "\r\n"
+            formatter = self._format_csv
+        else:
+            formatter = self._format_ndjson
+
+        for partition in self.db.execute(query).partitions():
+            yield formatter(partition)
+
+    @staticmethod
+    def _format_csv(rows: Sequence) -> str:
+        """将一块数据格式化为CSV"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows(
+            (row.code, row.product_id, row.expires_at.isoformat() if row.expires_at else "")
+            for row in rows
+        )
+        return buffer.getvalue()
+
+    @staticmethod
+    def _format_ndjson(rows: Sequence) -> str:
+        """将一块数据格式化为NDJSON（每行一个JSON对象）"""
+        return "".join(
+            json.dumps({
+                "code": row.code,
+                "product_id": row.product_id,
+                "expires_at": row.expires_at.isoformat() if row.expires_at else None
+            }) + "\n"
+            for row in rows
+        )
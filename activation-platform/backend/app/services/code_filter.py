@@ -0,0 +1,251 @@
+import hashlib
+import math
+import os
+import struct
+import threading
+from typing import Any, Iterable, Optional, Set
+from sqlalchemy import select
+from app.config import settings
+from app.database import SessionLocal
+from app.models import ActivationCode
+
+
+class BloomFilter:
+    """布隆过滤器 - 判定为不存在的元素一定不存在，判定为存在的可能误判"""
+
+    MAGIC = b"ACBF"
+    VERSION = 2
+    HEADER = struct.Struct(">4sBQBQQ")  # 魔数、版本、位数、哈希函数个数、元素数量、已包含的最大激活码ID
+    PAGE_SIZE = 4096  # 增量持久化的页大小（字节）
+
+    def __init__(self, bit_count: int, hash_count: int, bits: Optional[bytearray] = None, count: int = 0,
+                 high_water: int = 0):
+        self.bit_count = bit_count
+        self.hash_count = hash_count
+        self.bits = bits if bits is not None else bytearray((bit_count + 7) // 8)
+        self.count = count
+        self.high_water = high_water
+        self._saved_path: Optional[str] = None  # 与内存内容一致（除脏页外）的文件
+        self._dirty_pages: Set[int] = set()
+
+    @classmethod
+    def for_capacity(cls, capacity: int, error_rate: float) -> "BloomFilter":
+        """按预期容量和误判率创建过滤器"""
+        capacity = max(capacity, 1)
+        bit_count = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        hash_count = max(1, round(bit_count / capacity * math.log(2)))
+        return cls(bit_count, hash_count)
+
+    def _positions(self, item: str) -> Iterable[int]:
+        """双重哈希计算各位位置"""
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.bit_count
+
+    def add(self, item: str) -> None:
+        """添加元素"""
+        bits = self.bits
+        dirty_pages = self._dirty_pages
+        page_bits = self.PAGE_SIZE * 8
+        for position in self._positions(item):
+            bits[position >> 3] |= 1 << (position & 7)
+            dirty_pages.add(position // page_bits)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        for position in self._positions(item):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def _header(self) -> bytes:
+        return self.HEADER.pack(self.MAGIC, self.VERSION, self.bit_count, self.hash_count, self.count, self.high_water)
+
+    def save(self, path: str) -> None:
+        """
+        保存到文件
+
+        文件已与本过滤器对应时只原地写回新增位所在的页，最后写文件头；
+        位只会从 0 变为 1，写入中断时文件头中的元素数量和最大ID仍是旧值，加载后按最大ID补齐即可。
+        其他情况先写临时文件再整体替换。
+        """
+        if self._saved_path == path and os.path.exists(path) \
+                and os.path.getsize(path) == self.HEADER.size + len(self.bits):
+            with open(path, 'r+b') as f:
+                for page in sorted(self._dirty_pages):
+                    offset = page * self.PAGE_SIZE
+                    f.seek(self.HEADER.size + offset)
+                    f.write(self.bits[offset:offset + self.PAGE_SIZE])
+                f.flush()
+                os.fsync(f.fileno())
+                f.seek(0)
+                f.write(self._header())
+            self._dirty_pages.clear()
+            return
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(self._header())
+            f.write(self.bits)
+        os.replace(temp_path, path)
+        self._saved_path = path
+        self._dirty_pages.clear()
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BloomFilter"]:
+        """从文件加载，文件不存在或格式不正确时返回 None"""
+        try:
+            with open(path, 'rb') as f:
+                magic, version, bit_count, hash_count, count, high_water = cls.HEADER.unpack(f.read(cls.HEADER.size))
+                bits = bytearray(f.read())
+        except (OSError, struct.error):
+            return None
+
+        if magic != cls.MAGIC or version != cls.VERSION or len(bits) != (bit_count + 7) // 8:
+            return None
+        bloom = cls(bit_count, hash_count, bits, count, high_water)
+        bloom._saved_path = path
+        return bloom
+
+
+class IssuedCodeFilter:
+    """
+    已发放激活码过滤器
+
+    持久化保存在 CODE_FILTER_PATH，文件头记录已包含的最大激活码ID（高水位）。
+    启动时在后台线程中加载（文件缺失或元素数量超出容量时从数据库流式重建），
+    并从数据库补齐高水位之后写入的激活码（其他进程写入、或上次持久化之后写入的）；
+    加载完成前一律判定为可能存在，由数据库确认。写入激活码时增量更新。
+
+    过滤器不与其他进程实时同步，判定不存在不能作为唯一性保证，写入时仍依赖数据库唯一约束兜底。
+    """
+
+    def __init__(self, path: str, capacity: int, error_rate: float, save_every: int):
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.save_every = save_every
+        self._filter: Optional[BloomFilter] = None
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._loader: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        """是否已加载完成"""
+        return self._filter is not None
+
+    def start(self) -> None:
+        """在后台线程中加载过滤器（启动时调用）"""
+        with self._lock:
+            if self._filter is not None or (self._loader and self._loader.is_alive()):
+                return
+            self._loader = threading.Thread(target=self.load, name="issued-code-filter", daemon=True)
+            self._loader.start()
+
+    def load(self) -> None:
+        """加载或重建过滤器，并补齐高水位之后写入的激活码"""
+        bloom = BloomFilter.load(self.path)
+        if bloom is None or bloom.count > self.capacity:
+            bloom = self._build()
+        self._catch_up(bloom)
+
+        with self._lock:
+            # 补齐加载期间写入的激活码（加载期间 add_many 不更新过滤器）
+            self._catch_up(bloom)
+            self._filter = bloom
+            bloom.save(self.path)
+            self._unsaved = 0
+
+    def _build(self) -> BloomFilter:
+        """从数据库流式重建过滤器"""
+        db = SessionLocal()
+        try:
+            total = db.query(ActivationCode.id).count()
+            self.capacity = max(self.capacity, total * 2)
+        finally:
+            db.close()
+        return BloomFilter.for_capacity(self.capacity, self.error_rate)
+
+    @staticmethod
+    def _catch_up(bloom: BloomFilter) -> int:
+        """从数据库流式添加ID高于高水位的激活码"""
+        added = 0
+        db = SessionLocal()
+        try:
+            query = select(ActivationCode.id, ActivationCode.code)\
+                .where(ActivationCode.id > bloom.high_water)\
+                .order_by(ActivationCode.id)\
+                .execution_options(yield_per=50000)
+            for partition in db.execute(query).partitions():
+                for row in partition:
+                    if row.code not in bloom:  # 本进程已添加过的不重复计数
+                        bloom.add(row.code)
+                        added += 1
+                bloom.high_water = partition[-1].id
+        finally:
+            db.close()
+        return added
+
+    def might_contain(self, code: str) -> bool:
+        """判断激活码是否可能已发放（加载完成前总是返回 True）"""
+        bloom = self._filter
+        return bloom is None or code in bloom
+
+    def add_many(self, rows: Iterable[Any]) -> None:
+        """
+        增量添加已写入的激活码，累计到一定数量后持久化
+
+        Args:
+            rows: 写入后返回的行（含 id、code）
+        """
+        with self._lock:
+            bloom = self._filter
+            if bloom is None:
+                return
+            ids = []
+            for row in rows:
+                bloom.add(row.code)
+                ids.append(row.id)
+            self._unsaved += len(ids)
+            # 高水位只在ID连续时推进，其他进程写入造成的空缺留到下次加载时从数据库补齐
+            for row_id in sorted(ids):
+                if row_id != bloom.high_water + 1:
+                    break
+                bloom.high_water = row_id
+            if self._unsaved >= self.save_every:
+                bloom.save(self.path)
+                self._unsaved = 0
+
+    def save(self) -> None:
+        """立即持久化"""
+        with self._lock:
+            if self._filter is not None and self._unsaved:
+                self._filter.save(self.path)
+                self._unsaved = 0
+
+
+_issued_code_filter: Optional[IssuedCodeFilter] = None
+_issued_code_filter_lock = threading.Lock()
+
+
+def get_issued_code_filter() -> Optional[IssuedCodeFilter]:
+    """获取进程内共享的已发放激活码过滤器，未启用时返回 None"""
+    global _issued_code_filter
+    if not settings.CODE_FILTER_ENABLED:
+        return None
+    with _issued_code_filter_lock:
+        if _issued_code_filter is None:
+            _issued_code_filter = IssuedCodeFilter(
+                settings.CODE_FILTER_PATH,
+                settings.CODE_FILTER_CAPACITY,
+                settings.CODE_FILTER_ERROR_RATE,
+                settings.CODE_FILTER_SAVE_EVERY
+            )
+        return _issued_code_filter
@@ -0,0 +1,195 @@
+import hashlib
+import hmac
+import threading
+from typing import List, Optional, Tuple
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from app.config import settings
+from app.database import SessionLocal
+from app.models import CodeSequence
+from app.services.activation_service import EnhancedActivationCodeGenerator
+
+
+class CodePermutation:
+    """
+    激活码保格式置换
+
+    采用 FF1 结构的交替 Feistel 网络（轮函数为带密钥的 BLAKE2b），
+    在 32 字符集上对固定位数的数值做带密钥的双射，
+    不同输入必然得到不同输出，输出看起来是随机的。
+    """
+
+    ROUNDS = 10
+    RADIX = 32
+
+    def __init__(self, key: bytes, symbols: int):
+        if symbols < 2:
+            raise ValueError("置换位数至少为2")
+        self.key = key if len(key) <= 64 else hashlib.sha256(key).digest()  # BLAKE2b 密钥最长64字节
+        self.symbols = symbols
+        self.left_symbols = symbols // 2
+        self.right_symbols = symbols - self.left_symbols
+        self.domain = self.RADIX ** symbols
+        self._value_bytes = (self.right_symbols * 5 + 7) // 8
+        self._left_modulus = self.RADIX ** self.left_symbols
+        self._right_modulus = self.RADIX ** self.right_symbols
+
+    def _round(self, index: int, value: int, modulus: int) -> int:
+        """轮函数：带密钥的 BLAKE2b(轮次 + 位数 + 输入)"""
+        message = bytes((index, self.symbols)) + value.to_bytes(self._value_bytes, 'big')
+        digest = hashlib.blake2b(message, key=self.key, digest_size=32).digest()
+        return int.from_bytes(digest, 'big') % modulus
+
+    def encrypt(self, value: int) -> int:
+        """正向置换"""
+        if not 0 <= value < self.domain:
+            raise ValueError("置换输入超出范围")
+
+        left, right = divmod(value, self._right_modulus)
+        for index in range(self.ROUNDS):
+            modulus = self._left_modulus if index % 2 == 0 else self._right_modulus
+            left, right = right, (left + self._round(index, right, modulus)) % modulus
+        return left * self._right_modulus + right
+
+    def decrypt(self, value: int) -> int:
+        """逆向置换"""
+        if not 0 <= value < self.domain:
+            raise ValueError("置换输入超出范围")
+
+        left, right = divmod(value, self._right_modulus)
+        for index in reversed(range(self.ROUNDS)):
+            modulus = self._left_modulus if index % 2 == 0 else self._right_modulus
+            left, right = (right - self._round(index, left, modulus)) % modulus, left
+        return left * self._right_modulus + right
+
+    def encode(self, value: int) -> str:
+        """将置换结果编码为安全字符"""
+        characters = EnhancedActivationCodeGenerator.CHARACTERS
+        symbols = []
+        for _ in range(self.symbols):
+            value, index = divmod(value, self.RADIX)
+            symbols.append(characters[index])
+        return ''.join(reversed(symbols))
+
+    def decode(self, text: str) -> int:
+        """将安全字符解码为数值"""
+        characters = EnhancedActivationCodeGenerator.CHARACTERS
+        value = 0
+        for char in text:
+            value = value * self.RADIX + characters.index(char)
+        return value
+
+
+class SequenceAllocator:
+    """
+    节点序号分配器
+
+    按块从 code_sequences 表预留序号（单行原子 UPDATE），块内序号在内存中分配，
+    多个实例共享同一节点ID时也不会拿到重复序号。
+    """
+
+    def __init__(self, node_id: int, block_size: int):
+        self.node_id = node_id
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def allocate(self, count: int) -> List[Tuple[int, int]]:
+        """
+        分配指定数量的序号
+
+        Returns:
+            序号区间列表 [(起始, 结束)]，左闭右开
+        """
+        ranges = []
+        with self._lock:
+            while count > 0:
+                if self._next >= self._end:
+                    self._next, self._end = self._reserve_block(max(count, self.block_size))
+                take = min(count, self._end - self._next)
+                ranges.append((self._next, self._next + take))
+                self._next += take
+                count -= take
+        return ranges
+
+    def _reserve_block(self, size: int) -> Tuple[int, int]:
+        """使用独立会话预留一个序号块并立即提交"""
+        db = SessionLocal()
+        try:
+            while True:
+                end = db.execute(
+                    update(CodeSequence)
+                    .where(CodeSequence.node_id == self.node_id)
+                    .values(next_value=CodeSequence.next_value + size)
+                    .returning(CodeSequence.next_value)
+                ).scalar()
+                if end is not None:
+                    db.commit()
+                    return end - size, end
+
+                # 节点首次使用时创建序号行，并发创建冲突时重试
+                try:
+                    db.add(CodeSequence(node_id=self.node_id, next_value=0))
+                    db.commit()
+                except IntegrityError:
+                    db.rollback()
+        finally:
+            db.close()
+
+
+class PermutedCodeGenerator:
+    """置换模式激活码生成器 - (节点ID, 序号) 经密钥置换后编码并追加校验位，无需查重"""
+
+    NODE_BITS = 16
+
+    def __init__(self, node_id: int = None, length: int = 32, prefix: str = None,
+                 key: Optional[bytes] = None, allocator: Optional[SequenceAllocator] = None):
+        self.node_id = settings.CODE_NODE_ID if node_id is None else node_id
+        if not 0 <= self.node_id < (1 << self.NODE_BITS):
+            raise ValueError("节点ID超出范围")
+        self.prefix = prefix if prefix is not None else settings.ACTIVATION_CODE_PREFIX
+        self.tag_length = EnhancedActivationCodeGenerator.TAG_LENGTH
+        self.permutation = CodePermutation(key or self.derive_key(), length - len(self.prefix) - self.tag_length)
+        self.counter_space = self.permutation.domain >> self.NODE_BITS
+        self.allocator = allocator or SequenceAllocator(self.node_id, settings.CODE_SEQUENCE_BLOCK_SIZE)
+
+    @staticmethod
+    def derive_key() -> bytes:
+        """获取置换密钥"""
+        if settings.CODE_PERMUTATION_KEY:
+            return settings.CODE_PERMUTATION_KEY.encode('utf-8')
+        return hmac.digest(settings.ACTIVATION_CODE_SALT_KEY.encode('utf-8'), b"code-permutation", hashlib.sha256)
+
+    def code_for(self, counter: int) -> str:
+        """计算指定序号对应的激活码"""
+        if not 0 <= counter < self.counter_space:
+            raise ValueError("序号超出范围")
+        value = self.node_id * self.counter_space + counter
+        body = self.prefix + self.permutation.encode(self.permutation.encrypt(value))
+        return EnhancedActivationCodeGenerator.sign_code(body)
+
+    def locate(self, code: str) -> Tuple[int, int]:
+        """反查激活码对应的 (节点ID, 序号)"""
+        value = self.permutation.decrypt(self.permutation.decode(code[len(self.prefix):-self.tag_length]))
+        return divmod(value, self.counter_space)
+
+    def generate(self, count: int) -> List[str]:
+        """生成指定数量的激活码"""
+        codes = []
+        for start, end in self.allocator.allocate(count):
+            codes.extend(self.code_for(counter) for counter in range(start, end))
+        return codes
+
+
+_default_generator: Optional[PermutedCodeGenerator] = None
+_default_generator_lock = threading.Lock()
+
+
+def get_permuted_code_generator() -> PermutedCodeGenerator:
+    """获取进程内共享的置换生成器（共享序号块）"""
+    global _default_generator
+    with _default_generator_lock:
+        if _default_generator is None:
+            _default_generator = PermutedCodeGenerator()
+        return _default_generator
@@ -0,0 +1,217 @@
+import threading
+import uuid
+from decimal import Decimal
+from typing import Any, Dict, Optional
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import ActivationCode, ActivationCodePool, Product
+from app.schemas import ActivationCodeBase, ActivationCodeCreate
+from app.services.activation_service import ActivationCodeService
+from app.services.code_cache import invalidate_activation_code
+
+
+class CodePoolService:
+    """
+    预生成激活码池服务
+
+    产品表中每个上架产品维护一组已写入数据库、尚未发放的激活码。支付下单时直接从池中领取，
+    请求路径上不做生成和查重；池内数量由后台补充线程维持在低水位以上。
+    不在产品表中的产品没有激活码池，下单时当场生成。
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def pool_size(self, product_id: str) -> int:
+        """获取产品激活码池内剩余数量"""
+        return self.db.execute(
+            select(func.count(ActivationCodePool.id)).where(ActivationCodePool.product_id == product_id)
+        ).scalar()
+
+    def claim(self, product_id: str, product_name: str = None, price: float = None,
+              currency: str = None, max_activations: int = None) -> Optional[Dict[str, Any]]:
+        """
+        原子领取一个预生成激活码
+
+        PostgreSQL 上子查询使用 FOR UPDATE SKIP LOCKED，并发下单各自领取不同的行而不互相等待；
+        SQLite 不支持行锁（写事务本身串行），同一条 DELETE ... RETURNING 语句同样保证只被领取一次。
+
+        Args:
+            product_id: 产品ID
+            product_name: 产品名称（覆盖预生成时的值）
+            price: 价格（覆盖预生成时的值）
+            currency: 货币（覆盖预生成时的值）
+            max_activations: 最大激活次数（覆盖预生成时的值）
+
+        Returns:
+            领取到的激活码 {"id", "code"}，池为空时返回 None
+        """
+        next_entry = select(ActivationCodePool.id)\
+            .where(ActivationCodePool.product_id == product_id)\
+            .order_by(ActivationCodePool.id)\
+            .limit(1)\
+            .with_for_update(skip_locked=True)\
+            .scalar_subquery()
+
+        code_id = self.db.execute(
+            delete(ActivationCodePool)
+            .where(ActivationCodePool.id == next_entry)
+            .returning(ActivationCodePool.activation_code_id)
+            .execution_options(synchronize_session=False)  # 避免 ORM 在 RETURNING 中追加主键列
+        ).scalar()
+        if code_id is None:
+            return None
+
+        # 按本次下单的商品信息更新激活码（主键更新，开销固定）
+        values = {
+            key: value for key, value in {
+                "product_name": product_name,
+                "price": Decimal(str(price)) if price is not None else None,
+                "currency": currency,
+                "max_activations": max_activations
+            }.items() if value is not None
+        }
+        row = self.db.execute(
+            update(ActivationCode)
+            .where(ActivationCode.id == code_id)
+            .values(updated_at=func.now(), **values)
+            .returning(ActivationCode.id, ActivationCode.code)
+            .execution_options(synchronize_session=False)
+        ).first()
+        self.db.commit()
+        invalidate_activation_code(row.code)
+        return {"id": row.id, "code": row.code}
+
+    def release(self, product_id: str, activation_code_id: int) -> None:
+        """将未完成下单的激活码放回池中"""
+        self.db.execute(insert(ActivationCodePool).values(
+            product_id=product_id,
+            activation_code_id=activation_code_id
+        ))
+        self.db.commit()
+
+    def issue(self, product_id: str, product_name: str, price: float, currency: str = "CNY",
+              max_activations: int = 1) -> Dict[str, Any]:
+        """
+        为一次下单发放激活码：优先从池中领取，池为空时当场生成一个
+
+        Returns:
+            发放的激活码 {"id", "code"}
+        """
+        if settings.CODE_POOL_ENABLED:
+            claimed = self.claim(product_id, product_name, price, currency, max_activations)
+            get_code_pool_refiller().wake()
+            if claimed is not None:
+                return claimed
+
+        activation_code = ActivationCodeService(self.db).create_activation_codes(ActivationCodeCreate(
+            product_id=product_id,
+            product_name=product_name,
+            price=price,
+            currency=currency,
+            max_activations=max_activations,
+            quantity=1
+        ))[0]
+        return {"id": activation_code.id, "code": activation_code.code}
+
+    def refill(self, product_id: str, product_name: str, price: float, currency: str = "CNY") -> int:
+        """
+        池内数量低于低水位时补充到 低水位 + CODE_POOL_REFILL_SIZE
+
+        Returns:
+            本次补充的数量
+        """
+        current = self.pool_size(product_id)
+        if current >= settings.CODE_POOL_LOW_WATER:
+            return 0
+
+        quantity = settings.CODE_POOL_LOW_WATER + settings.CODE_POOL_REFILL_SIZE - current
+        code_service = ActivationCodeService(self.db)
+        request = ActivationCodeBase(product_id=product_id, product_name=product_name, price=price, currency=currency)
+
+        added = 0
+        codes = code_service._generate_unique_codes(quantity)
+        for rows in code_service.insert_activation_codes(codes, request, batch_id=str(uuid.uuid4())):
+            self.db.execute(insert(ActivationCodePool), [
+                {"product_id": product_id, "activation_code_id": row["id"]} for row in rows
+            ])
+            added += len(rows)
+
+        self.db.commit()
+        return added
+
+
+class CodePoolRefiller:
+    """激活码池后台补充线程"""
+
+    def __init__(self, interval: float = None):
+        self.interval = interval if interval is not None else settings.CODE_POOL_REFILL_INTERVAL
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def wake(self) -> None:
+        """立即触发一次补充检查"""
+        self._wake_event.set()
+
+    def start(self) -> None:
+        """启动后台补充线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="code-pool-refiller", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止后台补充线程"""
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.refill_all()
+            except Exception as e:
+                print(f"激活码池补充失败: {e}")
+            self._wake_event.wait(self.interval)
+            self._wake_event.clear()
+
+    def refill_all(self) -> int:
+        """
+        检查并补充产品表中所有上架产品的激活码池
+
+        Returns:
+            本次补充的总数量
+        """
+        db = SessionLocal()
+        try:
+            products = {
+                product.product_id: (product.name, float(product.price), product.currency or "CNY")
+                for product in db.query(Product).filter(Product.is_active == True).all()
+            }
+
+            service = CodePoolService(db)
+            return sum(
+                service.refill(product_id, product_name, price, currency)
+                for product_id, (product_name, price, currency) in products.items()
+            )
+        finally:
+            db.close()
+
+
+_code_pool_refiller: Optional[CodePoolRefiller] = None
+_code_pool_refiller_lock = threading.Lock()
+
+
+def get_code_pool_refiller() -> CodePoolRefiller:
+    """获取进程内共享的激活码池补充线程"""
+    global _code_pool_refiller
+    with _code_pool_refiller_lock:
+        if _code_pool_refiller is None:
+            _code_pool_refiller = CodePoolRefiller()
+        return _code_pool_refiller
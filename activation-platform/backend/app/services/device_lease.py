@@ -0,0 +1,249 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from app.config import settings
+from app.services.code_cache import LRUTTLCache, on_event_loop, run_shared_write
+
+
+class DeviceLeaseTable:
+    """
+    设备租约表
+
+    硬件绑定验证通过后为 (激活码, 硬件指纹) 发放租约，租约有效期内同一设备再次验证直接在内存中续约，
+    不查询数据库；租约过期、设备不同或租约不存在时才回到数据库验证。续约不会超过发放后的最大租约时长，
+    也不会超过激活码自身的过期时间，到期后必须重新经过数据库验证；直接修改数据库等未经服务撤销租约的变更
+    最晚在最大租约时长后生效。
+
+    第一层为进程内 LRU 表，第二层为可选的 Redis 共享表（多实例间共享租约）。
+    解绑、重新绑定以及激活码状态变更（如过期清扫）时调用 revoke 删除两层租约，
+    并通过 Redis 发布撤销消息，其他实例收到后删除各自的进程内租约。未启用共享租约表时撤销只作用于当前进程，
+    因此 WEB_CONCURRENCY 大于 1（多工作进程）时总是启用共享租约表。
+
+    与激活码缓存相同，数据库验证前先用 generation 取得撤销序号，grant 时若该激活码在此之后已被撤销则不发放租约，
+    避免验证期间提交的解绑或状态变更被随后写入的租约覆盖。
+    与激活码缓存相同，在事件循环线程中不读取共享表，写入和撤销交给后台线程执行。
+    """
+
+    KEY_PREFIX = "device_lease:"
+    REVOCATION_CHANNEL = "device_lease:revoke"
+    REVOCATION_HISTORY = 10000  # 保留最近撤销记录的数量
+
+    def __init__(self, max_entries: int, ttl: float, max_age: float, redis_url: Optional[str] = None):
+        self.ttl = ttl
+        self.max_age = max_age
+        self.local = LRUTTLCache(max_entries, max_age)
+        self._redis = None
+        self._counters = {"renewals": 0, "grants": 0, "misses": 0, "revocations": 0,
+                          "stale_grants": 0, "shared_errors": 0}
+        self._counter_lock = threading.Lock()
+        self._generation = 0  # 撤销序号，每次撤销加一
+        self._revoked: "OrderedDict[str, int]" = OrderedDict()  # 最近撤销的激活码 -> 撤销时的序号
+        self._forgotten_generation = 0  # 已移出记录的最大撤销序号
+        self._generation_lock = threading.Lock()
+        if redis_url:
+            self._connect_shared(redis_url)
+
+    def _connect_shared(self, redis_url: str) -> None:
+        """连接共享租约表并订阅撤销消息"""
+        try:
+            import redis  # 延迟导入，未启用共享租约时不依赖它
+            self._redis = redis.Redis.from_url(redis_url, socket_timeout=0.2, socket_connect_timeout=0.2)
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{self.REVOCATION_CHANNEL: self._on_revocation})
+            pubsub.run_in_thread(sleep_time=1, daemon=True)
+        except Exception as e:
+            print(f"共享租约表不可用，仅使用进程内租约: {e}")
+            self._redis = None
+
+    def _on_revocation(self, message: Dict[str, Any]) -> None:
+        """收到其他实例的撤销消息"""
+        code = message.get("data")
+        if isinstance(code, bytes):
+            code = code.decode("utf-8")
+        if code:
+            self._revoke_local(code)
+
+    def _count(self, name: str) -> None:
+        with self._counter_lock:
+            self._counters[name] += 1
+
+    def generation(self) -> int:
+        """数据库验证前获取当前撤销序号，发放租约时传给 grant"""
+        with self._generation_lock:
+            return self._generation
+
+    def _revoke_local(self, code: str) -> None:
+        """记录撤销序号并删除进程内租约"""
+        with self._generation_lock:
+            self._generation += 1
+            self._revoked[code] = self._generation
+            self._revoked.move_to_end(code)
+            while len(self._revoked) > self.REVOCATION_HISTORY:
+                # 最早的记录序号最小，移出后以它作为未记录激活码的撤销序号
+                self._forgotten_generation = self._revoked.popitem(last=False)[1]
+            self.local.delete(code)
+
+    def _store_local(self, code: str, lease: Dict[str, Any], generation: Optional[int]) -> bool:
+        """写入进程内租约，激活码在 generation 之后已被撤销时不写入"""
+        with self._generation_lock:
+            if generation is not None and self._revoked.get(code, self._forgotten_generation) > generation:
+                return False
+            self.local.set(code, lease)
+            return True
+
+    def _store(self, code: str, lease: Dict[str, Any], generation: Optional[int] = None) -> bool:
+        """写入租约"""
+        if not self._store_local(code, lease, generation):
+            return False
+        if self._redis is not None:
+            run_shared_write(self._store_shared, code, lease)
+        return True
+
+    def _store_shared(self, code: str, lease: Dict[str, Any]) -> None:
+        try:
+            ttl = max(int(lease["expires_at"] - time.time()) + 1, 1)
+            self._redis.set(self.KEY_PREFIX + code, json.dumps(lease), ex=ttl)
+        except Exception:
+            self._count("shared_errors")
+
+    def _load(self, code: str) -> Optional[Dict[str, Any]]:
+        """读取租约（先进程内，后共享表）"""
+        lease = self.local.get(code)
+        if lease is not None or self._redis is None or on_event_loop():
+            return lease
+        generation = self.generation()
+        try:
+            raw = self._redis.get(self.KEY_PREFIX + code)
+        except Exception:
+            self._count("shared_errors")
+            return None
+        if raw is None:
+            return None
+        lease = json.loads(raw)
+        return lease if self._store_local(code, lease, generation) else None
+
+    def renew(self, code: str, hardware_fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        续约
+
+        Args:
+            code: 激活码
+            hardware_fingerprint: 当前设备的硬件指纹
+
+        Returns:
+            续约后的租约，租约不存在、已过期或属于其他设备时返回 None（需要查询数据库）
+        """
+        now = time.time()
+        generation = self.generation()
+        lease = self._load(code)
+        if lease is None or lease["fingerprint"] != hardware_fingerprint or lease["expires_at"] <= now:
+            self._count("misses")
+            return None
+
+        lease = dict(lease, expires_at=self._expires_at(now + self.ttl, lease))
+        if lease["expires_at"] <= now or not self._store(code, lease, generation):
+            # 激活码已过期（租约随之到期），或续约期间被撤销
+            self._count("misses")
+            return None
+        self._count("renewals")
+        return lease
+
+    def _expires_at(self, expires_at: float, lease: Dict[str, Any]) -> float:
+        """租约到期时间不超过最大租约时长和激活码过期时间"""
+        expires_at = min(expires_at, lease["granted_at"] + self.max_age)
+        if lease.get("code_expires_at") is not None:
+            expires_at = min(expires_at, lease["code_expires_at"])
+        return expires_at
+
+    def grant(self, code: str, hardware_fingerprint: str, match_score: float,
+              binding_info: Optional[Dict[str, Any]] = None, code_expires_at: Optional[datetime] = None,
+              generation: Optional[int] = None) -> Dict[str, Any]:
+        """
+        数据库验证通过后发放租约
+
+        Args:
+            code: 激活码
+            hardware_fingerprint: 验证通过的硬件指纹
+            match_score: 验证时的组件匹配度
+            binding_info: 绑定信息（续约时原样返回）
+            code_expires_at: 激活码过期时间（UTC），租约不会续约到该时间之后
+            generation: 数据库验证前由 generation() 取得的撤销序号，之后激活码已被撤销时不保存租约
+
+        Returns:
+            新租约（未保存时同样返回，用于应答本次验证）
+        """
+        now = time.time()
+        lease = {
+            "fingerprint": hardware_fingerprint,
+            "match_score": match_score,
+            "binding_info": binding_info,
+            "granted_at": now,
+            "code_expires_at": code_expires_at.replace(tzinfo=timezone.utc).timestamp() if code_expires_at else None,
+        }
+        lease["expires_at"] = self._expires_at(now + self.ttl, lease)
+        if self._store(code, lease, generation):
+            self._count("grants")
+        else:
+            self._count("stale_grants")
+        return lease
+
+    def revoke(self, code: str) -> None:
+        """撤销激活码的租约（解绑、重新绑定或状态变更后）"""
+        self._revoke_local(code)
+        self._count("revocations")
+        if self._redis is not None:
+            run_shared_write(self._revoke_shared, code)
+
+    def _revoke_shared(self, code: str) -> None:
+        try:
+            self._redis.delete(self.KEY_PREFIX + code)
+            self._redis.publish(self.REVOCATION_CHANNEL, code)
+        except Exception:
+            self._count("shared_errors")
+
+    def clear(self) -> None:
+        """清空进程内租约"""
+        self.local.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """续约命中率统计"""
+        with self._counter_lock:
+            counters = dict(self._counters)
+        lookups = counters["renewals"] + counters["misses"]
+        return {
+            **counters,
+            "lookups": lookups,
+            "renewal_rate": round(counters["renewals"] / lookups, 4) if lookups else 0.0,
+            "local_entries": len(self.local),
+            "shared_enabled": self._redis is not None,
+        }
+
+
+_device_lease_table: Optional[DeviceLeaseTable] = None
+_device_lease_table_lock = threading.Lock()
+
+
+def get_device_lease_table() -> Optional[DeviceLeaseTable]:
+    """获取进程内共享的设备租约表，未启用时返回 None"""
+    global _device_lease_table
+    if not settings.DEVICE_LEASE_ENABLED:
+        return None
+    with _device_lease_table_lock:
+        if _device_lease_table is None:
+            _device_lease_table = DeviceLeaseTable(
+                settings.DEVICE_LEASE_MAX_ENTRIES,
+                settings.DEVICE_LEASE_TTL,
+                settings.DEVICE_LEASE_MAX_AGE,
+                settings.REDIS_URL if settings.DEVICE_LEASE_SHARED or settings.WEB_CONCURRENCY > 1 else None
+            )
+        return _device_lease_table
+
+
+def revoke_device_lease(code: str) -> None:
+    """撤销激活码的设备租约（租约未启用时不做任何事）"""
+    leases = get_device_lease_table()
+    if leases is not None:
+        leases.revoke(code)
@@ -0,0 +1,64 @@
+import threading
+from typing import Optional
+from app.config import settings
+from app.database import SessionLocal
+from app.services.activation_service import ActivationCodeService
+
+
+class ExpirySweeper:
+    """过期激活码后台清扫线程（定期将已到期的未使用激活码标记为 EXPIRED）"""
+
+    def __init__(self, interval: float = None, batch_size: int = None):
+        self.interval = interval if interval is not None else settings.EXPIRY_SWEEP_INTERVAL
+        self.batch_size = batch_size or settings.EXPIRY_SWEEP_BATCH_SIZE
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """启动后台清扫线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="expiry-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止后台清扫线程"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"过期激活码清扫失败: {e}")
+            self._stop_event.wait(self.interval)
+
+    def sweep(self) -> int:
+        """
+        执行一轮清扫
+
+        Returns:
+            本轮标记为已过期的激活码数量
+        """
+        db = SessionLocal()
+        try:
+            return ActivationCodeService(db).expire_activation_codes(self.batch_size)
+        finally:
+            db.close()
+
+
+_expiry_sweeper: Optional[ExpirySweeper] = None
+_expiry_sweeper_lock = threading.Lock()
+
+
+def get_expiry_sweeper() -> ExpirySweeper:
+    """获取进程内共享的过期激活码清扫线程"""
+    global _expiry_sweeper
+    with _expiry_sweeper_lock:
+        if _expiry_sweeper is None:
+            _expiry_sweeper = ExpirySweeper()
+        return _expiry_sweeper
@@ -0,0 +1,106 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterator, List, Optional, Set
+from app.config import settings
+from app.services.activation_service import EnhancedActivationCodeGenerator
+
+
+def _encode_shard(shard_id: int, width: int) -> str:
+    """将分片编号编码为固定宽度的安全字符"""
+    characters = EnhancedActivationCodeGenerator.CHARACTERS
+    symbols = []
+    for _ in range(width):
+        shard_id, index = divmod(shard_id, len(characters))
+        symbols.append(characters[index])
+    return ''.join(reversed(symbols))
+
+
+def _generate_shard(shard_id: int, width: int, count: int, length: int, prefix: str) -> str:
+    """
+    在子进程中生成一个分片的激活码
+
+    分片编号编码在前缀之后的固定位置，不同分片的激活码必然不同，
+    因此只需要在分片内部去重。结果以换行拼接后返回，减少进程间序列化开销。
+    """
+    shard_prefix = prefix + _encode_shard(shard_id, width)
+    codes: Set[str] = set()
+    while len(codes) < count:
+        codes.update(EnhancedActivationCodeGenerator.generate_bulk_codes(
+            count - len(codes), length, shard_prefix
+        ))
+    return '\n'.join(codes)
+
+
+class ShardedCodeGenerationEngine:
+    """多进程分片激活码生成引擎 - 用于百万级批量生成"""
+
+    def __init__(self, workers: Optional[int] = None, chunk_size: Optional[int] = None,
+                 length: int = 32, prefix: Optional[str] = None):
+        self.workers = workers or settings.CODE_GENERATION_WORKERS or os.cpu_count() or 1
+        self.chunk_size = chunk_size or settings.CODE_GENERATION_CHUNK_SIZE
+        self.length = length
+        self.prefix = prefix if prefix is not None else settings.ACTIVATION_CODE_PREFIX
+
+    @staticmethod
+    def shard_width(shard_count: int) -> int:
+        """计算容纳全部分片编号所需的字符数"""
+        base = len(EnhancedActivationCodeGenerator.CHARACTERS)
+        width, capacity = 1, base
+        while capacity < shard_count:
+            width += 1
+            capacity *= base
+        return width
+
+    def iter_chunks(self, total: int) -> Iterator[List[str]]:
+        """
+        流式生成激活码
+
+        每个分片由一个进程任务独占，按完成顺序逐块返回给调用方（合并方），
+        同时在途任务数量有上限，保证超大批量时内存占用平稳。
+
+        Args:
+            total: 生成总数
+
+        Yields:
+            每个分片的激活码列表
+        """
+        if total <= 0:
+            return
+
+        shard_count = (total + self.chunk_size - 1) // self.chunk_size
+        width = self.shard_width(shard_count)
+        if self.length - len(self.prefix) - width - EnhancedActivationCodeGenerator.TAG_LENGTH <= 0:
+            raise Exception("激活码长度不足以容纳分片编号")
+
+        def shard_size(shard_id: int) -> int:
+            return min(self.chunk_size, total - shard_id * self.chunk_size)
+
+        # 单分片或单进程时直接在当前进程生成，避免进程池启动开销
+        if shard_count == 1 or self.workers == 1:
+            for shard_id in range(shard_count):
+                yield _generate_shard(shard_id, width, shard_size(shard_id), self.length, self.prefix).split('\n')
+            return
+
+        max_in_flight = self.workers * 2
+        # 引擎在生成任务的后台线程中运行，fork 会复制其他线程持有的锁和数据库连接，使用 spawn 启动子进程
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            pending = set()
+            next_shard = 0
+            while next_shard < shard_count or pending:
+                while next_shard < shard_count and len(pending) < max_in_flight:
+                    pending.add(executor.submit(
+                        _generate_shard, next_shard, width, shard_size(next_shard), self.length, self.prefix
+                    ))
+                    next_shard += 1
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result().split('\n')
+
+    def generate(self, total: int) -> List[str]:
+        """生成指定数量的激活码并合并为列表"""
+        codes: List[str] = []
+        for chunk in self.iter_chunks(total):
+            codes.extend(chunk)
+        return codes
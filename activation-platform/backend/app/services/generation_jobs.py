@@ -0,0 +1,225 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import GenerationJob, GenerationJobStatus
+from app.schemas import GenerationJobCreate
+from app.services.activation_service import ActivationCodeService, _iter_chunks
+from app.services.generation_engine import ShardedCodeGenerationEngine
+from app.services.code_permutation import get_permuted_code_generator
+
+# 未配置消息队列时使用的进程内执行器
+_local_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_local_executor() -> ThreadPoolExecutor:
+    """获取进程内任务执行器（延迟创建）"""
+    global _local_executor
+    if _local_executor is None:
+        _local_executor = ThreadPoolExecutor(
+            max_workers=settings.GENERATION_JOB_LOCAL_WORKERS,
+            thread_name_prefix="generation-job"
+        )
+    return _local_executor
+
+
+def dispatch_generation_job(job_id: str) -> None:
+    """
+    分发生成任务
+    配置了 CELERY_BROKER_URL 时投递到 Celery，否则在进程内后台线程中执行
+    """
+    if settings.CELERY_BROKER_URL:
+        from app.worker import run_generation_job_task  # 延迟导入，未使用 Celery 时不依赖它
+        run_generation_job_task.delay(job_id)
+    else:
+        _get_local_executor().submit(run_generation_job, job_id)
+
+
+def run_generation_job(job_id: str) -> None:
+    """
+    执行生成任务：分片生成激活码并分块写入，每块提交一次并更新进度
+
+    Args:
+        job_id: 任务ID
+    """
+    db = SessionLocal()
+    try:
+        # 原子领取待执行任务，重复分发（如启动时重新分发）时只执行一次
+        claimed = db.execute(
+            update(GenerationJob)
+            .where(GenerationJob.id == job_id, GenerationJob.status == GenerationJobStatus.PENDING)
+            .values(status=GenerationJobStatus.RUNNING, started_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        if not claimed:
+            return
+        job = db.get(GenerationJob, job_id)
+
+        try:
+            GenerationJobService(db).execute(job)
+        except Exception as e:
+            db.rollback()
+            job = db.get(GenerationJob, job_id)
+            job.status = GenerationJobStatus.FAILED
+            job.error = str(e)
+            job.finished_at = datetime.utcnow()
+            db.commit()
+    finally:
+        db.close()
+
+
+def recover_generation_jobs() -> int:
+    """
+    恢复中断的生成任务（启动时调用）
+
+    超过 GENERATION_JOB_STALE_SECONDS 未更新进度的运行中任务标记为失败（执行进程已退出，不会再继续）；
+    未配置 Celery 时，进程内执行器中排队的任务随进程退出而丢失，重新分发待执行任务。
+
+    Returns:
+        标记为失败的任务数量
+    """
+    db = SessionLocal()
+    try:
+        failed = GenerationJobService(db).fail_stale_jobs()
+        if not settings.CELERY_BROKER_URL:
+            pending = db.execute(
+                select(GenerationJob.id).where(GenerationJob.status == GenerationJobStatus.PENDING)
+            ).scalars().all()
+            for job_id in pending:
+                dispatch_generation_job(job_id)
+        return failed
+    finally:
+        db.close()
+
+
+class GenerationJobService:
+    """激活码生成任务服务"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.code_service = ActivationCodeService(db)
+
+    def create_job(self, request: GenerationJobCreate) -> GenerationJob:
+        """创建生成任务并立即分发到后台执行"""
+        job = GenerationJob(
+            id=str(uuid.uuid4()),
+            status=GenerationJobStatus.PENDING,
+            product_id=request.product_id,
+            quantity=request.quantity,
+            rows_written=0,
+            request_json=request.model_dump_json()
+        )
+        self.db.add(job)
+        self.db.commit()
+
+        dispatch_generation_job(job.id)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[GenerationJob]:
+        """获取生成任务（已中断的运行中任务标记为失败后返回）"""
+        job = self.db.get(GenerationJob, job_id)
+        if job is not None and job.status == GenerationJobStatus.RUNNING and self.fail_stale_jobs(job_id):
+            self.db.refresh(job)
+        return job
+
+    def fail_stale_jobs(self, job_id: str = None) -> int:
+        """
+        将超过 GENERATION_JOB_STALE_SECONDS 未更新进度的运行中任务标记为失败
+
+        Args:
+            job_id: 只检查指定任务，为 None 时检查全部
+
+        Returns:
+            标记为失败的任务数量
+        """
+        now = datetime.utcnow()
+        query = update(GenerationJob).where(
+            GenerationJob.status == GenerationJobStatus.RUNNING,
+            GenerationJob.updated_at < now - timedelta(seconds=settings.GENERATION_JOB_STALE_SECONDS)
+        )
+        if job_id is not None:
+            query = query.where(GenerationJob.id == job_id)
+        result = self.db.execute(
+            query.values(
+                status=GenerationJobStatus.FAILED,
+                error=f"任务执行中断（超过 {settings.GENERATION_JOB_STALE_SECONDS} 秒未更新进度）",
+                finished_at=now
+            ).execution_options(synchronize_session=False)
+        )
+        self.db.commit()
+        return result.rowcount
+
+    def execute(self, job: GenerationJob) -> None:
+        """
+        执行生成任务
+
+        生成由多进程分片引擎完成，写入使用批量写入路径；数据库中已存在的激活码在所在块内
+        替换为新生成的激活码后写入，因此写入总数等于计划数量。
+        每块写入和进度更新在同一事务中提交，任务失败时已提交的块保持可用。
+        """
+        request = GenerationJobCreate.model_validate_json(job.request_json)
+        chunk_size = settings.CODE_BULK_INSERT_CHUNK_SIZE
+
+        if settings.CODE_GENERATION_MODE == "permutation":
+            # 置换模式生成的激活码天然唯一，直接写入
+            generator = get_permuted_code_generator()
+            while job.rows_written < job.quantity:
+                codes = generator.generate(min(job.quantity - job.rows_written, chunk_size))
+                self._write_chunk(job, request, codes, check_existing=False)
+            self._finish(job)
+            return
+
+        engine = ShardedCodeGenerationEngine(prefix=settings.ACTIVATION_CODE_PREFIX)
+        for shard in engine.iter_chunks(job.quantity):
+            for chunk in _iter_chunks(shard, chunk_size):
+                self._write_chunk(job, request, chunk)
+
+        self._finish(job)
+
+    def _finish(self, job: GenerationJob) -> None:
+        """标记任务完成"""
+        job.status = GenerationJobStatus.COMPLETED
+        job.finished_at = datetime.utcnow()
+        self.db.commit()
+
+    def _write_chunk(self, job: GenerationJob, request: GenerationJobCreate, codes: List[str],
+                     check_existing: bool = True) -> None:
+        """写入一块激活码（替换数据库中已存在的）并提交进度"""
+        if check_existing:
+            codes = self.code_service._exclude_issued_codes(codes)
+
+        for rows in self.code_service.insert_activation_codes(codes, request, chunk_size=len(codes) or 1, batch_id=job.id):
+            job.rows_written += len(rows)
+        self.db.commit()
+
+    def get_progress(self, job: GenerationJob) -> Dict[str, Any]:
+        """获取任务进度信息"""
+        throughput = None
+        if job.started_at:
+            end_time = job.finished_at or datetime.utcnow()
+            elapsed = (end_time - job.started_at).total_seconds()
+            if elapsed > 0:
+                throughput = round(job.rows_written / elapsed, 2)
+
+        return {
+            "job_id": job.id,
+            "status": job.status,
+            "product_id": job.product_id,
+            "quantity": job.quantity,
+            "rows_written": job.rows_written,
+            "progress": round(job.rows_written / job.quantity, 4) if job.quantity else 0.0,
+            "throughput": throughput,
+            "error": job.error,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+            "download_url": (
+                f"/api/v1/activation/generate/jobs/{job.id}/download"
+                if job.status == GenerationJobStatus.COMPLETED else None
+            )
+        }
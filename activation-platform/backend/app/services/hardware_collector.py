@@ -0,0 +1,170 @@
+import platform
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+import psutil
+from app.config import settings
+
+
+def _wmi():
+    """创建 WMI 连接（线程池中的线程需要先初始化 COM）"""
+    try:
+        import pythoncom
+        pythoncom.CoInitialize()
+    except ImportError:
+        pass
+    import wmi  # 延迟导入，避免非 Windows 平台依赖问题
+    return wmi.WMI()
+
+
+def probe_cpu_freq() -> float:
+    """CPU 当前频率"""
+    freq = psutil.cpu_freq()
+    return freq.current if freq else 0
+
+
+def probe_disk_serial() -> str:
+    """磁盘序列号"""
+    if platform.system().lower() == 'windows':
+        try:
+            for disk in _wmi().Win32_DiskDrive():
+                if getattr(disk, 'SerialNumber', None):
+                    return disk.SerialNumber
+        except Exception:
+            pass
+
+    try:
+        # Linux/Mac 备用方案，超时后终止子进程
+        result = subprocess.run(['lsblk', '-o', 'SERIAL'],
+                                capture_output=True, text=True, timeout=settings.HARDWARE_PROBE_TIMEOUT)
+        if result.returncode == 0:
+            return result.stdout
+    except Exception:
+        pass
+
+    return "unknown_disk"
+
+
+def probe_mac_address() -> str:
+    """MAC 地址"""
+    mac = uuid.getnode()
+    return ':'.join(('%012X' % mac)[i:i+2] for i in range(0, 12, 2))
+
+
+def probe_motherboard() -> str:
+    """主板序列号"""
+    if platform.system().lower() == 'windows':
+        try:
+            for board in _wmi().Win32_BaseBoard():
+                if getattr(board, 'SerialNumber', None):
+                    return board.SerialNumber
+        except Exception:
+            pass
+
+    return "unknown_motherboard"
+
+
+class HardwareProbe(NamedTuple):
+    """硬件采集项"""
+    collect: Callable[[], Any]
+    stable: bool  # 是否为稳定项（结果按 TTL 缓存）
+
+
+# 硬件指纹使用的采集项
+HARDWARE_PROBES: Dict[str, HardwareProbe] = {
+    'cpu_count': HardwareProbe(psutil.cpu_count, True),
+    'cpu_freq': HardwareProbe(probe_cpu_freq, False),
+    'memory_total': HardwareProbe(lambda: psutil.virtual_memory().total, True),
+    'disk_info': HardwareProbe(probe_disk_serial, True),
+    'mac_address': HardwareProbe(probe_mac_address, True),
+    'platform': HardwareProbe(platform.platform, True),
+    'machine': HardwareProbe(platform.machine, True),
+    'processor': HardwareProbe(platform.processor, True),
+    'motherboard': HardwareProbe(probe_motherboard, True),
+}
+
+
+class HardwareCollector:
+    """
+    硬件信息采集器
+
+    各采集项在线程池中并发执行，整体等待不超过 timeout。超时或失败的采集项使用该项上一次采集成功的值，
+    从未成功过的采集项不出现在结果中，不会以占位值改变硬件指纹。
+    超时的采集项继续在后台运行，完成前不会重复提交，因此卡住的 lsblk 或 WMI 调用最多占用一个线程；
+    完成后的稳定项结果按 TTL 缓存，之后的采集直接使用。
+    """
+
+    def __init__(self, probes: Dict[str, HardwareProbe] = None, timeout: float = None, ttl: float = None):
+        self.probes = probes if probes is not None else HARDWARE_PROBES
+        self.timeout = timeout if timeout is not None else settings.HARDWARE_PROBE_TIMEOUT
+        self.ttl = ttl if ttl is not None else settings.HARDWARE_CACHE_TTL
+        self._executor = ThreadPoolExecutor(max_workers=len(self.probes), thread_name_prefix="hardware-probe")
+        self._cache: Dict[str, Tuple[float, Any]] = {}
+        self._last: Dict[str, Any] = {}  # 各采集项上一次成功的结果，不受 TTL 限制
+        self._pending: Dict[str, Future] = {}
+        # 采集项可能在提交时已经完成，完成回调会在持有锁的线程中执行，使用可重入锁
+        self._lock = threading.RLock()
+
+    def collect(self) -> Dict[str, Any]:
+        """
+        采集全部硬件信息
+
+        Returns:
+            采集项名称到结果的映射，从未采集成功的项不包含在内
+        """
+        now = time.monotonic()
+        values = {}
+        futures = {}
+        with self._lock:
+            for name, probe in self.probes.items():
+                cached = self._cache.get(name)
+                if cached is not None and cached[0] > now:
+                    values[name] = cached[1]
+                    continue
+                future = self._pending.get(name)
+                if future is None:
+                    future = self._executor.submit(probe.collect)
+                    self._pending[name] = future
+                    future.add_done_callback(lambda done, name=name: self._finish(name, done))
+                futures[name] = future
+
+        deadline = now + self.timeout
+        for name, future in futures.items():
+            try:
+                values[name] = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except Exception:  # 超时或采集失败
+                with self._lock:
+                    if name in self._last:
+                        values[name] = self._last[name]
+        return values
+
+    def _finish(self, name: str, future: Future) -> None:
+        """采集项完成：移出进行中列表，成功时记录结果，稳定项写入缓存"""
+        with self._lock:
+            self._pending.pop(name, None)
+            if future.cancelled() or future.exception() is not None:
+                return
+            self._last[name] = future.result()
+            if self.probes[name].stable:
+                self._cache[name] = (time.monotonic() + self.ttl, future.result())
+
+    def invalidate(self) -> None:
+        """清空缓存的稳定项"""
+        with self._lock:
+            self._cache.clear()
+
+
+_hardware_collector: Optional[HardwareCollector] = None
+_hardware_collector_lock = threading.Lock()
+
+
+def get_hardware_collector() -> HardwareCollector:
+    """获取进程内共享的硬件信息采集器"""
+    global _hardware_collector
+    with _hardware_collector_lock:
+        if _hardware_collector is None:
+            _hardware_collector = HardwareCollector()
+        return _hardware_collector
@@ -0,0 +1,185 @@
+"""
+离线许可令牌
+
+激活成功（使用激活码或绑定硬件）后签发 ES256 签名的 JWT，客户端使用 /license/jwks 发布的公钥
+在本地验证，启动时无需再调用 /verify。令牌声明：
+
+- sub / cid: 激活码ID
+- pid: 产品ID
+- lexp: 激活码过期时间（Unix 时间戳，永久有效为 null）
+- rem: 剩余激活次数
+- hwf: 绑定的硬件指纹（未绑定为 null）
+- hwc / tol: 绑定的各硬件组件哈希和匹配容差，完整指纹不一致时客户端按组件匹配度验证（未提供组件为 null）
+- rfa: 建议刷新时间，到期后客户端调用 /license/refresh 换取新令牌
+- exp: 令牌过期时间，不晚于激活码过期时间
+"""
+import base64
+import hashlib
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from jose import JWTError, jwk, jwt
+from app.config import settings
+
+LICENSE_TOKEN_ALGORITHM = "ES256"
+
+logger = logging.getLogger("license_token")
+
+
+def _generate_private_key_pem() -> str:
+    """生成 P-256 私钥（PKCS8 PEM）"""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    return private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ).decode("ascii")
+
+
+def _load_private_key_pem() -> Optional[str]:
+    """
+    读取签名私钥：优先使用配置，其次读取密钥文件
+
+    密钥文件不存在时只在 DEBUG 模式下生成并保存；生产环境未配置私钥时记录警告并返回 None（不签发令牌），
+    避免每个实例各自生成私钥、重新部署后已签发的令牌全部失效，同时不影响未配置私钥的实例升级后启动。
+    """
+    if settings.LICENSE_TOKEN_PRIVATE_KEY:
+        return settings.LICENSE_TOKEN_PRIVATE_KEY
+
+    path = settings.LICENSE_TOKEN_KEY_PATH
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+
+    if not settings.DEBUG:
+        logger.warning(
+            f"未配置许可令牌签名私钥，不签发离线许可令牌：请设置 LICENSE_TOKEN_PRIVATE_KEY 或提供密钥文件 {path}"
+            "（或设置 LICENSE_TOKEN_ENABLED=false 关闭该警告）"
+        )
+        return None
+
+    pem = _generate_private_key_pem()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(pem)
+    os.replace(temp_path, path)
+    return pem
+
+
+def _public_jwk(key) -> Dict[str, Any]:
+    """公钥 JWK，kid 为公钥坐标的 SHA-256 摘要"""
+    public = (key if key.is_public() else key.public_key()).to_dict()
+    digest = hashlib.sha256(f'{public["crv"]}:{public["x"]}:{public["y"]}'.encode()).digest()
+    public["kid"] = base64.urlsafe_b64encode(digest[:12]).decode("ascii").rstrip("=")
+    public["use"] = "sig"
+    return public
+
+
+def _timestamp(value: Optional[datetime]) -> Optional[int]:
+    """数据库中的 UTC 时间转换为 Unix 时间戳"""
+    if value is None:
+        return None
+    return int((value - datetime(1970, 1, 1)).total_seconds())
+
+
+class LicenseTokenService:
+    """离线许可令牌签发与验证"""
+
+    def __init__(self, private_key_pem: str, previous_public_keys: List[str] = ()):
+        self._signing_key = jwk.construct(private_key_pem, LICENSE_TOKEN_ALGORITHM)
+        current = _public_jwk(self._signing_key)
+        self.kid = current["kid"]
+        self._jwks = [current] + [
+            _public_jwk(jwk.construct(pem, LICENSE_TOKEN_ALGORITHM)) for pem in previous_public_keys
+        ]
+
+    def jwks(self) -> Dict[str, Any]:
+        """公钥集合（JWKS），包含当前签名公钥和轮换前的公钥"""
+        return {"keys": [dict(key) for key in self._jwks]}
+
+    def issue(self, snapshot: Dict[str, Any], now: Optional[datetime] = None) -> str:
+        """
+        根据激活码快照签发令牌
+
+        Args:
+            snapshot: 激活码快照（snapshot_activation_code 的返回值）
+            now: 签发时间（UTC），默认当前时间
+        """
+        now = now or datetime.utcnow()
+        issued_at = _timestamp(now)
+        license_expires = _timestamp(snapshot.get("expires_at"))
+        expires = issued_at + settings.LICENSE_TOKEN_TTL
+        if license_expires is not None:
+            expires = min(expires, license_expires)
+
+        metadata = snapshot.get("metadata_json") or {}
+        claims = {
+            "iss": settings.LICENSE_TOKEN_ISSUER,
+            "sub": str(snapshot["id"]),
+            "cid": snapshot["id"],
+            "pid": snapshot["product_id"],
+            "lexp": license_expires,
+            "rem": snapshot["max_activations"] - snapshot["current_activations"],
+            "hwf": metadata.get("hardware_fingerprint") if isinstance(metadata, dict) else None,
+            "hwc": metadata.get("hardware_components") if isinstance(metadata, dict) else None,
+            "tol": settings.HARDWARE_TOLERANCE,
+            "iat": issued_at,
+            "rfa": issued_at + settings.LICENSE_TOKEN_REFRESH_INTERVAL,
+            "exp": expires,
+        }
+        return jwt.encode(claims, self._signing_key, algorithm=LICENSE_TOKEN_ALGORITHM, headers={"kid": self.kid})
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        """验证签名、签发者和有效期，返回令牌声明；验证失败抛出异常"""
+        try:
+            return jwt.decode(
+                token,
+                self.jwks(),
+                algorithms=[LICENSE_TOKEN_ALGORITHM],
+                issuer=settings.LICENSE_TOKEN_ISSUER,
+                options={"verify_aud": False}
+            )
+        except JWTError as e:
+            raise Exception(f"许可令牌无效: {str(e)}")
+
+
+_license_token_service: Optional[LicenseTokenService] = None
+_license_token_key_missing = False
+_license_token_service_lock = threading.Lock()
+
+
+def get_license_token_service() -> Optional[LicenseTokenService]:
+    """获取进程内共享的令牌服务，未启用或未配置签名私钥时返回 None"""
+    global _license_token_service, _license_token_key_missing
+    if not settings.LICENSE_TOKEN_ENABLED:
+        return None
+    with _license_token_service_lock:
+        if _license_token_service is None and not _license_token_key_missing:
+            private_key_pem = _load_private_key_pem()
+            if private_key_pem is None:
+                _license_token_key_missing = True
+                return None
+            _license_token_service = LicenseTokenService(
+                private_key_pem,
+                settings.LICENSE_TOKEN_PREVIOUS_PUBLIC_KEYS
+            )
+        return _license_token_service
+
+
+def issue_license_token(snapshot: Dict[str, Any]) -> Optional[str]:
+    """签发许可令牌，未启用时返回 None"""
+    service = get_license_token_service()
+    if service is None:
+        return None
+    return service.issue(snapshot)
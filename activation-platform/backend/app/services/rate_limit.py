@@ -0,0 +1,231 @@
+"""
+限流服务
+
+按客户端IP的请求数和按（激活码, 客户端IP）的失败尝试数做滑动窗口计数（近似滑动窗口：当前窗口计数 + 上一窗口计数按剩余比例加权），
+每个键只保存两个计数，内存占用与请求量无关。默认在进程内计数，可选使用 Redis 在多实例间共享计数，
+Redis 不可用时退回进程内计数。
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from app.config import settings
+
+# 限流窗口（秒），RATE_LIMIT_PER_MINUTE 和 MAX_ACTIVATION_ATTEMPTS 均按分钟计
+RATE_LIMIT_WINDOW = 60
+
+
+def _retry_after(current: int, previous: int, limit: int, window: float, now: float) -> float:
+    """计算加权计数回落到限额以下还需等待的秒数"""
+    elapsed = now % window
+    if current >= limit or previous <= 0:
+        return window - elapsed
+    # previous * (1 - t / window) + current < limit
+    return max(window * (1 - (limit - current) / previous) - elapsed, 0.0)
+
+
+def _weighted_count(current: int, previous: int, window: float, now: float) -> float:
+    """当前窗口计数 + 上一窗口计数按剩余比例加权"""
+    return current + previous * (1 - (now % window) / window)
+
+
+class MemoryRateLimitStore:
+    """
+    进程内滑动窗口计数，超过 max_keys 时淘汰最久未使用的计数键
+
+    锁定单独保存，不参与淘汰：超过 max_keys 时只清理已到期的锁定，计数键频繁变化时也不会提前解除锁定。
+    """
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._windows: "OrderedDict[str, list]" = OrderedDict()
+        self._locks: "OrderedDict[str, float]" = OrderedDict()
+        self._mutex = threading.Lock()
+
+    def hit(self, key: str, limit: int, window: float, now: float) -> float:
+        """记录一次请求，未超限返回 0，超限返回需等待的秒数"""
+        bucket = int(now // window)
+        with self._mutex:
+            entry = self._windows.get(key)
+            if entry is None:
+                entry = [bucket, 0, 0]
+                self._windows[key] = entry
+                if len(self._windows) > self.max_keys:
+                    self._windows.popitem(last=False)
+            else:
+                self._windows.move_to_end(key)
+                if entry[0] != bucket:
+                    entry[2] = entry[1] if entry[0] == bucket - 1 else 0
+                    entry[0], entry[1] = bucket, 0
+            entry[1] += 1
+            current, previous = entry[1], entry[2]
+
+        if _weighted_count(current, previous, window, now) <= limit:
+            return 0.0
+        return _retry_after(current, previous, limit, window, now)
+
+    def lock(self, key: str, seconds: float, now: float) -> None:
+        """锁定键 seconds 秒"""
+        with self._mutex:
+            self._locks[key] = now + seconds
+            self._locks.move_to_end(key)
+            if len(self._locks) > self.max_keys:
+                # 锁定时长相同，按写入顺序即按到期顺序，从最早写入的开始清理已到期的锁定
+                while self._locks:
+                    oldest, until = next(iter(self._locks.items()))
+                    if until > now:
+                        break
+                    del self._locks[oldest]
+
+    def locked(self, key: str, now: float) -> float:
+        """返回剩余锁定秒数，未锁定返回 0"""
+        with self._mutex:
+            until = self._locks.get(key)
+            if until is None:
+                return 0.0
+            if until <= now:
+                del self._locks[key]
+                return 0.0
+            return until - now
+
+    def clear(self) -> None:
+        with self._mutex:
+            self._windows.clear()
+            self._locks.clear()
+
+
+class RedisRateLimitStore:
+    """
+    Redis 共享滑动窗口计数
+
+    使用 redis.asyncio，在限流中间件中直接 await，不阻塞事件循环；出错时抛出异常，由 RateLimiter 退回进程内计数。
+    """
+
+    KEY_PREFIX = "rate_limit:"
+
+    def __init__(self, redis_url: str):
+        import redis.asyncio as redis  # 延迟导入，未启用共享计数时不依赖它
+        self._redis = redis.Redis.from_url(redis_url, socket_timeout=0.2, socket_connect_timeout=0.2)
+
+    async def hit(self, key: str, limit: int, window: float, now: float) -> float:
+        bucket = int(now // window)
+        current_key = f"{self.KEY_PREFIX}{key}:{bucket}"
+        async with self._redis.pipeline() as pipe:
+            pipe.incr(current_key)
+            pipe.expire(current_key, int(window * 2))
+            pipe.get(f"{self.KEY_PREFIX}{key}:{bucket - 1}")
+            current, _, previous = await pipe.execute()
+
+        current, previous = int(current), int(previous or 0)
+        if _weighted_count(current, previous, window, now) <= limit:
+            return 0.0
+        return _retry_after(current, previous, limit, window, now)
+
+    async def lock(self, key: str, seconds: float, now: float) -> None:
+        await self._redis.set(f"{self.KEY_PREFIX}lock:{key}", 1, ex=max(int(math.ceil(seconds)), 1))
+
+    async def locked(self, key: str, now: float) -> float:
+        ttl = await self._redis.ttl(f"{self.KEY_PREFIX}lock:{key}")
+        return float(ttl) if ttl and ttl > 0 else 0.0
+
+
+class RateLimiter:
+    """
+    激活相关接口的限流器
+
+    - 每个客户端IP每分钟最多 RATE_LIMIT_PER_MINUTE 次请求
+    - 每个客户端IP对同一激活码每分钟最多 MAX_ACTIVATION_ATTEMPTS 次失败尝试，超过后该客户端对该激活码锁定
+      CODE_LOCKOUT_SECONDS 秒；成功的请求不计数（多次激活的激活码正常使用不会被锁定），
+      其他客户端的失败尝试也不会锁定激活码所有者
+
+    配置共享计数（shared）时优先使用 Redis，Redis 出错时使用进程内计数（store）。
+    """
+
+    def __init__(self, store: MemoryRateLimitStore, per_client: int, per_code: int, lockout_seconds: float,
+                 window: float = RATE_LIMIT_WINDOW, shared: Optional[RedisRateLimitStore] = None):
+        self.store = store
+        self.shared = shared
+        self.per_client = per_client
+        self.per_code = per_code
+        self.lockout_seconds = lockout_seconds
+        self.window = window
+
+    async def _hit(self, key: str, limit: int, now: float) -> float:
+        if self.shared is not None:
+            try:
+                return await self.shared.hit(key, limit, self.window, now)
+            except Exception:
+                pass
+        return self.store.hit(key, limit, self.window, now)
+
+    async def _lock(self, key: str, now: float) -> None:
+        if self.shared is not None:
+            try:
+                await self.shared.lock(key, self.lockout_seconds, now)
+                return
+            except Exception:
+                pass
+        self.store.lock(key, self.lockout_seconds, now)
+
+    async def _locked(self, key: str, now: float) -> float:
+        if self.shared is not None:
+            try:
+                return await self.shared.locked(key, now)
+            except Exception:
+                pass
+        return self.store.locked(key, now)
+
+    async def check_client(self, client_ip: str) -> float:
+        """记录一次客户端请求，允许返回 0，否则返回 Retry-After 秒数"""
+        return await self._hit(f"ip:{client_ip}", self.per_client, time.time())
+
+    async def code_locked(self, code: str, client_ip: str) -> float:
+        """返回客户端对激活码的剩余锁定秒数（Retry-After），未锁定返回 0"""
+        return await self._locked(f"code:{code}:{client_ip}", time.time())
+
+    async def record_code_failure(self, code: str, client_ip: str) -> float:
+        """记录一次失败的激活码尝试，未超限返回 0，超限时锁定并返回锁定秒数"""
+        now = time.time()
+        key = f"code:{code}:{client_ip}"
+        # 失败在请求处理完成后记录，达到限额时即锁定，之后的尝试不再进入路由
+        if await self._hit(key, self.per_code - 1, now):
+            await self._lock(key, now)
+            return self.lockout_seconds
+        return 0.0
+
+    def clear(self) -> None:
+        """清空进程内计数和锁定"""
+        self.store.clear()
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """获取进程内共享的限流器，未启用时返回 None"""
+    global _rate_limiter
+    if not settings.RATE_LIMIT_ENABLED:
+        return None
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            shared = None
+            if settings.RATE_LIMIT_SHARED:
+                try:
+                    shared = RedisRateLimitStore(settings.REDIS_URL)
+                except Exception as e:
+                    print(f"共享限流计数不可用，仅使用进程内计数: {e}")
+            _rate_limiter = RateLimiter(
+                MemoryRateLimitStore(settings.RATE_LIMIT_MAX_KEYS),
+                settings.RATE_LIMIT_PER_MINUTE,
+                settings.MAX_ACTIVATION_ATTEMPTS,
+                settings.CODE_LOCKOUT_SECONDS,
+                shared=shared
+            )
+        return _rate_limiter
+
+
+def retry_after_header(seconds: float) -> str:
+    """Retry-After 头（整数秒，至少 1）"""
+    return str(max(int(math.ceil(seconds)), 1))
@@ -0,0 +1,17 @@
+from celery import Celery
+from app.config import settings
+from app.services.generation_jobs import run_generation_job
+
+# Celery 应用（仅在配置了 CELERY_BROKER_URL 时使用）
+# 启动方式: celery -A app.worker worker --loglevel=info
+celery_app = Celery(
+    "activation_platform",
+    broker=settings.CELERY_BROKER_URL,
+    backend=settings.REDIS_URL
+)
+
+
+@celery_app.task(name="generation_jobs.run")
+def run_generation_job_task(job_id: str) -> None:
+    """执行激活码生成任务"""
+    run_generation_job(job_id)
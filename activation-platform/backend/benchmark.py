@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+激活码生成与查重基准测试
+
+覆盖单个生成、批量生成、已存在激活码查重（预置数据表）和完整的创建流程，
+在 1千 / 10万 / 100万 规模下测量吞吐量，输出JSON结果，
+并与保存的基线比较，吞吐量下降超过阈值时以非零状态退出。
+
+用法:
+    python benchmark.py                          # 运行并与基线比较
+    python benchmark.py --scales 1000,100000     # 指定规模
+    python benchmark.py --output results.json    # 保存JSON结果
+    python benchmark.py --update-baseline        # 用本次结果更新基线
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import uuid
+from decimal import Decimal
+from pathlib import Path
+
+# 添加项目路径到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+DEFAULT_BASELINE = project_root / "benchmarks" / "baseline.json"
+DEFAULT_SCALES = "1000,100000,1000000"
+DEFAULT_THRESHOLD = 0.3
+
+# 单个生成为逐个调用，百万级耗时过长，最多测到该规模
+SECURE_CODE_MAX_SCALE = 100000
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="激活码生成与查重基准测试")
+    parser.add_argument("--scales", default=DEFAULT_SCALES, help="测试规模，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=1, help="每项重复次数，取最快一次")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="基线文件路径")
+    parser.add_argument("--threshold", type=float, default=None, help="允许的吞吐量下降比例（默认取基线文件中的值）")
+    parser.add_argument("--output", default=None, help="JSON结果输出路径")
+    parser.add_argument("--update-baseline", action="store_true", help="用本次结果更新基线")
+    parser.add_argument("--database-url", default=None, help="测试数据库（默认使用临时SQLite文件）")
+    return parser.parse_args()
+
+def prepare_environment(args, workdir: str):
+    """在导入应用模块之前配置独立的测试数据库和过滤器文件"""
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'benchmark.db')}"
+    os.environ["CODE_FILTER_PATH"] = os.path.join(workdir, "issued_codes.bloom")
+
+class BenchmarkSuite:
+    """基准测试集"""
+
+    def __init__(self, scales, repeat: int = 1):
+        from app.database import SessionLocal, init_db
+
+        init_db()
+        self.scales = scales
+        self.repeat = max(repeat, 1)
+        self.session_factory = SessionLocal
+
+    def _measure(self, func) -> float:
+        """执行若干次，返回最快一次的耗时（秒）"""
+        best = None
+        for _ in range(self.repeat):
+            start_time = time.perf_counter()
+            func()
+            duration = time.perf_counter() - start_time
+            best = duration if best is None else min(best, duration)
+        return max(best, 1e-9)
+
+    def _request(self, quantity: int):
+        """构建创建请求（跳过接口层的单次数量限制）"""
+        from app.schemas import ActivationCodeCreate
+
+        return ActivationCodeCreate.model_construct(
+            product_id=f"bench_{uuid.uuid4().hex[:8]}",
+            product_name="基准测试产品",
+            price=Decimal("9.90"),
+            currency="CNY",
+            expires_at=None,
+            metadata_json=None,
+            max_activations=1,
+            quantity=quantity
+        )
+
+    def bench_secure_code(self, scale: int) -> float:
+        """单个生成 generate_secure_code"""
+        from app.services.activation_service import EnhancedActivationCodeGenerator
+
+        return self._measure(lambda: [EnhancedActivationCodeGenerator.generate_secure_code(32, "ACT") for _ in range(scale)])
+
+    def bench_batch_codes(self, scale: int) -> float:
+        """批量生成 generate_batch_codes"""
+        from app.services.activation_service import EnhancedActivationCodeGenerator
+
+        return self._measure(lambda: EnhancedActivationCodeGenerator.generate_batch_codes(scale, 32, "ACT"))
+
+    def bench_check_existing(self, scale: int) -> float:
+        """查重 _check_existing_codes：预置 scale 个激活码，查询一半已存在、一半新生成的候选"""
+        from app.services.activation_service import ActivationCodeService, EnhancedActivationCodeGenerator
+
+        db = self.session_factory()
+        try:
+            service = ActivationCodeService(db)
+            seeded = EnhancedActivationCodeGenerator.generate_batch_codes(scale, 32, "ACT")
+            for _ in service.insert_activation_codes(seeded, self._request(scale)):
+                pass
+            db.commit()
+
+            half = scale // 2
+            candidates = seeded[:half] + EnhancedActivationCodeGenerator.generate_batch_codes(scale - half, 32, "ACT")
+
+            def check():
+                existing = service._check_existing_codes(candidates)
+                if len(existing) != half:
+                    raise Exception(f"查重结果不正确: {len(existing)} != {half}")
+
+            return self._measure(check)
+        finally:
+            db.close()
+
+    def bench_create_codes(self, scale: int) -> float:
+        """完整创建流程 create_activation_codes（生成 + 查重 + 写入 + 构建响应）"""
+        from app.services.activation_service import ActivationCodeService
+
+        def create():
+            db = self.session_factory()
+            try:
+                codes = ActivationCodeService(db).create_activation_codes(self._request(scale))
+                if len(codes) != scale:
+                    raise Exception(f"创建数量不正确: {len(codes)} != {scale}")
+            finally:
+                db.close()
+
+        return self._measure(create)
+
+    def run(self):
+        """运行全部基准测试"""
+        cases = [
+            ("generate_secure_code", self.bench_secure_code, SECURE_CODE_MAX_SCALE),
+            ("generate_batch_codes", self.bench_batch_codes, None),
+            ("check_existing_codes", self.bench_check_existing, None),
+            ("create_activation_codes", self.bench_create_codes, None),
+        ]
+
+        results = []
+        for name, bench, max_scale in cases:
+            for scale in self.scales:
+                if max_scale is not None and scale > max_scale:
+                    continue
+                seconds = bench(scale)
+                result = {
+                    "name": name,
+                    "scale": scale,
+                    "seconds": round(seconds, 4),
+                    "throughput": round(scale / seconds, 1)
+                }
+                results.append(result)
+                print(f"   {name:<26} {scale:>9} 个: {seconds:8.3f}秒 (速度: {result['throughput']:.0f}个/秒)", file=sys.stderr)
+        return results
+
+def environment_info():
+    """记录运行环境，便于解释不同机器间的差异"""
+    from app.config import settings
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "database": settings.DATABASE_URL.split(":", 1)[0],
+    }
+
+def result_key(result) -> str:
+    return f"{result['name']}@{result['scale']}"
+
+def compare_with_baseline(results, baseline, threshold: float):
+    """
+    与基线比较
+
+    Returns:
+        吞吐量下降超过阈值的项目列表
+    """
+    baseline_throughput = {result_key(r): r["throughput"] for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        expected = baseline_throughput.get(result_key(result))
+        if expected and result["throughput"] < expected * (1 - threshold):
+            regressions.append({
+                "name": result["name"],
+                "scale": result["scale"],
+                "throughput": result["throughput"],
+                "baseline": expected,
+                "change": round(result["throughput"] / expected - 1, 4)
+            })
+    return regressions
+
+def main():
+    """主函数"""
+    args = parse_args()
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+
+    with tempfile.TemporaryDirectory(prefix="activation_benchmark_") as workdir:
+        prepare_environment(args, workdir)
+
+        print("🏁 激活码基准测试", file=sys.stderr)
+        print("=" * 60, file=sys.stderr)
+        results = BenchmarkSuite(scales, args.repeat).run()
+        environment = environment_info()
+
+    baseline_path = Path(args.baseline)
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8")) if baseline_path.exists() else {}
+    threshold = args.threshold if args.threshold is not None else baseline.get("threshold", DEFAULT_THRESHOLD)
+    regressions = compare_with_baseline(results, baseline, threshold)
+
+    report = {
+        "environment": environment,
+        "threshold": threshold,
+        "results": results,
+        "regressions": regressions,
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+
+    if args.update_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps({
+            "environment": environment,
+            "threshold": threshold,
+            "results": results,
+        }, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"📝 基线已更新: {baseline_path}", file=sys.stderr)
+        return True
+
+    if regressions:
+        for regression in regressions:
+            print(f"❌ 性能回退: {regression['name']} @ {regression['scale']} "
+                  f"{regression['throughput']:.0f}个/秒 (基线 {regression['baseline']:.0f}个/秒, "
+                  f"{regression['change']:+.1%})", file=sys.stderr)
+        return False
+
+    print("✅ 未发现性能回退" if baseline else "⚠️ 未找到基线文件，仅输出结果", file=sys.stderr)
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,26 @@
+"""
+pytest 配置
+
+测试脚本中的测试函数返回 True/False 供 main() 汇总，在 pytest 下返回 False 同样判定为失败；
+会话开始时创建数据库表，测试不依赖手工初始化的数据库。
+"""
+
+import pytest
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database_schema():
+    """创建缺失的数据表"""
+    from app.database import init_db
+
+    init_db()
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    """执行测试函数，返回 False 时判定为失败"""
+    funcargs = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    result = pyfuncitem.obj(**funcargs)
+    if result is False:
+        pytest.fail(f"{pyfuncitem.name} 返回 False", pytrace=False)
+    return True
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+验证并激活合并接口测试脚本
+测试 /activate 接口以及客户端SDK对旧版服务端的回退
+"""
+
+import sys
+import uuid
+from pathlib import Path
+
+# 添加项目路径到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(project_root.parent))
+
+def _create_code(max_activations: int = 2) -> str:
+    """创建一个测试激活码"""
+    from app.database import SessionLocal
+    from app.services.activation_service import ActivationCodeService
+    from app.schemas import ActivationCodeCreate
+
+    db = SessionLocal()
+    try:
+        request = ActivationCodeCreate(
+            product_id=f"activate_{uuid.uuid4().hex[:8]}",
+            product_name="合并激活测试产品",
+            price=9.9,
+            quantity=1,
+            max_activations=max_activations
+        )
+        return ActivationCodeService(db).create_activation_codes(request)[0].code
+    finally:
+        db.close()
+
+def _sdk_client(app):
+    """创建请求直接发送到应用的SDK客户端，并记录请求路径"""
+    from fastapi.testclient import TestClient
+    from client_sdk_example import ActivationCodeClient
+
+    paths = []
+    test_client = TestClient(app)
+    test_client.event_hooks["request"].append(lambda request: paths.append(request.url.path))
+
+    client = ActivationCodeClient(base_url="")
+    client.session = test_client
+    return client, paths
+
+def test_activate_endpoint():
+    """测试一次请求完成验证和激活"""
+    print("⚡ 测试 /activate 接口")
+    print("=" * 50)
+
+    try:
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        client = TestClient(app)
+        code = _create_code(max_activations=2)
+
+        first = client.post("/api/v1/activation/activate", json={"code": code, "user_id": "u1"}).json()
+        second = client.post("/api/v1/activation/activate", json={"code": code, "user_id": "u2"}).json()
+        third = client.post("/api/v1/activation/activate", json={"code": code, "user_id": "u3"}).json()
+        malformed = client.post("/api/v1/activation/activate", json={"code": "ACT-NOT-A-CODE"}).json()
+
+        first_ok = (
+            first["success"] and first["valid"] and first["remaining_activations"] == 1
+            and first["activation_code"]["code"] == code
+            and first["activation_record"]["user_id"] == "u1"
+        )
+        second_ok = second["success"] and second["activation_code"]["status"] == "used"
+        third_ok = not third["success"] and not third["valid"] and "最大激活次数" in third["message"]
+        malformed_ok = not malformed["success"] and malformed["message"] == "激活码格式不正确"
+        print(f"   第一次激活: {'✅' if first_ok else '❌'}")
+        print(f"   第二次激活: {'✅' if second_ok else '❌'}")
+        print(f"   超出次数: {third['message']} {'✅' if third_ok else '❌'}")
+        print(f"   格式错误: {'✅' if malformed_ok else '❌'}")
+
+        return first_ok and second_ok and third_ok and malformed_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_sdk_single_round_trip():
+    """测试SDK使用合并接口只发送一次请求"""
+    print("\n📡 测试SDK合并激活")
+    print("=" * 50)
+
+    try:
+        from app.main import app
+
+        client, paths = _sdk_client(app)
+        code = _create_code()
+        result = client.activate_software_license(code, "sdk_user")
+
+        result_ok = result["success"] and result["activation_code"]["code"] == code and result["remaining_activations"] == 1
+        trip_ok = paths == ["/api/v1/activation/activate"]
+        print(f"   激活结果: {result['message']} {'✅' if result_ok else '❌'}")
+        print(f"   请求路径: {paths} {'✅' if trip_ok else '❌'}")
+
+        return result_ok and trip_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_sdk_fallback():
+    """测试旧版服务端（没有 /activate 接口）时回退为验证+使用"""
+    print("\n🔁 测试SDK回退")
+    print("=" * 50)
+
+    try:
+        from fastapi import FastAPI
+        from app.api.activation import router
+
+        legacy_app = FastAPI()
+        legacy_app.include_router(router, prefix="/api/v1/activation")
+        legacy_app.router.routes = [
+            route for route in legacy_app.router.routes
+            if getattr(route, "path", None) != "/api/v1/activation/activate"
+        ]
+
+        client, paths = _sdk_client(legacy_app)
+        first = client.activate_software_license(_create_code(), "sdk_user")
+        second = client.activate_software_license(_create_code(), "sdk_user")
+
+        result_ok = first["success"] and second["success"]
+        fallback_paths = [path.rsplit("/", 1)[0] for path in paths]
+        probe_ok = fallback_paths == [
+            "/api/v1/activation",
+            "/api/v1/activation/verify",
+            "/api/v1/activation/use",
+            "/api/v1/activation/verify",
+            "/api/v1/activation/use",
+        ]
+        print(f"   回退激活结果: {'✅' if result_ok else '❌'}")
+        print(f"   只探测一次合并接口: {'✅' if probe_ok else '❌'}")
+
+        return result_ok and probe_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def main():
+    """主测试函数"""
+    from app.database import init_db
+
+    init_db()
+
+    print("🧪 验证并激活合并接口测试")
+    print("=" * 60)
+
+    tests = [
+        test_activate_endpoint,
+        test_sdk_single_round_trip,
+        test_sdk_fallback
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test in tests:
+        if test():
+            passed += 1
+        print()
+
+    print("=" * 60)
+    print(f"📊 测试结果: {passed}/{total} 通过")
+
+    if passed == total:
+        print("🎉 所有测试通过！合并激活接口正常工作")
+        return True
+    else:
+        print("❌ 部分测试失败，请检查错误信息")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+激活事件表测试脚本
+测试激活记录分页和旧激活记录JSON迁移
+"""
+
+import sys
+import json
+import uuid
+from pathlib import Path
+
+# 添加项目路径到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+def _create_code(db, max_activations: int) -> str:
+    """创建一个测试激活码"""
+    from app.services.activation_service import ActivationCodeService
+    from app.schemas import ActivationCodeCreate
+
+    request = ActivationCodeCreate(
+        product_id=f"events_{uuid.uuid4().hex[:8]}",
+        product_name="激活事件测试产品",
+        price=9.9,
+        max_activations=max_activations,
+        quantity=1
+    )
+    return ActivationCodeService(db).create_activation_codes(request)[0].code
+
+def test_records_pagination():
+    """测试激活记录按游标分页"""
+    print("📄 测试激活记录分页")
+    print("=" * 50)
+
+    try:
+        from app.database import SessionLocal
+        from app.services.activation_service import ActivationCodeService
+
+        db = SessionLocal()
+        try:
+            service = ActivationCodeService(db)
+            code = _create_code(db, max_activations=7)
+            for i in range(7):
+                service.use_activation_code(code, f"user{i}", {"device": f"device{i}"}, "127.0.0.1")
+
+            pages = []
+            cursor = None
+            while True:
+                result = service.get_activation_records(code, cursor, limit=3)
+                pages.append(result["records"])
+                cursor = result["next_cursor"]
+                if cursor is None:
+                    break
+
+            users = [record["user_id"] for page in pages for record in page]
+            page_ok = [len(page) for page in pages] == [3, 3, 1]
+            order_ok = users == [f"user{i}" for i in range(7)]
+            device_ok = pages[0][0]["device_info"] == {"device": "device0"}
+            print(f"   分页大小: {[len(page) for page in pages]} {'✅' if page_ok else '❌'}")
+            print(f"   按激活顺序返回: {'✅' if order_ok else '❌'}")
+            print(f"   设备信息: {'✅' if device_ok else '❌'}")
+
+            invalid = service.get_activation_records(code, "bad-cursor")
+            invalid_ok = not invalid["success"] and "分页游标无效" in invalid["message"]
+            print(f"   无效游标被拒绝: {'✅' if invalid_ok else '❌'}")
+
+            return page_ok and order_ok and device_ok and invalid_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_blob_migration():
+    """测试旧激活记录JSON迁移到事件表"""
+    print("\n🚚 测试激活记录迁移")
+    print("=" * 50)
+
+    try:
+        from app.database import SessionLocal
+        from app.migrations import migrate_activation_records
+        from app.models import ActivationEvent, DataMigration
+        from app.services.activation_service import ActivationCodeService
+
+        db = SessionLocal()
+        try:
+            service = ActivationCodeService(db)
+            code = _create_code(db, max_activations=3)
+            activation_code = service.get_activation_code(code)
+            activation_code.current_activations = 2
+            activation_code.activation_records = json.dumps([
+                {"user_id": "legacy1", "activation_time": "2024-01-01T08:00:00", "device_info": {"os": "win"}, "ip_address": "10.0.0.1"},
+                {"user_id": "legacy2", "activation_time": "2024-01-02T08:00:00", "device_info": None, "ip_address": None},
+            ])
+            db.query(DataMigration).filter(DataMigration.name == "activation_records_to_events").delete()
+            db.commit()
+
+            migrated = migrate_activation_records(batch_size=1)
+            migrated_again = migrate_activation_records(batch_size=1)
+            marked = db.get(DataMigration, "activation_records_to_events") is not None
+
+            db.expire_all()
+            records = service.get_activation_records(code)["records"]
+            cleared = service.get_activation_code(code).activation_records is None
+            users_ok = [record["user_id"] for record in records] == ["legacy1", "legacy2"]
+            time_ok = records[0]["activation_time"] == "2024-01-01T08:00:00"
+            device_ok = records[0]["device_info"] == {"os": "win"}
+            event_count = db.query(ActivationEvent).filter(
+                ActivationEvent.activation_code_id == activation_code.id
+            ).count()
+
+            migrate_ok = migrated >= 2 and migrated_again == 0 and event_count == 2
+            print(f"   迁移事件数: {migrated}，重复执行: {migrated_again}，事件行: {event_count} {'✅' if migrate_ok else '❌'}")
+            print(f"   完成标记已记录: {'✅' if marked else '❌'}")
+            print(f"   记录内容保留: {'✅' if users_ok and time_ok and device_ok else '❌'}")
+            print(f"   旧字段已清空: {'✅' if cleared else '❌'}")
+
+            return migrate_ok and marked and users_ok and time_ok and device_ok and cleared
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def main():
+    """主测试函数"""
+    from app.database import init_db
+
+    init_db()
+
+    print("🧪 激活事件表测试")
+    print("=" * 60)
+
+    tests = [
+        test_records_pagination,
+        test_blob_migration
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test in tests:
+        if test():
+            passed += 1
+        print()
+
+    print("=" * 60)
+    print(f"📊 测试结果: {passed}/{total} 通过")
+
+    if passed == total:
+        print("🎉 所有测试通过！激活事件表功能正常工作")
+        return True
+    else:
+        print("❌ 部分测试失败，请检查错误信息")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+激活码批量使用测试脚本
+测试部分成功、重复激活码、单事务提交和激活记录
+"""
+
+import sys
+import uuid
+from pathlib import Path
+
+# 添加项目路径到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+def _create_codes(db, quantity: int, max_activations: int = 1) -> list:
+    """创建一批测试激活码"""
+    from app.services.activation_service import ActivationCodeService
+    from app.schemas import ActivationCodeCreate
+
+    request = ActivationCodeCreate(
+        product_id=f"batch_use_{uuid.uuid4().hex[:8]}",
+        product_name="批量激活测试产品",
+        price=9.9,
+        quantity=quantity,
+        max_activations=max_activations
+    )
+    return [c.code for c in ActivationCodeService(db).create_activation_codes(request)]
+
+def test_partial_success():
+    """测试失败条目不影响其他条目"""
+    print("📦 测试批量激活部分成功")
+    print("=" * 50)
+
+    try:
+        from sqlalchemy import event
+        from app.database import SessionLocal
+        from app.models import ActivationCodeStatus
+        from app.services.activation_service import ActivationCodeService, EnhancedActivationCodeGenerator
+
+        db = SessionLocal()
+        try:
+            service = ActivationCodeService(db)
+            single_a, single_b = _create_codes(db, 2)
+            multi = _create_codes(db, 1, max_activations=2)[0]
+            service.use_activation_code(single_b, "earlier_user")
+
+            items = [
+                {"code": single_a, "user_id": "fleet1", "device_info": {"host": "node1"}},
+                {"code": "ACT-NOT-A-CODE", "user_id": "fleet2"},
+                {"code": multi, "user_id": "fleet3"},
+                {"code": single_b, "user_id": "fleet4"},
+                {"code": multi, "user_id": "fleet5"},
+                {"code": EnhancedActivationCodeGenerator.generate_secure_code(), "user_id": "fleet6"},
+                {"code": multi, "user_id": "fleet7"},
+            ]
+
+            commits = []
+            event.listen(db, "after_commit", lambda session: commits.append(1))
+            results = service.use_activation_codes(items)
+
+            for r in results:
+                print(f"   {r['code'][:12]}... -> {r['success']} {r['message']}")
+
+            success_ok = [r["success"] for r in results] == [True, False, True, False, True, False, False]
+            order_ok = [r["code"] for r in results] == [item["code"] for item in items]
+            message_ok = (
+                results[1]["message"] == "激活码格式不正确"
+                and "最大激活次数" in results[3]["message"]
+                and results[5]["message"] == "激活码不存在"
+                and "最大激活次数" in results[6]["message"]
+            )
+            commit_ok = len(commits) == 1
+            print(f"   成功/失败分布: {'✅' if success_ok else '❌'}")
+            print(f"   结果顺序: {'✅' if order_ok else '❌'}")
+            print(f"   失败原因: {'✅' if message_ok else '❌'}")
+            print(f"   提交次数: {len(commits)} (期望: 1) {'✅' if commit_ok else '❌'}")
+
+            db.expire_all()
+            multi_code = service.get_activation_code(multi)
+            records = service.get_activation_records(multi)["records"]
+            state_ok = (
+                multi_code.current_activations == 2
+                and multi_code.status == ActivationCodeStatus.USED
+                and multi_code.used_by == "fleet3"
+                and [record["user_id"] for record in records] == ["fleet3", "fleet5"]
+            )
+            device = service.get_activation_records(single_a)["records"][0]["device_info"]
+            print(f"   激活次数与记录: {'✅' if state_ok else '❌'}")
+            print(f"   设备信息写入: {'✅' if device == {'host': 'node1'} else '❌'}")
+
+            return success_ok and order_ok and message_ok and commit_ok and state_ok and device == {"host": "node1"}
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_batch_cache_invalidation():
+    """测试批量激活后验证缓存失效"""
+    print("\n🧹 测试批量激活后缓存失效")
+    print("=" * 50)
+
+    try:
+        from app.database import SessionLocal
+        from app.services.activation_service import ActivationCodeService
+
+        db = SessionLocal()
+        try:
+            service = ActivationCodeService(db)
+            codes = _create_codes(db, 3)
+            before = service.verify_activation_codes(codes)
+            service.use_activation_codes([{"code": code, "user_id": "cache_user"} for code in codes])
+            after = service.verify_activation_codes(codes)
+
+            invalidation_ok = all(r["valid"] for r in before) and not any(r["valid"] for r in after)
+            print(f"   激活前有效、激活后无效: {'✅' if invalidation_ok else '❌'}")
+
+            return invalidation_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def main():
+    """主测试函数"""
+    from app.database import init_db
+
+    init_db()
+
+    print("🧪 激活码批量使用测试")
+    print("=" * 60)
+
+    tests = [
+        test_partial_success,
+        test_batch_cache_invalidation
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test in tests:
+        if test():
+            passed += 1
+        print()
+
+    print("=" * 60)
+    print(f"📊 测试结果: {passed}/{total} 通过")
+
+    if passed == total:
+        print("🎉 所有测试通过！批量激活功能正常工作")
+        return True
+    else:
+        print("❌ 部分测试失败，请检查错误信息")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
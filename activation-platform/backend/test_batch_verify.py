@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+激活码批量验证测试脚本
+测试结果顺序、各类无效原因以及分块查询
+"""
+
+import sys
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加项目路径到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+def _create_codes(db, quantity: int, **kwargs) -> list:
+    """创建一批测试激活码"""
+    from app.services.activation_service import ActivationCodeService
+    from app.schemas import ActivationCodeCreate
+
+    request = ActivationCodeCreate(
+        product_id=f"batch_verify_{uuid.uuid4().hex[:8]}",
+        product_name="批量验证测试产品",
+        price=9.9,
+        quantity=quantity,
+        **kwargs
+    )
+    return [c.code for c in ActivationCodeService(db).create_activation_codes(request)]
+
+def test_batch_results():
+    """测试批量验证结果与单个验证一致且顺序不变"""
+    print("📋 测试批量验证结果")
+    print("=" * 50)
+
+    try:
+        from app.database import SessionLocal
+        from app.models import ActivationCodeStatus
+        from app.schemas import ActivationCodeVerify
+        from app.services.activation_service import ActivationCodeService, EnhancedActivationCodeGenerator
+        from app.services.code_cache import get_activation_code_cache
+
+        db = SessionLocal()
+        try:
+            service = ActivationCodeService(db)
+            valid, used, disabled = _create_codes(db, 3)
+            expired = _create_codes(db, 1, expires_at=datetime.utcnow() - timedelta(days=1))[0]
+            service.use_activation_code(used, "batch_user")
+            service.get_activation_code(disabled).status = ActivationCodeStatus.DISABLED
+            db.commit()
+
+            cache = get_activation_code_cache()
+            if cache is not None:
+                cache.clear()
+
+            malformed = "ACT-NOT-A-CODE"
+            unknown = EnhancedActivationCodeGenerator.generate_secure_code()
+            codes = [used, malformed, valid, expired, unknown, disabled, valid]
+            results = service.verify_activation_codes(codes)
+
+            expected = [service.verify_activation_code(ActivationCodeVerify(code=code)) for code in codes]
+            order_ok = [r["code"] for r in results] == codes
+            match_ok = all(
+                r["valid"] == e["valid"] and r["message"] == e["message"]
+                for r, e in zip(results, expected)
+            )
+            valid_ok = [r["valid"] for r in results] == [False, False, True, False, False, False, True]
+            print(f"   结果顺序与输入一致: {'✅' if order_ok else '❌'}")
+            print(f"   与单个验证结果一致: {'✅' if match_ok else '❌'}")
+            for r in results:
+                print(f"   {r['code'][:12]}... -> {r['valid']} {r['message']}")
+
+            return order_ok and match_ok and valid_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_batch_chunking():
+    """测试超过单块大小的批量验证"""
+    print("\n🧱 测试分块查询")
+    print("=" * 50)
+
+    try:
+        from app.database import SessionLocal
+        from app.services import activation_service
+        from app.services.activation_service import ActivationCodeService
+        from app.services.code_cache import get_activation_code_cache
+
+        db = SessionLocal()
+        original_chunk_size = activation_service.IN_QUERY_CHUNK_SIZE
+        try:
+            codes = _create_codes(db, 25)
+            cache = get_activation_code_cache()
+            if cache is not None:
+                cache.clear()
+
+            activation_service.IN_QUERY_CHUNK_SIZE = 10
+            results = ActivationCodeService(db).verify_activation_codes(codes)
+            chunk_ok = [r["code"] for r in results] == codes and all(r["valid"] for r in results)
+            print(f"   25 个激活码分 3 块验证: {'✅' if chunk_ok else '❌'}")
+
+            return chunk_ok
+        finally:
+            activation_service.IN_QUERY_CHUNK_SIZE = original_chunk_size
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def main():
+    """主测试函数"""
+    from app.database import init_db
+
+    init_db()
+
+    print("🧪 激活码批量验证测试")
+    print("=" * 60)
+
+    tests = [
+        test_batch_results,
+        test_batch_chunking
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test in tests:
+        if test():
+            passed += 1
+        print()
+
+    print("=" * 60)
+    print(f"📊 测试结果: {passed}/{total} 通过")
+
+    if passed == total:
+        print("🎉 所有测试通过！批量验证功能正常工作")
+        return True
+    else:
+        print("❌ 部分测试失败，请检查错误信息")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
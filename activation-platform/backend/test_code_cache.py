@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+激活码验证缓存测试脚本
+测试 LRU/TTL 淘汰、命中时免数据库、写操作失效、并发失效和快照序列化
+"""
+
+import sys
+import time
+import uuid
+import hashlib
+from pathlib import Path
+
+# 添加项目路径到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+def _create_code(db, max_activations: int = 3) -> str:
+    """创建一个测试激活码"""
+    from app.services.activation_service import ActivationCodeService
+    from app.schemas import ActivationCodeCreate
+
+    request = ActivationCodeCreate(
+        product_id=f"cache_{uuid.uuid4().hex[:8]}",
+        product_name="缓存测试产品",
+        price=9.9,
+        max_activations=max_activations,
+        metadata_json={"channel": "test"},
+        quantity=1
+    )
+    return ActivationCodeService(db).create_activation_codes(request)[0].code
+
+def test_lru_ttl():
+    """测试 LRU 淘汰和 TTL 过期"""
+    print("🗂️ 测试 LRU/TTL 缓存")
+    print("=" * 50)
+
+    try:
+        from app.services.code_cache import LRUTTLCache
+
+        cache = LRUTTLCache(max_entries=2, ttl=0.2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # a 变为最近使用
+        cache.set("c", 3)
+        lru_ok = cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+        print(f"   LRU 淘汰最久未使用: {'✅' if lru_ok else '❌'}")
+
+        time.sleep(0.25)
+        ttl_ok = cache.get("a") is None and len(cache) == 1
+        print(f"   TTL 过期: {'✅' if ttl_ok else '❌'}")
+
+        return lru_ok and ttl_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_cache_hit_skips_database():
+    """测试缓存命中时验证不访问数据库"""
+    print("\n⚡ 测试缓存命中")
+    print("=" * 50)
+
+    try:
+        from app.database import SessionLocal
+        from app.schemas import ActivationCodeVerify, ActivationCodeVerifyResponse
+        from app.services.activation_service import ActivationCodeService
+        from app.services.code_cache import get_activation_code_cache
+
+        cache = get_activation_code_cache()
+        db = SessionLocal()
+        try:
+            code = _create_code(db)
+            first = ActivationCodeService(db).verify_activation_code(ActivationCodeVerify(code=code))
+        finally:
+            db.close()
+
+        class NoDatabase:
+            def __getattr__(self, name):
+                raise AssertionError("不应访问数据库")
+
+        before = cache.stats()["local_hits"]
+        service = ActivationCodeService(NoDatabase())
+        for _ in range(100):
+            result = service.verify_activation_code(ActivationCodeVerify(code=code))
+        hits = cache.stats()["local_hits"] - before
+
+        response = ActivationCodeVerifyResponse(**result)
+        hit_ok = first["valid"] and result["valid"] and hits == 100
+        response_ok = response.activation_code.metadata_json == {"channel": "test"}
+        print(f"   100 次验证命中缓存: {hits} {'✅' if hit_ok else '❌'}")
+        print(f"   响应构建: {'✅ 通过' if response_ok else '❌ 失败'}")
+        print(f"   命中率统计: {cache.stats()['hit_rate']}")
+
+        return hit_ok and response_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_write_invalidation():
+    """测试使用、绑定、解绑后缓存失效"""
+    print("\n🧹 测试写操作失效")
+    print("=" * 50)
+
+    try:
+        from app.config import settings
+        from app.database import SessionLocal
+        from app.models import ActivationCodeStatus
+        from app.schemas import ActivationCodeVerify
+        from app.services.activation_service import ActivationCodeService
+
+        db = SessionLocal()
+        try:
+            service = ActivationCodeService(db)
+
+            print("1. 使用激活码:")
+            code = _create_code(db, max_activations=2)
+            before = service.verify_activation_code(ActivationCodeVerify(code=code))["remaining_activations"]
+            service.use_activation_code(code, "cache_user")
+            after = service.verify_activation_code(ActivationCodeVerify(code=code))["remaining_activations"]
+            use_ok = before == 2 and after == 1
+            print(f"   剩余次数 {before} -> {after} {'✅' if use_ok else '❌'}")
+
+            print("\n2. 绑定与解绑硬件:")
+            code = _create_code(db)
+            fingerprint = hashlib.sha256(uuid.uuid4().bytes).hexdigest()
+            service.get_activation_code_snapshot(code)
+            service.bind_to_hardware(code, fingerprint, "cache_user")
+            bound = service.get_activation_code_snapshot(code)
+            bind_ok = bound["status"] == ActivationCodeStatus.USED and bound["metadata_json"]["hardware_fingerprint"] == fingerprint
+
+            service.unbind_hardware(code, settings.ADMIN_UNBIND_KEY)
+            unbound = service.get_activation_code_snapshot(code)
+            unbind_ok = unbound["status"] == ActivationCodeStatus.UNUSED and unbound["metadata_json"] is None
+            print(f"   绑定后状态: {bound['status'].value} {'✅' if bind_ok else '❌'}")
+            print(f"   解绑后状态: {unbound['status'].value} {'✅' if unbind_ok else '❌'}")
+
+            return use_ok and bind_ok and unbind_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_stale_write_discarded():
+    """测试读取数据库期间激活码失效时，旧快照不会写回缓存"""
+    print("\n🏁 测试并发失效")
+    print("=" * 50)
+
+    try:
+        from app.database import SessionLocal
+        from app.schemas import ActivationCodeVerify
+        from app.services import activation_service
+        from app.services.activation_service import ActivationCodeService
+        from app.services.code_cache import ActivationCodeCache, get_activation_code_cache
+
+        cache = ActivationCodeCache(max_entries=100, ttl=60)
+        generation = cache.generation()
+        cache.invalidate("RACED")
+        cache.set("RACED", {"status": "stale"}, generation)
+        cache.set("FRESH", {"status": "fresh"}, cache.generation())
+        unit_ok = cache.get("RACED") is None and cache.get("FRESH") is not None and cache.stats()["stale_writes"] == 1
+
+        generation = cache.generation()
+        cache._on_invalidation({"data": b"REMOTE"})
+        cache.set("REMOTE", {"status": "stale"}, generation)
+        remote_ok = cache.get("REMOTE") is None
+
+        small = ActivationCodeCache(max_entries=100, ttl=60)
+        small.INVALIDATION_HISTORY = 2
+        generation = small.generation()
+        for code in ("OLD", "A", "B"):
+            small.invalidate(code)
+        small.set("OLD", {"status": "stale"}, generation)
+        history_ok = small.get("OLD") is None
+
+        # 模拟验证读取数据库之后、写入缓存之前，另一个请求使用了激活码
+        db = SessionLocal()
+        try:
+            service = ActivationCodeService(db)
+            code = _create_code(db, max_activations=1)
+            shared = get_activation_code_cache()
+            shared.invalidate(code)
+            original_snapshot = activation_service.snapshot_activation_code
+
+            def snapshot_then_use(activation_code):
+                snapshot = original_snapshot(activation_code)
+                activation_service.snapshot_activation_code = original_snapshot
+                other = SessionLocal()
+                try:
+                    ActivationCodeService(other).use_activation_code(code, "race_user")
+                finally:
+                    other.close()
+                return snapshot
+
+            activation_service.snapshot_activation_code = snapshot_then_use
+            try:
+                raced = service.verify_activation_code(ActivationCodeVerify(code=code))
+            finally:
+                activation_service.snapshot_activation_code = original_snapshot
+            after = service.verify_activation_code(ActivationCodeVerify(code=code))
+            service_ok = raced["valid"] and not after["valid"]
+        finally:
+            db.close()
+
+        print(f"   失效后的写入被丢弃: {'✅' if unit_ok else '❌'}")
+        print(f"   其他实例的失效消息同样生效: {'✅' if remote_ok else '❌'}")
+        print(f"   失效记录移出后保守丢弃: {'✅' if history_ok else '❌'}")
+        print(f"   并发使用后再次验证: {after['message']} {'✅' if service_ok else '❌'}")
+
+        return unit_ok and remote_ok and history_ok and service_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_snapshot_serialization():
+    """测试共享缓存使用的快照序列化"""
+    print("\n📦 测试快照序列化")
+    print("=" * 50)
+
+    try:
+        from app.database import SessionLocal
+        from app.services.activation_service import ActivationCodeService
+        from app.services.code_cache import _dump_snapshot, _load_snapshot
+
+        db = SessionLocal()
+        try:
+            service = ActivationCodeService(db)
+            snapshot = service.get_activation_code_snapshot(_create_code(db))
+        finally:
+            db.close()
+
+        restored = _load_snapshot(_dump_snapshot(snapshot))
+        roundtrip_ok = restored == snapshot
+        print(f"   序列化往返一致: {'✅' if roundtrip_ok else '❌'}")
+
+        return roundtrip_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def main():
+    """主测试函数"""
+    from app.database import init_db
+
+    init_db()
+
+    print("🧪 激活码验证缓存测试")
+    print("=" * 60)
+
+    tests = [
+        test_lru_ttl,
+        test_cache_hit_skips_database,
+        test_write_invalidation,
+        test_stale_write_discarded,
+        test_snapshot_serialization
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test in tests:
+        if test():
+            passed += 1
+        print()
+
+    print("=" * 60)
+    print(f"📊 测试结果: {passed}/{total} 通过")
+
+    if passed == total:
+        print("🎉 所有测试通过！激活码验证缓存功能正常工作")
+        return True
+    else:
+        print("❌ 部分测试失败，请检查错误信息")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
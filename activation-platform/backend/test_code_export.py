@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+激活码流式导出测试脚本
+测试CSV/NDJSON格式、按批次/产品筛选和分块输出
+"""
+
+import sys
+import json
+import uuid
+from pathlib import Path
+
+# 添加项目路径到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+def _create_batch(db, product_id: str, quantity: int) -> str:
+    """创建一批测试激活码，返回批次ID"""
+    from app.services.activation_service import ActivationCodeService
+    from app.schemas import ActivationCodeCreate
+
+    request = ActivationCodeCreate(
+        product_id=product_id,
+        product_name="导出测试产品",
+        price=9.9,
+        quantity=quantity
+    )
+    return ActivationCodeService(db).create_activation_code_batch(request)
+
+def test_csv_export():
+    """测试按批次导出CSV"""
+    print("📄 测试CSV导出")
+    print("=" * 50)
+
+    try:
+        from app.database import SessionLocal
+        from app.models import ActivationCode
+        from app.services.code_export import CodeExportService
+
+        db = SessionLocal()
+        try:
+            product_id = f"export_{uuid.uuid4().hex[:8]}"
+            batch_id = _create_batch(db, product_id, 250)
+            _create_batch(db, product_id, 10)  # 同产品的另一批次，不应出现在批次导出中
+
+            chunks = list(CodeExportService(db).iter_export("csv", batch_id=batch_id, chunk_size=100))
+            lines = ''.join(chunks).splitlines()
+
+            print(f"   输出块数: {len(chunks)}")
+            print(f"   表头: {lines[0]}")
+            header_ok = lines[0] == "code,product_id,expires_at"
+            count_ok = len(lines) == 251 and len(chunks) == 4  # 表头 + 3个数据块
+
+            expected = {code for (code,) in db.query(ActivationCode.code).filter(ActivationCode.batch_id == batch_id)}
+            exported = {line.split(',')[0] for line in lines[1:]}
+            match_ok = exported == expected
+            print(f"   行数: {len(lines) - 1} {'✅' if count_ok else '❌'}")
+            print(f"   内容一致: {'✅' if match_ok else '❌'}")
+
+            return header_ok and count_ok and match_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_ndjson_export():
+    """测试按产品导出NDJSON"""
+    print("\n🧾 测试NDJSON导出")
+    print("=" * 50)
+
+    try:
+        from app.database import SessionLocal
+        from app.services.code_export import CodeExportService
+
+        db = SessionLocal()
+        try:
+            product_id = f"export_{uuid.uuid4().hex[:8]}"
+            _create_batch(db, product_id, 30)
+            _create_batch(db, product_id, 20)
+
+            text = ''.join(CodeExportService(db).iter_export("ndjson", product_id=product_id, chunk_size=16))
+            records = [json.loads(line) for line in text.splitlines()]
+
+            count_ok = len(records) == 50
+            fields_ok = all(set(r) == {"code", "product_id", "expires_at"} and r["product_id"] == product_id for r in records)
+            print(f"   记录数: {len(records)} {'✅' if count_ok else '❌'}")
+            print(f"   字段: {'✅ 通过' if fields_ok else '❌ 失败'}")
+
+            return count_ok and fields_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_invalid_export():
+    """测试无效导出参数"""
+    print("\n🚫 测试无效参数")
+    print("=" * 50)
+
+    try:
+        from app.database import SessionLocal
+        from app.services.code_export import CodeExportService
+
+        db = SessionLocal()
+        try:
+            service = CodeExportService(db)
+            cases = [("xml", {"batch_id": "x"}), ("csv", {})]
+            all_ok = True
+            for export_format, filters in cases:
+                try:
+                    list(service.iter_export(export_format, **filters))
+                    print(f"   ❌ {export_format} {filters} 未被拒绝")
+                    all_ok = False
+                except Exception as e:
+                    print(f"   ✅ {export_format} {filters} -> {e}")
+            return all_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_export_endpoint_auth():
+    """测试导出接口仅管理员可用且必须指定批次"""
+    print("\n🔐 测试导出接口权限")
+    print("=" * 50)
+
+    try:
+        from fastapi.testclient import TestClient
+        from app.database import SessionLocal
+        from app.main import app
+        from app.middleware.auth import create_access_token
+        from app.models import User
+
+        db = SessionLocal()
+        try:
+            product_id = f"export_{uuid.uuid4().hex[:8]}"
+            batch_id = _create_batch(db, product_id, 5)
+            users = {}
+            for is_admin in (True, False):
+                username = f"export_{'admin' if is_admin else 'user'}_{uuid.uuid4().hex[:8]}"
+                db.add(User(username=username, email=f"{username}@example.com", hashed_password="x",
+                            is_active=True, is_admin=is_admin))
+                users[is_admin] = {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+            db.commit()
+        finally:
+            db.close()
+
+        client = TestClient(app)
+        anonymous = client.get("/api/v1/activation/export", params={"batch_id": batch_id})
+        non_admin = client.get("/api/v1/activation/export", params={"batch_id": batch_id}, headers=users[False])
+        product_only = client.get("/api/v1/activation/export", params={"product_id": product_id}, headers=users[True])
+        exported = client.get("/api/v1/activation/export", params={"batch_id": batch_id}, headers=users[True])
+
+        reject_ok = anonymous.status_code in (401, 403) and non_admin.status_code == 403 and product_only.status_code == 422
+        export_ok = exported.status_code == 200 and len(exported.text.strip().splitlines()) == 6
+        print(f"   未登录: {anonymous.status_code}，非管理员: {non_admin.status_code}，只指定产品: {product_only.status_code} {'✅' if reject_ok else '❌'}")
+        print(f"   管理员按批次导出: {'✅' if export_ok else '❌'}")
+
+        return reject_ok and export_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def main():
+    """主测试函数"""
+    from app.database import init_db
+
+    init_db()
+
+    print("🧪 激活码流式导出测试")
+    print("=" * 60)
+
+    tests = [
+        test_csv_export,
+        test_ndjson_export,
+        test_invalid_export,
+        test_export_endpoint_auth
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test in tests:
+        if test():
+            passed += 1
+        print()
+
+    print("=" * 60)
+    print(f"📊 测试结果: {passed}/{total} 通过")
+
+    if passed == total:
+        print("🎉 所有测试通过！流式导出功能正常工作")
+        return True
+    else:
+        print("❌ 部分测试失败，请检查错误信息")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
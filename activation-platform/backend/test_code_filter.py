@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+已发放激活码过滤器测试脚本
+测试布隆过滤器的判定、持久化、按高水位补齐、写入冲突重试以及生成时的数据库查询次数
+"""
+
+import sys
+import os
+import tempfile
+from pathlib import Path
+
+# 添加项目路径到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+def test_bloom_filter():
+    """测试布隆过滤器"""
+    print("🌸 测试布隆过滤器")
+    print("=" * 50)
+    
+    try:
+        from app.services.code_filter import BloomFilter
+        from app.services.activation_service import EnhancedActivationCodeGenerator
+        
+        bloom = BloomFilter.for_capacity(10000, 0.001)
+        issued = EnhancedActivationCodeGenerator.generate_batch_codes(10000, 32, "ACT")
+        for code in issued:
+            bloom.add(code)
+        
+        print("1. 测试无漏判:")
+        no_false_negative = all(code in bloom for code in issued)
+        print(f"   已添加元素全部命中: {'✅ 通过' if no_false_negative else '❌ 失败'}")
+        
+        print("\n2. 测试误判率:")
+        candidates = EnhancedActivationCodeGenerator.generate_batch_codes(10000, 32, "ACT")
+        false_positives = sum(1 for code in candidates if code in bloom)
+        rate_ok = false_positives <= 50
+        print(f"   误判数量: {false_positives}/10000")
+        print(f"   误判率: {'✅ 通过' if rate_ok else '❌ 失败'}")
+        
+        print("\n3. 测试持久化:")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "codes.bloom")
+            bloom.save(path)
+            loaded = BloomFilter.load(path)
+            persist_ok = loaded is not None and loaded.count == 10000 and all(code in loaded for code in issued[:100])
+            print(f"   加载后一致: {'✅ 通过' if persist_ok else '❌ 失败'}")
+            
+            extra = EnhancedActivationCodeGenerator.generate_batch_codes(10, 32, "ACT")
+            for code in extra:
+                loaded.add(code)
+            loaded.high_water = 42
+            dirty_pages = len(loaded._dirty_pages)
+            loaded.save(path)
+            reloaded = BloomFilter.load(path)
+        incremental_ok = dirty_pages <= 10 * loaded.hash_count and reloaded is not None\
+            and reloaded.count == 10010 and reloaded.high_water == 42 and all(code in reloaded for code in extra)\
+            and reloaded.bits == loaded.bits
+        print(f"   增量写回 {dirty_pages} 页后一致: {'✅ 通过' if incremental_ok else '❌ 失败'}")
+        
+        return no_false_negative and rate_ok and persist_ok and incremental_ok
+        
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_filtered_generation():
+    """测试过滤器前置的生成流程"""
+    print("\n🗄️ 测试过滤器前置的生成流程")
+    print("=" * 50)
+    
+    try:
+        from sqlalchemy import event
+        from app.database import SessionLocal, engine
+        from app.services.activation_service import ActivationCodeService
+        from app.services.code_filter import get_issued_code_filter
+        from app.schemas import ActivationCodeCreate
+        from decimal import Decimal
+        
+        code_filter = get_issued_code_filter()
+        if code_filter is None:
+            print("   过滤器未启用，跳过")
+            return True
+        
+        code_filter.load()  # 应用启动时在后台加载
+        db = SessionLocal()
+        service = ActivationCodeService(db)
+        request = ActivationCodeCreate(
+            product_id="test_code_filter",
+            product_name="过滤器测试产品",
+            price=Decimal("10.00"),
+            quantity=1000
+        )
+        first = service.create_activation_codes(request)
+        
+        print("1. 测试写入后过滤器已更新:")
+        updated_ok = all(code_filter.might_contain(code.code) for code in first)
+        print(f"   已写入激活码全部命中: {'✅ 通过' if updated_ok else '❌ 失败'}")
+        
+        print("\n2. 测试生成时不再整批查询数据库:")
+        statements = []
+        
+        def record_statement(*args):
+            statements.append(args[2])
+        
+        event.listen(engine, "before_cursor_execute", record_statement)
+        try:
+            service.create_activation_codes(request)
+        finally:
+            event.remove(engine, "before_cursor_execute", record_statement)
+        
+        in_queries = [sql for sql in statements if "activation_codes.code IN" in sql]
+        query_ok = len(in_queries) <= 1
+        print(f"   查重查询数: {len(in_queries)}")
+        print(f"   过滤器前置: {'✅ 通过' if query_ok else '❌ 失败'}")
+        
+        db.close()
+        return updated_ok and query_ok
+        
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_high_water_catch_up():
+    """测试加载时补齐其他进程写入的激活码"""
+    print("\n🌊 测试按高水位补齐")
+    print("=" * 50)
+    
+    try:
+        from app.database import SessionLocal
+        from app.models import ActivationCode
+        from app.services.activation_service import EnhancedActivationCodeGenerator
+        from app.services.code_filter import BloomFilter, IssuedCodeFilter
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "codes.bloom")
+            first = IssuedCodeFilter(path, 100000, 0.001, 10000)
+            before_load = first.might_contain("ACT_NOT_LOADED")
+            first.load()
+            saved_high_water = BloomFilter.load(path).high_water
+            
+            # 模拟其他进程在过滤器持久化之后写入的激活码
+            db = SessionLocal()
+            try:
+                outside = EnhancedActivationCodeGenerator.generate_batch_codes(50, 32, "ACT")
+                db.add_all([
+                    ActivationCode(code=code, product_id="filter_outside", product_name="外部写入", price=1)
+                    for code in outside
+                ])
+                db.commit()
+            finally:
+                db.close()
+            
+            second = IssuedCodeFilter(path, 100000, 0.001, 10000)
+            second.load()
+            caught_up = all(second.might_contain(code) for code in outside)
+            advanced = BloomFilter.load(path).high_water > saved_high_water
+        
+        print(f"   加载完成前判定为可能存在: {'✅ 通过' if before_load else '❌ 失败'}")
+        print(f"   加载时补齐高水位之后的激活码: {'✅ 通过' if caught_up and advanced else '❌ 失败'}")
+        
+        return before_load and caught_up and advanced
+        
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_integrity_retry():
+    """测试写入与已存在激活码冲突时替换后重试该块"""
+    print("\n🔁 测试写入冲突重试")
+    print("=" * 50)
+    
+    try:
+        from decimal import Decimal
+        from app.database import SessionLocal
+        from app.models import ActivationCode
+        from app.schemas import ActivationCodeCreate
+        from app.services.activation_service import ActivationCodeService, EnhancedActivationCodeGenerator
+        
+        db = SessionLocal()
+        try:
+            service = ActivationCodeService(db)
+            request = ActivationCodeCreate(
+                product_id="test_code_filter_retry",
+                product_name="冲突重试产品",
+                price=Decimal("10.00"),
+                quantity=1
+            )
+            existing = service.create_activation_codes(request)[0].code
+            
+            # 过滤器未同步到的重复激活码（例如其他进程刚写入的）放在第二块中
+            codes = EnhancedActivationCodeGenerator.generate_batch_codes(150, 32, "ACT")
+            codes[120] = existing
+            written = [row for rows in service.insert_activation_codes(codes, request, chunk_size=100) for row in rows]
+            db.commit()
+            
+            written_codes = {row["code"] for row in written}
+            retry_ok = len(written) == 150 and len(written_codes) == 150 and existing not in written_codes
+            first_chunk_ok = set(codes[:100]) <= written_codes
+            unique_ok = db.query(ActivationCode).filter(ActivationCode.code == existing).count() == 1
+            print(f"   冲突块替换后写入: {len(written)} {'✅ 通过' if retry_ok else '❌ 失败'}")
+            print(f"   之前写入的块保留: {'✅ 通过' if first_chunk_ok else '❌ 失败'}")
+            print(f"   已存在激活码未重复: {'✅ 通过' if unique_ok else '❌ 失败'}")
+            
+            return retry_ok and first_chunk_ok and unique_ok
+        finally:
+            db.close()
+        
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def main():
+    """主测试函数"""
+    from app.database import init_db
+
+    init_db()
+
+    print("🧪 已发放激活码过滤器测试")
+    print("=" * 60)
+    
+    tests = [
+        test_bloom_filter,
+        test_filtered_generation,
+        test_high_water_catch_up,
+        test_integrity_retry
+    ]
+    
+    passed = 0
+    total = len(tests)
+    
+    for test in tests:
+        if test():
+            passed += 1
+        print()
+    
+    print("=" * 60)
+    print(f"📊 测试结果: {passed}/{total} 通过")
+    
+    if passed == total:
+        print("🎉 所有测试通过！已发放激活码过滤器功能正常工作")
+        return True
+    else:
+        print("❌ 部分测试失败，请检查错误信息")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+置换模式激活码测试脚本
+测试保格式置换的双射性、(节点ID, 序号) 反查和免查重生成
+"""
+
+import sys
+import os
+from pathlib import Path
+
+# 添加项目路径到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+def test_permutation_bijection():
+    """测试置换的双射性"""
+    print("🔁 测试置换的双射性")
+    print("=" * 50)
+    
+    try:
+        from app.services.code_permutation import CodePermutation
+        
+        print("1. 测试小定义域上的双射:")
+        permutation = CodePermutation(b"test-key", 3)
+        outputs = [permutation.encrypt(value) for value in range(permutation.domain)]
+        bijection_ok = sorted(outputs) == list(range(permutation.domain))
+        print(f"   定义域大小: {permutation.domain}")
+        print(f"   双射: {'✅ 通过' if bijection_ok else '❌ 失败'}")
+        
+        print("\n2. 测试逆置换:")
+        permutation = CodePermutation(b"test-key", 29)
+        samples = [0, 1, 12345, permutation.domain - 1]
+        inverse_ok = all(permutation.decrypt(permutation.encrypt(value)) == value for value in samples)
+        print(f"   逆置换: {'✅ 通过' if inverse_ok else '❌ 失败'}")
+        
+        print("\n3. 测试不同密钥输出不同:")
+        other = CodePermutation(b"other-key", 29)
+        key_ok = permutation.encrypt(12345) != other.encrypt(12345)
+        print(f"   密钥相关: {'✅ 通过' if key_ok else '❌ 失败'}")
+        
+        return bijection_ok and inverse_ok and key_ok
+        
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_permuted_generation():
+    """测试置换模式生成"""
+    print("\n🏷️ 测试置换模式生成")
+    print("=" * 50)
+    
+    try:
+        from app.services.code_permutation import PermutedCodeGenerator, SequenceAllocator
+        from app.services.activation_service import EnhancedActivationCodeGenerator
+        
+        class MemoryAllocator(SequenceAllocator):
+            """测试用内存序号分配器"""
+            def _reserve_block(self, size):
+                start = getattr(self, "_reserved", 0)
+                self._reserved = start + size
+                return start, start + size
+        
+        node_a = PermutedCodeGenerator(node_id=1, prefix="ACT", key=b"k", allocator=MemoryAllocator(1, 1000))
+        node_b = PermutedCodeGenerator(node_id=2, prefix="ACT", key=b"k", allocator=MemoryAllocator(2, 1000))
+        
+        print("1. 测试多节点唯一性:")
+        codes_a = node_a.generate(5000)
+        codes_b = node_b.generate(5000)
+        unique_ok = len(set(codes_a) | set(codes_b)) == 10000
+        print(f"   节点1: {codes_a[0]}")
+        print(f"   节点2: {codes_b[0]}")
+        print(f"   唯一性: {'✅ 通过' if unique_ok else '❌ 失败'}")
+        
+        print("\n2. 测试格式兼容性:")
+        format_ok = all(
+            len(code) == 32 and EnhancedActivationCodeGenerator.verify_code_format(code)
+            for code in codes_a + codes_b
+        )
+        print(f"   格式验证: {'✅ 通过' if format_ok else '❌ 失败'}")
+        
+        print("\n3. 测试反查节点和序号:")
+        locate_ok = node_a.locate(codes_a[42]) == (1, 42) and node_b.locate(codes_b[-1]) == (2, 4999)
+        print(f"   反查: {'✅ 通过' if locate_ok else '❌ 失败'}")
+        
+        return unique_ok and format_ok and locate_ok
+        
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_create_without_existence_check():
+    """测试置换模式创建激活码不再查重"""
+    print("\n🗄️ 测试置换模式创建激活码")
+    print("=" * 50)
+    
+    try:
+        from sqlalchemy import event
+        from app.config import settings
+        from app.database import SessionLocal, engine
+        from app.services.activation_service import ActivationCodeService
+        from app.schemas import ActivationCodeCreate
+        from decimal import Decimal
+        
+        statements = []
+        
+        def record_statement(*args):
+            statements.append(args[2])
+        
+        original_mode = settings.CODE_GENERATION_MODE
+        settings.CODE_GENERATION_MODE = "permutation"
+        db = SessionLocal()
+        event.listen(engine, "before_cursor_execute", record_statement)
+        try:
+            service = ActivationCodeService(db)
+            activation_codes = service.create_activation_codes(ActivationCodeCreate(
+                product_id="test_permutation",
+                product_name="置换模式测试产品",
+                price=Decimal("10.00"),
+                quantity=200
+            ))
+        finally:
+            event.remove(engine, "before_cursor_execute", record_statement)
+            settings.CODE_GENERATION_MODE = original_mode
+            db.close()
+        
+        in_queries = [sql for sql in statements if "activation_codes.code IN" in sql]
+        check_ok = not in_queries and len(activation_codes) == 200
+        print(f"   创建数量: {len(activation_codes)}")
+        print(f"   查重查询数: {len(in_queries)}")
+        print(f"   免查重: {'✅ 通过' if check_ok else '❌ 失败'}")
+        
+        return check_ok
+        
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def main():
+    """主测试函数"""
+    from app.database import init_db
+
+    init_db()
+
+    print("🧪 置换模式激活码测试")
+    print("=" * 60)
+    
+    tests = [
+        test_permutation_bijection,
+        test_permuted_generation,
+        test_create_without_existence_check
+    ]
+    
+    passed = 0
+    total = len(tests)
+    
+    for test in tests:
+        if test():
+            passed += 1
+        print()
+    
+    print("=" * 60)
+    print(f"📊 测试结果: {passed}/{total} 通过")
+    
+    if passed == total:
+        print("🎉 所有测试通过！置换模式生成功能正常工作")
+        return True
+    else:
+        print("❌ 部分测试失败，请检查错误信息")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
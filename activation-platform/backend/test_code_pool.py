@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+预生成激活码池测试脚本
+测试补充低水位、并发领取唯一性、池为空时的回退以及下单发放激活码
+"""
+
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# 添加项目路径到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+def test_refill():
+    """测试按低水位补充"""
+    print("🪣 测试激活码池补充")
+    print("=" * 50)
+
+    try:
+        from app.config import settings
+        from app.database import SessionLocal
+        from app.services.code_pool import CodePoolService
+
+        db = SessionLocal()
+        try:
+            service = CodePoolService(db)
+            product_id = f"pool_{uuid.uuid4().hex[:8]}"
+            target = settings.CODE_POOL_LOW_WATER + settings.CODE_POOL_REFILL_SIZE
+
+            added = service.refill(product_id, "激活码池测试产品", 19.9)
+            print(f"   首次补充: {added} (期望: {target})")
+            first_ok = added == target and service.pool_size(product_id) == target
+
+            added_again = service.refill(product_id, "激活码池测试产品", 19.9)
+            print(f"   高于低水位时补充: {added_again} (期望: 0)")
+            second_ok = added_again == 0
+
+            return first_ok and second_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_concurrent_claim():
+    """测试并发领取不会重复发放"""
+    print("\n🔒 测试并发领取")
+    print("=" * 50)
+
+    try:
+        from app.database import SessionLocal
+        from app.models import ActivationCode
+        from app.services.code_pool import CodePoolService
+
+        product_id = f"pool_{uuid.uuid4().hex[:8]}"
+        db = SessionLocal()
+        try:
+            CodePoolService(db).refill(product_id, "激活码池测试产品", 19.9)
+            initial = CodePoolService(db).pool_size(product_id)
+        finally:
+            db.close()
+
+        def claim_one(_):
+            session = SessionLocal()
+            try:
+                return CodePoolService(session).claim(product_id, "下单产品名", 29.9, max_activations=2)
+            finally:
+                session.close()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            claimed = [c for c in executor.map(claim_one, range(200)) if c]
+
+        db = SessionLocal()
+        try:
+            remaining = CodePoolService(db).pool_size(product_id)
+            codes = {c["code"] for c in claimed}
+            unique_ok = len(codes) == len(claimed) == 200
+            count_ok = remaining == initial - 200
+            claimed_rows = db.query(ActivationCode).filter(ActivationCode.id.in_([c["id"] for c in claimed])).all()
+            attrs_ok = len(claimed_rows) == 200 and all(
+                row.product_id == product_id and row.product_name == "下单产品名" and row.max_activations == 2
+                for row in claimed_rows
+            )
+        finally:
+            db.close()
+
+        print(f"   领取数量: {len(claimed)}，唯一: {len(codes)} {'✅' if unique_ok else '❌'}")
+        print(f"   剩余数量: {remaining} (期望: {initial - 200}) {'✅' if count_ok else '❌'}")
+        print(f"   下单信息已写入: {'✅' if attrs_ok else '❌'}")
+
+        return unique_ok and count_ok and attrs_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_issue_fallback():
+    """测试池为空时当场生成以及放回池中"""
+    print("\n🔁 测试空池回退与放回")
+    print("=" * 50)
+
+    try:
+        from app.database import SessionLocal
+        from app.services.code_pool import CodePoolService
+
+        db = SessionLocal()
+        try:
+            service = CodePoolService(db)
+            product_id = f"pool_{uuid.uuid4().hex[:8]}"
+
+            empty_claim = service.claim(product_id)
+            issued = service.issue(product_id, "空池产品", 9.9)
+            fallback_ok = empty_claim is None and issued["code"].startswith("ACT")
+            print(f"   空池领取: {empty_claim}，回退生成: {issued['code']} {'✅' if fallback_ok else '❌'}")
+
+            service.release(product_id, issued["id"])
+            reclaimed = service.claim(product_id)
+            release_ok = reclaimed is not None and reclaimed["code"] == issued["code"]
+            print(f"   放回后重新领取: {'✅ 通过' if release_ok else '❌ 失败'}")
+
+            return fallback_ok and release_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_checkout_issues_code():
+    """测试下单从激活码池领取并返回激活码（产品不在产品表中时同样可以下单）"""
+    print("\n💳 测试下单发放激活码")
+    print("=" * 50)
+
+    try:
+        from app.database import SessionLocal
+        from app.payment.service import PaymentService
+        from app.schemas import ActivationCodeVerify
+        from app.services.activation_service import ActivationCodeService
+
+        db = SessionLocal()
+        try:
+            product_id = f"pay_{uuid.uuid4().hex[:8]}"
+            created = PaymentService(db).create_payment_with_activation_code(
+                product_id=product_id, product_name="下单测试产品", price=39.9, payment_method="mock"
+            )
+            verified = ActivationCodeService(db).verify_activation_code(ActivationCodeVerify(code=created["activation_code"]))
+
+            contract_ok = created["success"] and created["activation_code"] and created["activation_code_id"]\
+                and created["amount"] == 39.9 and created["product_name"] == "下单测试产品"
+            valid_ok = verified["valid"] and verified["activation_code"]["product_id"] == product_id
+            print(f"   返回激活码: {created.get('activation_code')} {'✅' if contract_ok else '❌'}")
+            print(f"   激活码可用: {'✅' if valid_ok else '❌'}")
+
+            return bool(contract_ok) and valid_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_refill_known_products():
+    """测试只为产品表中的上架产品维护激活码池"""
+    print("\n📦 测试按产品表补充")
+    print("=" * 50)
+
+    try:
+        from decimal import Decimal
+        from app.config import settings
+        from app.database import SessionLocal
+        from app.models import Product
+        from app.services.code_pool import CodePoolRefiller, CodePoolService
+
+        db = SessionLocal()
+        try:
+            known = f"pool_{uuid.uuid4().hex[:8]}"
+            unknown = f"pool_{uuid.uuid4().hex[:8]}"
+            db.add(Product(product_id=known, name="上架产品", price=Decimal("19.90"), currency="CNY"))
+            db.commit()
+
+            service = CodePoolService(db)
+            issued = service.issue(unknown, "未登记产品", 9.9)
+            CodePoolRefiller().refill_all()
+
+            known_ok = service.pool_size(known) == settings.CODE_POOL_LOW_WATER + settings.CODE_POOL_REFILL_SIZE
+            unknown_ok = issued["code"].startswith("ACT") and service.pool_size(unknown) == 0
+            print(f"   上架产品补充: {service.pool_size(known)} {'✅' if known_ok else '❌'}")
+            print(f"   未在产品表中的产品不建池: {service.pool_size(unknown)} {'✅' if unknown_ok else '❌'}")
+
+            return known_ok and unknown_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def main():
+    """主测试函数"""
+    from app.database import init_db
+
+    init_db()
+
+    print("🧪 预生成激活码池测试")
+    print("=" * 60)
+
+    tests = [
+        test_refill,
+        test_concurrent_claim,
+        test_issue_fallback,
+        test_checkout_issues_code,
+        test_refill_known_products
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test in tests:
+        if test():
+            passed += 1
+        print()
+
+    print("=" * 60)
+    print(f"📊 测试结果: {passed}/{total} 通过")
+
+    if passed == total:
+        print("🎉 所有测试通过！激活码池功能正常工作")
+        return True
+    else:
+        print("❌ 部分测试失败，请检查错误信息")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+设备租约测试脚本
+测试验证通过后的内存续约、租约到期与最大时长、解绑与状态变更撤销、撤销竞争、激活码过期以及心跳续约
+"""
+
+import sys
+import time
+import uuid
+import hashlib
+from pathlib import Path
+
+# 添加项目路径到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+def _create_codes(db, quantity: int):
+    """创建一批测试激活码"""
+    from app.services.activation_service import ActivationCodeService
+    from app.schemas import ActivationCodeCreate
+
+    request = ActivationCodeCreate(
+        product_id=f"lease_{uuid.uuid4().hex[:8]}",
+        product_name="设备租约测试产品",
+        price=9.9,
+        quantity=quantity
+    )
+    return [item.code for item in ActivationCodeService(db).create_activation_codes(request)]
+
+def _fingerprint() -> str:
+    """生成一个随机硬件指纹"""
+    return hashlib.sha256(uuid.uuid4().bytes).hexdigest()
+
+class _QueryCounter:
+    """统计执行的 SQL 语句数量"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        from sqlalchemy import event
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+def test_renewal_from_memory():
+    """测试租约有效期内再次验证不查询数据库，结果与数据库验证一致"""
+    print("📝 测试内存续约")
+    print("=" * 50)
+
+    try:
+        from app.database import SessionLocal, engine
+        from app.services.activation_service import ActivationCodeService
+
+        db = SessionLocal()
+        try:
+            service = ActivationCodeService(db)
+            code = _create_codes(db, 1)[0]
+            fingerprint = _fingerprint()
+            service.bind_to_hardware(code, fingerprint, "lease_user")
+
+            with _QueryCounter(engine) as first_queries:
+                first = service.verify_hardware_binding(code, fingerprint)
+            with _QueryCounter(engine) as renewal_queries:
+                renewals = [service.verify_hardware_binding(code, fingerprint) for _ in range(20)]
+            with _QueryCounter(engine) as other_queries:
+                other = service.verify_hardware_binding(code, _fingerprint())
+
+            grant_ok = first["valid"] and first["lease_expires_at"] is not None and len(first_queries.statements) >= 1
+            renew_ok = all(
+                result["valid"] and result["binding_info"] == first["binding_info"] and result["message"] == first["message"]
+                for result in renewals
+            ) and not renewal_queries.statements
+            other_ok = not other["valid"] and len(other_queries.statements) >= 1
+            print(f"   首次验证查询数据库并发放租约: {'✅' if grant_ok else '❌'}")
+            print(f"   20 次续约查询数: {len(renewal_queries.statements)} {'✅' if renew_ok else '❌'}")
+            print(f"   其他设备仍查询数据库并被拒绝: {'✅' if other_ok else '❌'}")
+
+            return grant_ok and renew_ok and other_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_lease_expiry():
+    """测试租约到期与最大租约时长"""
+    print("\n⏳ 测试租约到期")
+    print("=" * 50)
+
+    try:
+        from app.services.device_lease import DeviceLeaseTable
+
+        fingerprint = _fingerprint()
+        idle = DeviceLeaseTable(100, ttl=0.2, max_age=10)
+        idle.grant("IDLE", fingerprint, 1.0)
+        time.sleep(0.3)
+        idle_ok = idle.renew("IDLE", fingerprint) is None
+
+        capped = DeviceLeaseTable(100, ttl=0.2, max_age=0.5)
+        capped.grant("CAPPED", fingerprint, 0.8)
+        renewed = []
+        for _ in range(6):
+            time.sleep(0.1)
+            renewed.append(capped.renew("CAPPED", fingerprint) is not None)
+        cap_ok = renewed[:3] == [True, True, True] and renewed[-1] is False
+        device_ok = capped.renew("CAPPED", _fingerprint()) is None
+
+        print(f"   超过有效期未续约后失效: {'✅' if idle_ok else '❌'}")
+        print(f"   续约不超过最大租约时长: {renewed} {'✅' if cap_ok else '❌'}")
+        print(f"   其他设备不能续约: {'✅' if device_ok else '❌'}")
+        print(f"   统计: {capped.stats()}")
+
+        return idle_ok and cap_ok and device_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_revoke_on_unbind():
+    """测试解绑后租约被撤销"""
+    print("\n🚫 测试解绑撤销租约")
+    print("=" * 50)
+
+    try:
+        from app.config import settings
+        from app.database import SessionLocal
+        from app.services.activation_service import ActivationCodeService
+
+        db = SessionLocal()
+        try:
+            service = ActivationCodeService(db)
+            code = _create_codes(db, 1)[0]
+            fingerprint = _fingerprint()
+            service.bind_to_hardware(code, fingerprint, "lease_user")
+
+            before = service.verify_hardware_binding(code, fingerprint)
+            service.unbind_hardware(code, settings.ADMIN_UNBIND_KEY)
+            after = service.verify_hardware_binding(code, fingerprint)
+            heartbeat = service.verify_hardware_bindings([{"activation_code": code, "hardware_fingerprint": fingerprint}])
+
+            revoke_ok = before["valid"] and not after["valid"] and not heartbeat[0]["valid"]
+            print(f"   解绑后验证: {after['message']}，心跳: {heartbeat[0]['verdict']} {'✅' if revoke_ok else '❌'}")
+
+            return revoke_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_revoke_on_status_change():
+    """测试过期清扫改变激活码状态后租约被撤销"""
+    print("\n🔒 测试状态变更撤销租约")
+    print("=" * 50)
+
+    try:
+        from datetime import datetime, timedelta
+        from sqlalchemy import update
+        from app.database import SessionLocal
+        from app.models import ActivationCode, ActivationCodeStatus
+        from app.services.activation_service import ActivationCodeService
+        from app.services.device_lease import get_device_lease_table
+
+        leases = get_device_lease_table()
+        db = SessionLocal()
+        try:
+            service = ActivationCodeService(db)
+            expired_code = _create_codes(db, 1)[0]
+            fingerprint = _fingerprint()
+            leases.grant(expired_code, fingerprint, 1.0, {"user_id": "lease_user"})
+
+            now = datetime.utcnow()
+            db.execute(
+                update(ActivationCode)
+                .where(ActivationCode.code == expired_code)
+                .values(expires_at=now - timedelta(days=1))
+            )
+            db.commit()
+            swept = service.expire_activation_codes(now=now)
+
+            sweep_ok = swept >= 1 and service.get_activation_code(expired_code).status == ActivationCodeStatus.EXPIRED\
+                and leases.renew(expired_code, fingerprint) is None
+            print(f"   过期清扫后续约: {'✅' if sweep_ok else '❌'}")
+
+            return sweep_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_stale_grant_and_code_expiry():
+    """测试验证期间被撤销时不发放租约，续约不超过激活码过期时间"""
+    print("\n⌛ 测试撤销竞争与激活码过期")
+    print("=" * 50)
+
+    try:
+        from datetime import datetime, timedelta
+        from sqlalchemy import update
+        from app.database import SessionLocal
+        from app.models import ActivationCode
+        from app.services.activation_service import ActivationCodeService
+        from app.services.device_lease import DeviceLeaseTable, revoke_device_lease
+
+        fingerprint = _fingerprint()
+        table = DeviceLeaseTable(100, ttl=10, max_age=60)
+        generation = table.generation()
+        table.revoke("RACED")
+        table.grant("RACED", fingerprint, 1.0, {"user_id": "lease_user"}, generation=generation)
+        race_ok = table.renew("RACED", fingerprint) is None and table.stats()["stale_grants"] == 1
+
+        table.grant("EXPIRING", fingerprint, 1.0, code_expires_at=datetime.utcnow() + timedelta(seconds=0.3))
+        first = table.renew("EXPIRING", fingerprint)
+        time.sleep(0.4)
+        expiry_ok = first is not None and table.renew("EXPIRING", fingerprint) is None
+
+        db = SessionLocal()
+        try:
+            service = ActivationCodeService(db)
+            code = _create_codes(db, 1)[0]
+            service.bind_to_hardware(code, fingerprint, "lease_user")
+            before = service.verify_hardware_binding(code, fingerprint)
+            db.execute(
+                update(ActivationCode)
+                .where(ActivationCode.code == code)
+                .values(expires_at=datetime.utcnow() - timedelta(seconds=1))
+            )
+            db.commit()
+            revoke_device_lease(code)  # 直接修改数据库不经过服务，手动撤销租约后回到数据库验证
+            after = service.verify_hardware_binding(code, fingerprint)
+            heartbeat = service.verify_hardware_bindings([{"activation_code": code, "hardware_fingerprint": fingerprint}])
+            db_ok = before["valid"] and not after["valid"] and after["message"] == "激活码已过期"\
+                and heartbeat[0]["verdict"] == "expired"
+        finally:
+            db.close()
+
+        print(f"   验证期间被撤销不发放租约: {'✅' if race_ok else '❌'}")
+        print(f"   激活码过期后不再续约: {'✅' if expiry_ok else '❌'}")
+        print(f"   已过期激活码验证: {after['message']}，心跳: {heartbeat[0]['verdict']} {'✅' if db_ok else '❌'}")
+
+        return race_ok and expiry_ok and db_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_heartbeat_renewal():
+    """测试心跳通过后再次心跳不查询数据库"""
+    print("\n💓 测试心跳续约")
+    print("=" * 50)
+
+    try:
+        from app.database import SessionLocal, engine
+        from app.services.activation_service import ActivationCodeService
+
+        db = SessionLocal()
+        try:
+            service = ActivationCodeService(db)
+            codes = _create_codes(db, 50)
+            items = []
+            for code in codes:
+                fingerprint = _fingerprint()
+                service.bind_to_hardware(code, fingerprint, "fleet_user")
+                items.append({"activation_code": code, "hardware_fingerprint": fingerprint})
+            items.append({"activation_code": codes[0], "hardware_fingerprint": _fingerprint()})
+
+            with _QueryCounter(engine) as first_queries:
+                first = service.verify_hardware_bindings(items)
+            with _QueryCounter(engine) as second_queries:
+                second = service.verify_hardware_bindings(items)
+
+            verdicts_ok = [result["verdict"] for result in first] == [result["verdict"] for result in second]\
+                and first[-1]["verdict"] == "mismatch" and all(result["verdict"] == "ok" for result in second[:-1])
+            query_ok = len(first_queries.statements) == 1 and len(second_queries.statements) == 1
+            print(f"   两次心跳结果一致: {'✅' if verdicts_ok else '❌'}")
+            print(f"   查询次数: {len(first_queries.statements)} / {len(second_queries.statements)}（第二次只查询未持有租约的设备） {'✅' if query_ok else '❌'}")
+
+            return verdicts_ok and query_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def main():
+    """主测试函数"""
+    from app.database import init_db
+
+    init_db()
+
+    print("🧪 设备租约测试")
+    print("=" * 60)
+
+    tests = [
+        test_renewal_from_memory,
+        test_lease_expiry,
+        test_revoke_on_unbind,
+        test_revoke_on_status_change,
+        test_stale_grant_and_code_expiry,
+        test_heartbeat_renewal
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test in tests:
+        if test():
+            passed += 1
+        print()
+
+    print("=" * 60)
+    print(f"📊 测试结果: {passed}/{total} 通过")
+
+    if passed == total:
+        print("🎉 所有测试通过！设备租约功能正常工作")
+        return True
+    else:
+        print("❌ 部分测试失败，请检查错误信息")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -102,6 +102,42 @@ def test_encryption_security():
         print(f"❌ 测试失败: {e}")
         return False
 
+def test_bulk_code_generation():
+    """测试批量熵切片生成"""
+    print("\n📦 测试批量熵切片生成")
+    print("=" * 50)
+    
+    try:
+        from app.services.activation_service import EnhancedActivationCodeGenerator
+        
+        # 测试格式兼容性
+        print("1. 测试格式兼容性:")
+        codes = EnhancedActivationCodeGenerator.generate_bulk_codes(1000, 32, "ACT")
+        lengths_ok = all(len(code) == 32 for code in codes)
+        format_ok = all(EnhancedActivationCodeGenerator.verify_code_format(code) for code in codes)
+        print(f"   生成数量: {len(codes)}")
+        print(f"   长度正确: {'✅ 通过' if lengths_ok else '❌ 失败'}")
+        print(f"   格式验证: {'✅ 通过' if format_ok else '❌ 失败'}")
+        
+        # 测试字符分布（每个字符都应出现）
+        print("\n2. 测试字符分布:")
+        used_chars = set(''.join(code[3:] for code in codes))
+        coverage_ok = used_chars == set(EnhancedActivationCodeGenerator.CHARACTERS)
+        print(f"   覆盖字符数: {len(used_chars)}/{len(EnhancedActivationCodeGenerator.CHARACTERS)}")
+        print(f"   分布: {'✅ 通过' if coverage_ok else '❌ 失败'}")
+        
+        # 测试批量生成唯一性
+        print("\n3. 测试批量生成唯一性:")
+        batch = EnhancedActivationCodeGenerator.generate_batch_codes(10000, 32, "ACT")
+        unique_ok = len(batch) == len(set(batch)) == 10000
+        print(f"   唯一性: {'✅ 通过' if unique_ok else '❌ 失败'}")
+        
+        return lengths_ok and format_ok and coverage_ok and unique_ok
+        
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
 def test_database_integration():
     """测试数据库集成"""
     print("\n🗄️ 测试数据库集成")
@@ -162,6 +198,73 @@ def test_database_integration():
         print(f"❌ 测试失败: {e}")
         return False
 
+def test_bulk_insert_path():
+    """测试分块批量写入路径"""
+    print("\n📥 测试分块批量写入路径")
+    print("=" * 50)
+    
+    try:
+        from sqlalchemy import event
+        from app.services.activation_service import ActivationCodeService, EnhancedActivationCodeGenerator
+        from app.database import SessionLocal, engine
+        from app.schemas import ActivationCodeCreate
+        from app.services.code_filter import get_issued_code_filter
+        from decimal import Decimal
+        
+        statements = []
+        
+        def count_statement(*args):
+            statements.append(args[2])
+        
+        code_filter = get_issued_code_filter()
+        if code_filter is not None:
+            code_filter.load()  # 应用启动时在后台加载
+        
+        db = SessionLocal()
+        service = ActivationCodeService(db)
+        request = ActivationCodeCreate(
+            product_id="test_product_bulk",
+            product_name="批量写入测试产品",
+            price=Decimal("99.00"),
+            quantity=1000
+        )
+        
+        # 统计创建和构建响应过程中的SQL语句数量
+        print("1. 测试创建1000个激活码的查询次数:")
+        event.listen(engine, "before_cursor_execute", count_statement)
+        try:
+            activation_codes = service.create_activation_codes(request)
+            ids = [code.id for code in activation_codes]
+            created = [code.created_at for code in activation_codes]
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statement)
+        
+        statements_ok = len(statements) <= 3
+        print(f"   创建数量: {len(activation_codes)}")
+        print(f"   SQL语句数: {len(statements)}")
+        print(f"   无逐行回查: {'✅ 通过' if statements_ok else '❌ 失败'}")
+        
+        fields_ok = len(set(ids)) == 1000 and all(created)
+        print(f"   返回 id/created_at: {'✅ 通过' if fields_ok else '❌ 失败'}")
+        
+        # 测试分块流式写入
+        print("\n2. 测试分块流式写入:")
+        codes = EnhancedActivationCodeGenerator.generate_batch_codes(2500, 32, "ACT")
+        chunk_sizes = []
+        for chunk_rows in service.insert_activation_codes(codes, request, chunk_size=1000):
+            chunk_sizes.append(len(chunk_rows))
+            db.commit()
+        chunks_ok = chunk_sizes == [1000, 1000, 500]
+        print(f"   每块行数: {chunk_sizes}")
+        print(f"   分块写入: {'✅ 通过' if chunks_ok else '❌ 失败'}")
+        
+        db.close()
+        return statements_ok and fields_ok and chunks_ok
+        
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
 def test_performance():
     """测试性能"""
     print("\n⚡ 测试性能")
@@ -184,6 +287,14 @@ def test_performance():
             speed = qty / duration
             print(f"   生成 {qty} 个激活码: {duration:.3f}秒 (速度: {speed:.0f}个/秒)")
         
+        # 测试批量熵切片生成速度
+        print("\n2. 测试批量熵切片生成速度:")
+        for qty in [10000, 100000, 1000000]:
+            start_time = time.time()
+            codes = EnhancedActivationCodeGenerator.generate_bulk_codes(qty, 32, "ACT")
+            duration = max(time.time() - start_time, 1e-9)
+            print(f"   生成 {qty} 个激活码: {duration:.3f}秒 (速度: {qty / duration:.0f}个/秒)")
+        
         return True
         
     except Exception as e:
@@ -198,7 +309,9 @@ def main():
     tests = [
         test_enhanced_code_generation,
         test_encryption_security,
+        test_bulk_code_generation,
         test_database_integration,
+        test_bulk_insert_path,
         test_performance
     ]
     
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+过期激活码清扫测试脚本
+测试按批标记过期激活码、缓存失效、统计准确以及过期时间部分索引
+"""
+
+import sys
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加项目路径到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+def _create_codes(db, product_id: str, quantity: int, expires_at: datetime = None, max_activations: int = 1):
+    """创建一批测试激活码"""
+    from app.services.activation_service import ActivationCodeService
+    from app.schemas import ActivationCodeCreate
+
+    request = ActivationCodeCreate(
+        product_id=product_id,
+        product_name="过期清扫测试产品",
+        price=9.9,
+        quantity=quantity,
+        max_activations=max_activations,
+        expires_at=expires_at
+    )
+    return [item.code for item in ActivationCodeService(db).create_activation_codes(request)]
+
+def test_batched_sweep():
+    """测试按批标记过期激活码，只处理未使用且已到期的激活码"""
+    print("🧹 测试按批清扫")
+    print("=" * 50)
+
+    try:
+        from sqlalchemy import event
+        from app.database import SessionLocal, engine
+        from app.models import ActivationCode, ActivationCodeStatus
+        from app.services.activation_service import ActivationCodeService
+
+        db = SessionLocal()
+        try:
+            product_id = f"expiry_{uuid.uuid4().hex[:8]}"
+            future = datetime.utcnow() + timedelta(days=1)
+            expired_codes = _create_codes(db, product_id, 25)
+            valid_codes = _create_codes(db, product_id, 5, expires_at=future)
+            used_code = _create_codes(db, product_id, 1, expires_at=future)[0]
+
+            service = ActivationCodeService(db)
+            service.use_activation_code(used_code, "expiry_user")
+            # 将过期时间改为已到期
+            db.query(ActivationCode)\
+                .filter(ActivationCode.code.in_(expired_codes + [used_code]))\
+                .update({"expires_at": datetime.utcnow() - timedelta(hours=1)}, synchronize_session=False)
+            db.commit()
+
+            updates = []
+
+            def count_updates(conn, cursor, statement, parameters, context, executemany):
+                if statement.startswith("UPDATE activation_codes SET status"):
+                    updates.append(statement)
+
+            event.listen(engine, "before_cursor_execute", count_updates)
+            try:
+                swept = service.expire_activation_codes(batch_size=10)
+            finally:
+                event.remove(engine, "before_cursor_execute", count_updates)
+            again = service.expire_activation_codes(batch_size=10)
+
+            statuses = {
+                code: status for code, status in db.query(ActivationCode.code, ActivationCode.status)
+                .filter(ActivationCode.product_id == product_id)
+            }
+            count_ok = swept >= 25 and again == 0 and len(updates) >= 3
+            expired_ok = all(statuses[code] == ActivationCodeStatus.EXPIRED for code in expired_codes)
+            untouched_ok = all(statuses[code] == ActivationCodeStatus.UNUSED for code in valid_codes)\
+                and statuses[used_code] == ActivationCodeStatus.USED
+            print(f"   标记数量: {swept}，UPDATE 语句: {len(updates)}，再次清扫: {again} {'✅' if count_ok else '❌'}")
+            print(f"   已到期激活码标记为过期: {'✅' if expired_ok else '❌'}")
+            print(f"   未到期和已用完的激活码不受影响: {'✅' if untouched_ok else '❌'}")
+
+            return count_ok and expired_ok and untouched_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_cache_and_stats():
+    """测试清扫后缓存失效，统计在清扫前后都准确"""
+    print("\n📊 测试缓存失效和统计")
+    print("=" * 50)
+
+    try:
+        from app.database import SessionLocal
+        from app.models import ActivationCode
+        from app.schemas import ActivationCodeVerify
+        from app.services.activation_service import ActivationCodeService
+        from app.services.code_cache import get_activation_code_cache
+
+        db = SessionLocal()
+        try:
+            product_id = f"expiry_{uuid.uuid4().hex[:8]}"
+            codes = _create_codes(db, product_id, 4, expires_at=datetime.utcnow() + timedelta(days=1))
+            service = ActivationCodeService(db)
+            service.verify_activation_code(ActivationCodeVerify(code=codes[0]))
+
+            db.query(ActivationCode)\
+                .filter(ActivationCode.code.in_(codes[:3]))\
+                .update({"expires_at": datetime.utcnow() - timedelta(minutes=1)}, synchronize_session=False)
+            db.commit()
+
+            before = service.get_activation_code_stats(product_id)
+            service.expire_activation_codes()
+            after = service.get_activation_code_stats(product_id)
+
+            cache = get_activation_code_cache()
+            cache_ok = cache is None or cache.local.get(codes[0]) is None
+            verify = service.verify_activation_code(ActivationCodeVerify(code=codes[0]))
+            stats_ok = before == after and after["expired"] == 3 and after["unused"] == 1
+            print(f"   清扫前统计: {before}")
+            print(f"   清扫后统计: {after} {'✅' if stats_ok else '❌'}")
+            print(f"   缓存已失效: {'✅' if cache_ok else '❌'}")
+            print(f"   验证结果: {verify['message']} {'✅' if not verify['valid'] else '❌'}")
+
+            return stats_ok and cache_ok and not verify["valid"]
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_partial_index():
+    """测试过期时间部分索引存在并被清扫查询使用"""
+    print("\n🗂️ 测试过期时间索引")
+    print("=" * 50)
+
+    try:
+        from sqlalchemy import select, text
+        from app.database import SessionLocal, engine, init_db
+        from app.models import ActivationCode
+        from app.services.activation_service import ActivationCodeService
+
+        if engine.dialect.name != "sqlite":
+            print("   非 SQLite 数据库，跳过执行计划检查")
+            return True
+
+        init_db()
+        db = SessionLocal()
+        try:
+            ddl = db.execute(text(
+                "SELECT sql FROM sqlite_master WHERE type = 'index' AND name = 'ix_activation_codes_expires_at'"
+            )).scalar()
+            query = select(ActivationCode.id)\
+                .where(*ActivationCodeService._overdue_conditions(datetime.utcnow()))\
+                .order_by(ActivationCode.expires_at)\
+                .limit(10)
+            compiled = query.compile(engine, compile_kwargs={"literal_binds": True})
+            plan = " ".join(str(row[-1]) for row in db.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+        finally:
+            db.close()
+
+        index_ok = ddl is not None and "WHERE" in ddl
+        plan_ok = "ix_activation_codes_expires_at" in plan
+        print(f"   部分索引: {ddl} {'✅' if index_ok else '❌'}")
+        print(f"   执行计划: {plan} {'✅' if plan_ok else '❌'}")
+
+        return index_ok and plan_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def main():
+    """主测试函数"""
+    from app.database import init_db
+
+    init_db()
+
+    print("🧪 过期激活码清扫测试")
+    print("=" * 60)
+
+    tests = [
+        test_batched_sweep,
+        test_cache_and_stats,
+        test_partial_index
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test in tests:
+        if test():
+            passed += 1
+        print()
+
+    print("=" * 60)
+    print(f"📊 测试结果: {passed}/{total} 通过")
+
+    if passed == total:
+        print("🎉 所有测试通过！过期激活码清扫功能正常工作")
+        return True
+    else:
+        print("❌ 部分测试失败，请检查错误信息")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+异步生成任务测试脚本
+测试任务创建、分块写入、进度统计和结果下载
+"""
+
+import sys
+import os
+from pathlib import Path
+
+# 添加项目路径到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+def test_generation_job():
+    """测试生成任务执行"""
+    print("🛠️ 测试生成任务执行")
+    print("=" * 50)
+    
+    try:
+        from app.database import SessionLocal
+        from app.models import GenerationJobStatus
+        from app.schemas import GenerationJobCreate
+        from app.services import generation_jobs
+        from app.services.code_export import CodeExportService
+        from app.services.generation_jobs import GenerationJobService, run_generation_job
+        from decimal import Decimal
+        
+        # 测试中同步执行任务，不分发到后台
+        dispatched = []
+        original_dispatch = generation_jobs.dispatch_generation_job
+        generation_jobs.dispatch_generation_job = dispatched.append
+        
+        db = SessionLocal()
+        service = GenerationJobService(db)
+        try:
+            print("1. 测试创建任务:")
+            job = service.create_job(GenerationJobCreate(
+                product_id="test_generation_job",
+                product_name="生成任务测试产品",
+                price=Decimal("10.00"),
+                quantity=12000
+            ))
+            created_ok = job.status == GenerationJobStatus.PENDING and dispatched == [job.id]
+            print(f"   任务ID: {job.id}")
+            print(f"   立即返回: {'✅ 通过' if created_ok else '❌ 失败'}")
+        finally:
+            generation_jobs.dispatch_generation_job = original_dispatch
+        
+        print("\n2. 测试执行任务:")
+        run_generation_job(job.id)
+        db.expire_all()
+        progress = service.get_progress(service.get_job(job.id))
+        print(f"   状态: {progress['status'].value}")
+        print(f"   写入数量: {progress['rows_written']}")
+        print(f"   速度: {progress['throughput']}个/秒")
+        progress_ok = (
+            progress["status"] == GenerationJobStatus.COMPLETED
+            and progress["rows_written"] == 12000
+            and progress["progress"] == 1.0
+            and progress["download_url"]
+        )
+        print(f"   进度统计: {'✅ 通过' if progress_ok else '❌ 失败'}")
+        
+        print("\n3. 测试结果下载:")
+        lines = ''.join(CodeExportService(db).iter_export("csv", batch_id=job.id, chunk_size=5000)).splitlines()
+        codes = [line.split(',')[0] for line in lines[1:]]
+        download_ok = lines[0] == "code,product_id,expires_at" and len(set(codes)) == 12000
+        print(f"   下载行数: {len(codes)}")
+        print(f"   下载内容: {'✅ 通过' if download_ok else '❌ 失败'}")
+        
+        db.close()
+        return created_ok and progress_ok and download_ok
+        
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_stale_job_recovery():
+    """测试中断的运行中任务在启动时标记为失败，重复分发不会重复执行"""
+    print("\n🧯 测试中断任务恢复")
+    print("=" * 50)
+    
+    try:
+        import uuid
+        from datetime import datetime, timedelta
+        from sqlalchemy import update
+        from app.config import settings
+        from app.database import SessionLocal
+        from app.models import GenerationJob, GenerationJobStatus
+        from app.services import generation_jobs
+        from app.services.generation_jobs import GenerationJobService, recover_generation_jobs, run_generation_job
+        
+        db = SessionLocal()
+        try:
+            stale_at = datetime.utcnow() - timedelta(seconds=settings.GENERATION_JOB_STALE_SECONDS + 60)
+            jobs = {}
+            for name in ("stale", "fresh"):
+                job = GenerationJob(
+                    id=str(uuid.uuid4()),
+                    status=GenerationJobStatus.RUNNING,
+                    product_id="test_stale_job",
+                    quantity=100,
+                    rows_written=10,
+                    request_json="{}",
+                    started_at=stale_at
+                )
+                db.add(job)
+                jobs[name] = job
+            db.commit()
+            # 模拟进程退出前最后一次更新进度的时间
+            db.execute(update(GenerationJob).where(GenerationJob.id == jobs["stale"].id).values(updated_at=stale_at))
+            db.commit()
+            
+            dispatched = []
+            original_dispatch = generation_jobs.dispatch_generation_job
+            generation_jobs.dispatch_generation_job = dispatched.append
+            try:
+                failed = recover_generation_jobs()
+            finally:
+                generation_jobs.dispatch_generation_job = original_dispatch
+            
+            db.expire_all()
+            service = GenerationJobService(db)
+            stale = service.get_job(jobs["stale"].id)
+            fresh = service.get_job(jobs["fresh"].id)
+            recover_ok = failed >= 1 and stale.status == GenerationJobStatus.FAILED and stale.error and stale.finished_at
+            fresh_ok = fresh.status == GenerationJobStatus.RUNNING and fresh.id not in dispatched
+            print(f"   中断任务标记为失败: {stale.status.value} {'✅ 通过' if recover_ok else '❌ 失败'}")
+            print(f"   仍在更新的任务不受影响: {fresh.status.value} {'✅ 通过' if fresh_ok else '❌ 失败'}")
+            
+            # 非待执行任务不会被再次领取执行
+            run_generation_job(jobs["fresh"].id)
+            db.expire_all()
+            claim_ok = service.get_job(jobs["fresh"].id).rows_written == 10
+            print(f"   重复分发不重复执行: {'✅ 通过' if claim_ok else '❌ 失败'}")
+            
+            return bool(recover_ok) and fresh_ok and claim_ok
+        finally:
+            db.close()
+        
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def main():
+    """主测试函数"""
+    from app.database import init_db
+
+    init_db()
+
+    print("🧪 异步生成任务测试")
+    print("=" * 60)
+    
+    tests = [
+        test_generation_job,
+        test_stale_job_recovery
+    ]
+    
+    passed = 0
+    total = len(tests)
+    
+    for test in tests:
+        if test():
+            passed += 1
+        print()
+    
+    print("=" * 60)
+    print(f"📊 测试结果: {passed}/{total} 通过")
+    
+    if passed == total:
+        print("🎉 所有测试通过！异步生成任务功能正常工作")
+        return True
+    else:
+        print("❌ 部分测试失败，请检查错误信息")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
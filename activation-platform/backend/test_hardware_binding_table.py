@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+硬件绑定表测试脚本
+测试绑定/验证/解绑使用 hardware_bindings 索引查询，以及旧 metadata_json 绑定的回填迁移
+"""
+
+import sys
+import json
+import uuid
+import hashlib
+from datetime import datetime
+from pathlib import Path
+
+# 添加项目路径到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+def _create_codes(db, quantity: int):
+    """创建一批测试激活码"""
+    from app.services.activation_service import ActivationCodeService
+    from app.schemas import ActivationCodeCreate
+
+    request = ActivationCodeCreate(
+        product_id=f"binding_{uuid.uuid4().hex[:8]}",
+        product_name="硬件绑定表测试产品",
+        price=9.9,
+        quantity=quantity
+    )
+    return [item.code for item in ActivationCodeService(db).create_activation_codes(request)]
+
+def _fingerprint() -> str:
+    """生成一个随机硬件指纹"""
+    return hashlib.sha256(uuid.uuid4().bytes).hexdigest()
+
+def test_bind_verify_unbind():
+    """测试绑定、验证、解绑与唯一约束"""
+    print("🔗 测试绑定表读写")
+    print("=" * 50)
+
+    try:
+        from app.config import settings
+        from app.database import SessionLocal
+        from app.models import HardwareBinding
+        from app.services.activation_service import ActivationCodeService
+
+        db = SessionLocal()
+        try:
+            service = ActivationCodeService(db)
+            first, second = _create_codes(db, 2)
+            fingerprint = _fingerprint()
+
+            bound = service.bind_to_hardware(first, fingerprint, "binding_user")
+            duplicate = service.bind_to_hardware(second, fingerprint, "binding_user")
+            verified = service.verify_hardware_binding(first, fingerprint)
+            mismatch = service.verify_hardware_binding(first, _fingerprint())
+            rows = db.query(HardwareBinding).filter(HardwareBinding.hardware_fingerprint == fingerprint).count()
+
+            bind_ok = bound["success"] and not duplicate["success"] and rows == 1
+            verify_ok = verified["valid"] and verified["binding_info"]["hardware_fingerprint"] == fingerprint and not mismatch["valid"]
+            print(f"   绑定，同一设备再次绑定被拒绝: {duplicate['message']} {'✅' if bind_ok else '❌'}")
+            print(f"   验证: {'✅' if verify_ok else '❌'}")
+
+            service.unbind_hardware(first, settings.ADMIN_UNBIND_KEY)
+            rebound = service.bind_to_hardware(second, fingerprint, "binding_user")
+            unbind_ok = rebound["success"] and not service.verify_hardware_binding(first, fingerprint)["valid"]
+            print(f"   解绑后设备可绑定其他激活码: {'✅' if unbind_ok else '❌'}")
+
+            return bind_ok and verify_ok and unbind_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_index_lookup():
+    """测试按硬件指纹查询使用唯一索引"""
+    print("\n🗂️ 测试硬件指纹索引")
+    print("=" * 50)
+
+    try:
+        from sqlalchemy import select, text
+        from app.database import SessionLocal, engine
+        from app.models import HardwareBinding
+
+        if engine.dialect.name != "sqlite":
+            print("   非 SQLite 数据库，跳过执行计划检查")
+            return True
+
+        db = SessionLocal()
+        try:
+            query = select(HardwareBinding.id).where(HardwareBinding.hardware_fingerprint == _fingerprint())
+            compiled = query.compile(engine, compile_kwargs={"literal_binds": True})
+            plan = " ".join(str(row[-1]) for row in db.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+        finally:
+            db.close()
+
+        plan_ok = "ix_hardware_bindings_hardware_fingerprint" in plan
+        print(f"   执行计划: {plan} {'✅' if plan_ok else '❌'}")
+
+        return plan_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_backfill():
+    """测试旧 metadata_json 绑定回填到绑定表"""
+    print("\n🚚 测试绑定回填")
+    print("=" * 50)
+
+    try:
+        from app.database import SessionLocal
+        from app.migrations import backfill_hardware_bindings
+        from app.models import ActivationCode, ActivationCodeStatus, DataMigration, HardwareBinding
+        from app.services.activation_service import ActivationCodeService
+
+        db = SessionLocal()
+        try:
+            codes = _create_codes(db, 4)
+            shared, single = _fingerprint(), _fingerprint()
+            legacy = {
+                codes[0]: {"hardware_fingerprint": shared, "user_id": "legacy_a", "binding_time": "2024-01-02T03:04:05"},
+                codes[1]: {"hardware_fingerprint": shared, "user_id": "legacy_b"},
+                codes[2]: {"hardware_fingerprint": single, "user_id": "legacy_c"},
+                codes[3]: {"note": "不是硬件绑定"},
+            }
+            for code, metadata in legacy.items():
+                record = db.query(ActivationCode).filter(ActivationCode.code == code).first()
+                record.metadata_json = json.dumps(metadata)
+                if "hardware_fingerprint" in metadata:
+                    record.status = ActivationCodeStatus.USED
+            db.query(DataMigration).filter(DataMigration.name == "backfill_hardware_bindings").delete()
+            db.commit()
+
+            backfilled = backfill_hardware_bindings(batch_size=2)
+            again = backfill_hardware_bindings(batch_size=2)
+
+            bindings = {
+                binding.hardware_fingerprint: binding
+                for binding in db.query(HardwareBinding).filter(HardwareBinding.hardware_fingerprint.in_([shared, single]))
+            }
+            first_id = db.query(ActivationCode.id).filter(ActivationCode.code == codes[0]).scalar()
+            count_ok = backfilled >= 2 and again == 0 and len(bindings) == 2
+            dedupe_ok = bindings[shared].activation_code_id == first_id\
+                and bindings[shared].created_at == datetime(2024, 1, 2, 3, 4, 5)
+            verify_ok = ActivationCodeService(db).verify_hardware_binding(codes[2], single)["valid"]
+            print(f"   回填数量: {backfilled}，再次执行: {again} {'✅' if count_ok else '❌'}")
+            print(f"   重复指纹保留ID最小的激活码: {'✅' if dedupe_ok else '❌'}")
+            print(f"   回填后验证通过: {'✅' if verify_ok else '❌'}")
+
+            return count_ok and dedupe_ok and verify_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def main():
+    """主测试函数"""
+    from app.database import init_db
+
+    init_db()
+
+    print("🧪 硬件绑定表测试")
+    print("=" * 60)
+
+    tests = [
+        test_bind_verify_unbind,
+        test_index_lookup,
+        test_backfill
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test in tests:
+        if test():
+            passed += 1
+        print()
+
+    print("=" * 60)
+    print(f"📊 测试结果: {passed}/{total} 通过")
+
+    if passed == total:
+        print("🎉 所有测试通过！硬件绑定表功能正常工作")
+        return True
+    else:
+        print("❌ 部分测试失败，请检查错误信息")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
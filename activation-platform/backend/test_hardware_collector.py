@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+硬件信息采集测试脚本
+测试并发采集、单项超时不阻塞且不改变指纹、稳定项 TTL 缓存以及指纹接口在线程池中采集
+"""
+
+import sys
+import time
+import threading
+from pathlib import Path
+
+# 添加项目路径到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+class _CountingProbe:
+    """记录调用次数的采集项"""
+
+    def __init__(self, value, delay: float = 0, gate: threading.Event = None):
+        self.value = value
+        self.delay = delay
+        self.gate = gate
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait()
+        time.sleep(self.delay)
+        return self.value
+
+def test_concurrent_collection():
+    """测试各采集项并发执行"""
+    print("⚡ 测试并发采集")
+    print("=" * 50)
+
+    try:
+        from app.services.hardware_collector import HardwareCollector, HardwareProbe
+
+        probes = {f"slow_{i}": HardwareProbe(_CountingProbe(i, delay=0.3), True) for i in range(5)}
+        collector = HardwareCollector(probes, timeout=2.0, ttl=60)
+
+        started = time.monotonic()
+        values = collector.collect()
+        elapsed = time.monotonic() - started
+
+        values_ok = values == {f"slow_{i}": i for i in range(5)}
+        concurrent_ok = elapsed < 1.0
+        print(f"   采集结果: {'✅' if values_ok else '❌'}")
+        print(f"   5 个 0.3 秒采集项耗时: {elapsed:.2f} 秒 {'✅' if concurrent_ok else '❌'}")
+
+        return values_ok and concurrent_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_probe_timeout():
+    """测试卡住的采集项超时后不使用占位值，完成前不重复提交，之后超时使用上一次采集成功的值"""
+    print("\n⏱️ 测试采集超时")
+    print("=" * 50)
+
+    try:
+        from app.services.hardware_collector import HardwareCollector, HardwareProbe
+
+        gate = threading.Event()
+        hung = _CountingProbe("serial-123", gate=gate)
+        probes = {
+            "disk_info": HardwareProbe(hung, True),
+            "memory_total": HardwareProbe(_CountingProbe(1024), True),
+        }
+        collector = HardwareCollector(probes, timeout=0.2, ttl=60)
+
+        try:
+            started = time.monotonic()
+            first = collector.collect()
+            second = collector.collect()
+            elapsed = time.monotonic() - started
+        finally:
+            gate.set()
+        time.sleep(0.1)
+        third = collector.collect()
+        hung_calls = hung.calls
+
+        gate.clear()
+        collector.invalidate()
+        try:
+            fourth = collector.collect()
+        finally:
+            gate.set()
+
+        timeout_ok = first == second == {"memory_total": 1024} and elapsed < 1.0
+        single_ok = hung_calls == 1
+        late_ok = third["disk_info"] == "serial-123"
+        last_ok = fourth == {"disk_info": "serial-123", "memory_total": 1024}
+        print(f"   两次采集耗时: {elapsed:.2f} 秒，超时项不出现在结果中: {'✅' if timeout_ok else '❌'}")
+        print(f"   卡住期间只提交一次: {hung_calls} {'✅' if single_ok else '❌'}")
+        print(f"   完成后使用采集结果: {third['disk_info']} {'✅' if late_ok else '❌'}")
+        print(f"   再次超时使用上一次的结果: {fourth.get('disk_info')} {'✅' if last_ok else '❌'}")
+
+        return timeout_ok and single_ok and late_ok and last_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_ttl_cache():
+    """测试稳定项按 TTL 缓存，易变项每次采集"""
+    print("\n🗃️ 测试稳定项缓存")
+    print("=" * 50)
+
+    try:
+        from app.services.hardware_collector import HardwareCollector, HardwareProbe
+
+        stable = _CountingProbe("board")
+        volatile = _CountingProbe(3.2)
+        collector = HardwareCollector({
+            "motherboard": HardwareProbe(stable, True),
+            "cpu_freq": HardwareProbe(volatile, False),
+        }, timeout=1.0, ttl=0.3)
+
+        for _ in range(3):
+            collector.collect()
+        cached_calls = (stable.calls, volatile.calls)
+        time.sleep(0.4)
+        collector.collect()
+        expired_calls = stable.calls
+        collector.invalidate()
+        collector.collect()
+
+        cache_ok = cached_calls == (1, 3)
+        expiry_ok = expired_calls == 2 and stable.calls == 3
+        print(f"   稳定项/易变项调用次数: {cached_calls} {'✅' if cache_ok else '❌'}")
+        print(f"   过期和清空后重新采集: {'✅' if expiry_ok else '❌'}")
+
+        return cache_ok and expiry_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_fingerprint_endpoint():
+    """测试指纹接口与服务端生成的指纹一致"""
+    print("\n🔍 测试指纹接口")
+    print("=" * 50)
+
+    try:
+        from fastapi.testclient import TestClient
+        from app.main import app
+        from app.services.activation_service import HardwareFingerprint
+
+        client = TestClient(app)
+        response = client.post("/api/v1/activation/hardware/generate-fingerprint")
+        data = response.json()
+
+        fingerprint_ok = response.status_code == 200\
+            and data["fingerprint"] == HardwareFingerprint.generate_hardware_fingerprint()
+        components_ok = data["components"] == HardwareFingerprint.generate_hardware_components()\
+            and HardwareFingerprint.validate_components(data["components"])
+        print(f"   指纹一致: {'✅' if fingerprint_ok else '❌'}")
+        print(f"   组件一致: {sorted(data.get('components') or {})} {'✅' if components_ok else '❌'}")
+
+        return fingerprint_ok and components_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def main():
+    """主测试函数"""
+    print("🧪 硬件信息采集测试")
+    print("=" * 60)
+
+    tests = [
+        test_concurrent_collection,
+        test_probe_timeout,
+        test_ttl_cache,
+        test_fingerprint_endpoint
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test in tests:
+        if test():
+            passed += 1
+        print()
+
+    print("=" * 60)
+    print(f"📊 测试结果: {passed}/{total} 通过")
+
+    if passed == total:
+        print("🎉 所有测试通过！硬件信息采集功能正常工作")
+        return True
+    else:
+        print("❌ 部分测试失败，请检查错误信息")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+硬件心跳测试脚本
+测试批量验证硬件绑定的逐项结果、集合式查询次数以及心跳接口
+"""
+
+import sys
+import uuid
+import hashlib
+from pathlib import Path
+
+# 添加项目路径到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+def _create_codes(db, quantity: int):
+    """创建一批测试激活码"""
+    from app.services.activation_service import ActivationCodeService
+    from app.schemas import ActivationCodeCreate
+
+    request = ActivationCodeCreate(
+        product_id=f"heartbeat_{uuid.uuid4().hex[:8]}",
+        product_name="硬件心跳测试产品",
+        price=9.9,
+        quantity=quantity
+    )
+    return [item.code for item in ActivationCodeService(db).create_activation_codes(request)]
+
+def _fingerprint() -> str:
+    """生成一个随机硬件指纹"""
+    return hashlib.sha256(uuid.uuid4().bytes).hexdigest()
+
+def _components():
+    """生成一台随机设备的组件哈希"""
+    from app.services.activation_service import HardwareFingerprint
+
+    return HardwareFingerprint.hash_components({
+        name: uuid.uuid4().hex for name in ("cpu", "memory", "disk", "mac", "board")
+    })
+
+def test_verdicts():
+    """测试各种情况的心跳结果，与单个验证一致"""
+    print("💓 测试心跳结果")
+    print("=" * 50)
+
+    try:
+        from app.config import settings
+        from app.database import SessionLocal
+        from app.services.activation_service import ActivationCodeService
+
+        db = SessionLocal()
+        original_enforce = settings.ACTIVATION_CODE_TAG_ENFORCE
+        settings.ACTIVATION_CODE_TAG_ENFORCE = True  # 篡改的激活码在查询数据库前按校验位拒绝
+        try:
+            service = ActivationCodeService(db)
+            bound, fuzzy, unbound_code, unused = _create_codes(db, 4)
+            fingerprint, fuzzy_fingerprint = _fingerprint(), _fingerprint()
+            components = _components()
+            service.bind_to_hardware(bound, fingerprint, "heartbeat_user")
+            service.bind_to_hardware(fuzzy, fuzzy_fingerprint, "heartbeat_user", components)
+            service.use_activation_code(unbound_code, "heartbeat_user")
+
+            upgraded = dict(components, memory=_fingerprint())
+            replaced = dict(upgraded, disk=_fingerprint())
+            items = [
+                {"activation_code": bound, "hardware_fingerprint": fingerprint},
+                {"activation_code": fuzzy, "hardware_fingerprint": _fingerprint(), "hardware_components": upgraded},
+                {"activation_code": fuzzy, "hardware_fingerprint": _fingerprint(), "hardware_components": replaced},
+                {"activation_code": bound, "hardware_fingerprint": _fingerprint()},
+                {"activation_code": unbound_code, "hardware_fingerprint": fingerprint},
+                {"activation_code": unused, "hardware_fingerprint": fingerprint},
+                {"activation_code": unused[:-1] + ("A" if unused[-1] != "A" else "B"), "hardware_fingerprint": fingerprint},
+                {"activation_code": bound, "hardware_fingerprint": "not-a-fingerprint"},
+            ]
+            results = service.verify_hardware_bindings(items)
+
+            verdicts = [result["verdict"] for result in results]
+            expected = ["ok", "tolerated", "mismatch", "mismatch", "unbound", "inactive", "invalid", "invalid"]
+            verdict_ok = verdicts == expected and [result["code"] for result in results] == [item["activation_code"] for item in items]
+            single = [
+                service.verify_hardware_binding(item["activation_code"], item["hardware_fingerprint"], item.get("hardware_components"))["valid"]
+                for item in items
+            ]
+            consistent_ok = [result["valid"] for result in results] == single
+            score_ok = results[1]["match_score"] == 0.8 and results[2]["match_score"] == 0.6 and "match_score" not in results[0]
+            print(f"   结果: {verdicts} {'✅' if verdict_ok else '❌'}")
+            print(f"   与单个验证一致: {'✅' if consistent_ok else '❌'}")
+            print(f"   匹配度: {'✅' if score_ok else '❌'}")
+
+            return verdict_ok and consistent_ok and score_ok
+        finally:
+            settings.ACTIVATION_CODE_TAG_ENFORCE = original_enforce
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_set_based_lookup():
+    """测试整批设备只执行一次查询"""
+    print("\n🗂️ 测试集合式查询")
+    print("=" * 50)
+
+    try:
+        from sqlalchemy import event
+        from app.database import SessionLocal, engine
+        from app.services.activation_service import ActivationCodeService
+
+        db = SessionLocal()
+        try:
+            service = ActivationCodeService(db)
+            codes = _create_codes(db, 200)
+            fleet = []
+            for code in codes:
+                fingerprint = _fingerprint()
+                service.bind_to_hardware(code, fingerprint, "fleet_user")
+                fleet.append({"activation_code": code, "hardware_fingerprint": fingerprint})
+            items = fleet + fleet[:50]
+
+            selects = []
+
+            def count_selects(conn, cursor, statement, parameters, context, executemany):
+                if statement.lstrip().upper().startswith("SELECT"):
+                    selects.append(statement)
+
+            event.listen(engine, "before_cursor_execute", count_selects)
+            try:
+                results = service.verify_hardware_bindings(items)
+            finally:
+                event.remove(engine, "before_cursor_execute", count_selects)
+
+            valid_ok = len(results) == 250 and all(result["verdict"] == "ok" for result in results)
+            query_ok = len(selects) == 1
+            print(f"   250 台设备全部通过: {'✅' if valid_ok else '❌'}")
+            print(f"   查询次数: {len(selects)} {'✅' if query_ok else '❌'}")
+
+            return valid_ok and query_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_heartbeat_endpoint():
+    """测试心跳接口的紧凑响应和条目数量上限"""
+    print("\n🌐 测试心跳接口")
+    print("=" * 50)
+
+    try:
+        from fastapi.testclient import TestClient
+        from app.config import settings
+        from app.database import SessionLocal
+        from app.main import app
+        from app.services.activation_service import ActivationCodeService
+
+        db = SessionLocal()
+        try:
+            codes = _create_codes(db, 10)
+            fingerprints = [_fingerprint() for _ in codes]
+            service = ActivationCodeService(db)
+            for code, fingerprint in zip(codes, fingerprints):
+                service.bind_to_hardware(code, fingerprint, "endpoint_user")
+        finally:
+            db.close()
+
+        client = TestClient(app)
+        items = [{"activation_code": code, "hardware_fingerprint": fingerprint} for code, fingerprint in zip(codes, fingerprints)]
+        items[3]["hardware_fingerprint"] = _fingerprint()
+        response = client.post("/api/v1/activation/hardware/heartbeat", json={"items": items})
+        results = response.json().get("results", [])
+        too_many = client.post("/api/v1/activation/hardware/heartbeat", json={
+            "items": [items[0]] * (settings.HEARTBEAT_BATCH_MAX_ITEMS + 1)
+        })
+
+        response_ok = response.status_code == 200 and [result["valid"] for result in results] == [i != 3 for i in range(10)]
+        compact_ok = results and set(results[0]) == {"code", "valid", "verdict"} and results[3]["verdict"] == "mismatch"
+        limit_ok = too_many.status_code == 422
+        print(f"   批量结果: {'✅' if response_ok else '❌'}")
+        print(f"   紧凑响应: {results[0] if results else None} {'✅' if compact_ok else '❌'}")
+        print(f"   超出条目上限: {too_many.status_code} {'✅' if limit_ok else '❌'}")
+
+        return response_ok and bool(compact_ok) and limit_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def main():
+    """主测试函数"""
+    from app.database import init_db
+
+    init_db()
+
+    print("🧪 硬件心跳测试")
+    print("=" * 60)
+
+    tests = [
+        test_verdicts,
+        test_set_based_lookup,
+        test_heartbeat_endpoint
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test in tests:
+        if test():
+            passed += 1
+        print()
+
+    print("=" * 60)
+    print(f"📊 测试结果: {passed}/{total} 通过")
+
+    if passed == total:
+        print("🎉 所有测试通过！硬件心跳功能正常工作")
+        return True
+    else:
+        print("❌ 部分测试失败，请检查错误信息")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+硬件容差匹配测试脚本
+测试部分硬件变更后按组件匹配度通过验证、同一设备重复绑定被拒绝、签名索引查询以及旧绑定升级
+"""
+
+import sys
+import uuid
+import hashlib
+from pathlib import Path
+
+# 添加项目路径到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+def _create_codes(db, quantity: int):
+    """创建一批测试激活码"""
+    from app.services.activation_service import ActivationCodeService
+    from app.schemas import ActivationCodeCreate
+
+    request = ActivationCodeCreate(
+        product_id=f"tolerance_{uuid.uuid4().hex[:8]}",
+        product_name="硬件容差测试产品",
+        price=9.9,
+        quantity=quantity
+    )
+    return [item.code for item in ActivationCodeService(db).create_activation_codes(request)]
+
+def _device():
+    """生成一台随机设备的组件哈希和完整指纹"""
+    from app.services.activation_service import HardwareFingerprint
+
+    components = HardwareFingerprint.hash_components({
+        name: uuid.uuid4().hex for name in ("cpu", "memory", "disk", "mac", "board")
+    })
+    return components, _fingerprint(components)
+
+def _fingerprint(components) -> str:
+    """由组件哈希生成完整指纹"""
+    return hashlib.sha256("|".join(value for _, value in sorted(components.items())).encode()).hexdigest()
+
+def _change(components, *names):
+    """更换指定组件后的组件哈希"""
+    changed = dict(components)
+    for name in names:
+        changed[name] = hashlib.sha256(uuid.uuid4().bytes).hexdigest()
+    return changed
+
+def test_partial_change():
+    """测试更换一个组件通过验证，更换两个组件被拒绝"""
+    print("🧩 测试部分硬件变更")
+    print("=" * 50)
+
+    try:
+        from app.database import SessionLocal
+        from app.services.activation_service import ActivationCodeService
+
+        db = SessionLocal()
+        try:
+            service = ActivationCodeService(db)
+            code = _create_codes(db, 1)[0]
+            components, fingerprint = _device()
+            bound = service.bind_to_hardware(code, fingerprint, "tolerance_user", components)
+
+            upgraded = _change(components, "memory")
+            ram = service.verify_hardware_binding(code, _fingerprint(upgraded), upgraded)
+            replaced = _change(components, "memory", "disk")
+            rejected = service.verify_hardware_binding(code, _fingerprint(replaced), replaced)
+            exact = service.verify_hardware_binding(code, fingerprint, components)
+            no_components = service.verify_hardware_binding(code, _fingerprint(upgraded))
+
+            ram_ok = bound["success"] and ram["valid"] and ram["match_score"] == 0.8
+            reject_ok = not rejected["valid"] and rejected["match_score"] == 0.6
+            exact_ok = exact["valid"] and exact["match_score"] == 1.0 and not no_components["valid"]
+            print(f"   更换内存: {ram['message']} {'✅' if ram_ok else '❌'}")
+            print(f"   更换内存和硬盘: {rejected['message']} {'✅' if reject_ok else '❌'}")
+            print(f"   完整指纹匹配，未提供组件时仍按完整指纹验证: {'✅' if exact_ok else '❌'}")
+
+            return ram_ok and reject_ok and exact_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_bind_same_device():
+    """测试更换一个组件后的同一设备不能再绑定其他激活码"""
+    print("\n🔒 测试同一设备重复绑定")
+    print("=" * 50)
+
+    try:
+        from app.config import settings
+        from app.database import SessionLocal
+        from app.services.activation_service import ActivationCodeService
+
+        db = SessionLocal()
+        try:
+            service = ActivationCodeService(db)
+            first, second, third = _create_codes(db, 3)
+            components, fingerprint = _device()
+            service.bind_to_hardware(first, fingerprint, "tolerance_user", components)
+
+            upgraded = _change(components, "mac")
+            duplicate = service.bind_to_hardware(second, _fingerprint(upgraded), "tolerance_user", upgraded)
+            other_components, other_fingerprint = _device()
+            other = service.bind_to_hardware(third, other_fingerprint, "tolerance_user", other_components)
+
+            service.unbind_hardware(first, settings.ADMIN_UNBIND_KEY)
+            rebound = service.bind_to_hardware(second, _fingerprint(upgraded), "tolerance_user", upgraded)
+
+            duplicate_ok = not duplicate["success"]
+            other_ok = other["success"]
+            rebound_ok = rebound["success"]
+            print(f"   更换网卡后再次绑定被拒绝: {duplicate['message']} {'✅' if duplicate_ok else '❌'}")
+            print(f"   其他设备正常绑定: {'✅' if other_ok else '❌'}")
+            print(f"   解绑后可以绑定: {'✅' if rebound_ok else '❌'}")
+
+            return duplicate_ok and other_ok and rebound_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_signature_index():
+    """测试签名查询使用索引"""
+    print("\n🗂️ 测试相似度签名索引")
+    print("=" * 50)
+
+    try:
+        from sqlalchemy import select, text
+        from app.config import settings
+        from app.database import SessionLocal, engine
+        from app.models import HardwareBindingSignature
+        from app.services.activation_service import HardwareFingerprint
+
+        if engine.dialect.name != "sqlite":
+            print("   非 SQLite 数据库，跳过执行计划检查")
+            return True
+
+        components, _ = _device()
+        signatures = HardwareFingerprint.lookup_signatures(components, settings.HARDWARE_TOLERANCE)
+        db = SessionLocal()
+        try:
+            query = select(HardwareBindingSignature.binding_id).where(HardwareBindingSignature.signature.in_(signatures))
+            compiled = query.compile(engine, compile_kwargs={"literal_binds": True})
+            plan = " ".join(str(row[-1]) for row in db.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+        finally:
+            db.close()
+
+        plan_ok = "ix_hardware_binding_signatures_signature" in plan
+        print(f"   查询签名数: {len(signatures)}")
+        print(f"   执行计划: {plan} {'✅' if plan_ok else '❌'}")
+
+        return plan_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_legacy_upgrade():
+    """测试旧绑定在完整指纹匹配时补充组件哈希，并重建签名"""
+    print("\n⬆️ 测试旧绑定升级")
+    print("=" * 50)
+
+    try:
+        from app.database import SessionLocal
+        from app.migrations import rebuild_hardware_signatures
+        from app.models import DataMigration, HardwareBinding, HardwareBindingSignature
+        from app.services.activation_service import ActivationCodeService
+
+        db = SessionLocal()
+        try:
+            service = ActivationCodeService(db)
+            code = _create_codes(db, 1)[0]
+            components, fingerprint = _device()
+            service.bind_to_hardware(code, fingerprint, "legacy_user")
+
+            upgraded = _change(components, "memory")
+            before = service.verify_hardware_binding(code, _fingerprint(upgraded), upgraded)
+            exact = service.verify_hardware_binding(code, fingerprint, components)
+            after = service.verify_hardware_binding(code, _fingerprint(upgraded), upgraded)
+
+            binding = db.query(HardwareBinding).filter(HardwareBinding.hardware_fingerprint == fingerprint).first()
+            count = db.query(HardwareBindingSignature).filter(HardwareBindingSignature.binding_id == binding.id).count()
+
+            db.query(DataMigration).filter(DataMigration.name.like("hardware_signatures:%")).delete(synchronize_session=False)
+            db.commit()
+            rebuilt = rebuild_hardware_signatures(batch_size=2)
+            again = rebuild_hardware_signatures(batch_size=2)
+            rebuilt_count = db.query(HardwareBindingSignature).filter(HardwareBindingSignature.binding_id == binding.id).count()
+
+            upgrade_ok = not before["valid"] and exact["valid"] and after["valid"] and binding.component_hashes
+            rebuild_ok = rebuilt >= 1 and again == 0 and rebuilt_count == count > 0
+            print(f"   升级前部分变更被拒绝，完整指纹匹配后补充组件: {'✅' if upgrade_ok else '❌'}")
+            print(f"   重建签名: {rebuilt}，再次执行: {again}，签名数: {rebuilt_count} {'✅' if rebuild_ok else '❌'}")
+
+            return bool(upgrade_ok) and rebuild_ok
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def main():
+    """主测试函数"""
+    from app.database import init_db
+
+    init_db()
+
+    print("🧪 硬件容差匹配测试")
+    print("=" * 60)
+
+    tests = [
+        test_partial_change,
+        test_bind_same_device,
+        test_signature_index,
+        test_legacy_upgrade
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test in tests:
+        if test():
+            passed += 1
+        print()
+
+    print("=" * 60)
+    print(f"📊 测试结果: {passed}/{total} 通过")
+
+    if passed == total:
+        print("🎉 所有测试通过！硬件容差匹配功能正常工作")
+        return True
+    else:
+        print("❌ 部分测试失败，请检查错误信息")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
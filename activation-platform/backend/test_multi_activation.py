@@ -149,6 +149,59 @@ def test_single_activation():
         print(f"❌ 测试失败: {e}")
         return False
 
+def test_concurrent_activation():
+    """测试并发激活不会丢失计数或超出最大激活次数"""
+    print("\n🏁 测试并发激活")
+    print("=" * 50)
+    
+    try:
+        from concurrent.futures import ThreadPoolExecutor
+        from app.services.activation_service import ActivationCodeService
+        from app.database import SessionLocal
+        from app.schemas import ActivationCodeCreate
+        from app.models import ActivationCodeStatus
+        from decimal import Decimal
+        
+        db = SessionLocal()
+        service = ActivationCodeService(db)
+        request = ActivationCodeCreate(
+            product_id="concurrent_activation_test",
+            product_name="并发激活测试产品",
+            price=Decimal("99.00"),
+            quantity=1,
+            max_activations=20
+        )
+        test_code = service.create_activation_codes(request)[0].code
+        
+        def activate(index):
+            session = SessionLocal()
+            try:
+                return ActivationCodeService(session).use_activation_code(test_code, f"user{index}")["success"]
+            finally:
+                session.close()
+        
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(activate, range(30)))
+        
+        activation_code = service.get_activation_code(test_code)
+        records = service.get_activation_records(test_code, limit=1000)["records"]
+        print(f"   成功激活: {sum(results)}/30 (期望: 20)")
+        print(f"   当前激活次数: {activation_code.current_activations}")
+        print(f"   激活记录数: {len(records)}")
+        print(f"   状态: {activation_code.status.value}")
+        
+        db.close()
+        return (
+            sum(results) == 20
+            and activation_code.current_activations == 20
+            and len(records) == 20
+            and activation_code.status == ActivationCodeStatus.USED
+        )
+        
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
 def test_api_endpoints():
     """测试API端点"""
     print("\n🌐 测试API端点")
@@ -227,6 +280,7 @@ def main():
     tests = [
         test_multi_activation,
         test_single_activation,
+        test_concurrent_activation,
         test_api_endpoints
     ]
     
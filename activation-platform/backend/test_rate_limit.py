@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+限流测试脚本
+测试滑动窗口计数、按激活码失败次数锁定、按客户端IP限流、请求体读取上限、共享计数出错时的回退，以及超限请求不打开数据库会话
+"""
+
+import sys
+import uuid
+from pathlib import Path
+
+# 添加项目路径到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+def _create_code() -> str:
+    """创建一个测试激活码"""
+    from app.database import SessionLocal
+    from app.services.activation_service import ActivationCodeService
+    from app.schemas import ActivationCodeCreate
+
+    db = SessionLocal()
+    try:
+        request = ActivationCodeCreate(
+            product_id=f"rate_limit_{uuid.uuid4().hex[:8]}",
+            product_name="限流测试产品",
+            price=9.9,
+            quantity=1,
+            max_activations=10
+        )
+        return ActivationCodeService(db).create_activation_codes(request)[0].code
+    finally:
+        db.close()
+
+class _LimitedApp:
+    """使用指定限额的限流器和计数的 get_db / get_async_db 运行应用"""
+
+    def __init__(self, per_client: int, per_code: int, lockout_seconds: int = 120):
+        from fastapi.testclient import TestClient
+        from app.database import get_async_db, get_db
+        from app.main import app
+        from app.services import rate_limit
+
+        self.sessions = 0
+
+        def counting_get_db():
+            self.sessions += 1
+            yield from get_db()
+
+        async def counting_get_async_db():
+            self.sessions += 1
+            async for db in get_async_db():
+                yield db
+
+        self._rate_limit = rate_limit
+        self._app = app
+        self._get_db = get_db
+        self._get_async_db = get_async_db
+        rate_limit._rate_limiter = rate_limit.RateLimiter(
+            rate_limit.MemoryRateLimitStore(1000), per_client, per_code, lockout_seconds
+        )
+        app.dependency_overrides[get_db] = counting_get_db
+        app.dependency_overrides[get_async_db] = counting_get_async_db
+        self.client = TestClient(app)
+
+    def close(self):
+        self._app.dependency_overrides.pop(self._get_db, None)
+        self._app.dependency_overrides.pop(self._get_async_db, None)
+        self._rate_limit._rate_limiter = None
+
+def test_sliding_window():
+    """测试滑动窗口计数和 Retry-After"""
+    print("🪟 测试滑动窗口计数")
+    print("=" * 50)
+
+    try:
+        from app.services.rate_limit import MemoryRateLimitStore
+
+        store = MemoryRateLimitStore(max_keys=10)
+        results = [store.hit("k", 3, 60, 120.0 + i) for i in range(4)]
+        within_ok = results[:3] == [0.0, 0.0, 0.0] and results[3] > 0
+        print(f"   窗口内超过限额被拒绝: {results} {'✅' if within_ok else '❌'}")
+
+        # 下一窗口开始时上一窗口的 4 次仍按接近 100% 计入
+        early = store.hit("k", 3, 60, 180.0)
+        # 下一窗口过半后上一窗口权重降为一半：4 * 0.5 + 1 = 3
+        store_late = MemoryRateLimitStore(max_keys=10)
+        for i in range(4):
+            store_late.hit("k", 3, 60, 120.0 + i)
+        late = store_late.hit("k", 3, 60, 210.0)
+        slide_ok = early > 0 and late == 0.0
+        print(f"   上一窗口按剩余比例加权: {'✅' if slide_ok else '❌'}")
+
+        store.lock("locked", 60, 300.0)
+        for i in range(20):
+            store.hit(f"key{i}", 3, 60, 300.0)
+            store.lock(f"lock{i}", 60, 300.0)
+        bounded_ok = len(store._windows) == 10
+        lock_kept_ok = store.locked("locked", 310.0) == 50.0
+        store.lock("late", 60, 400.0)
+        lock_purged_ok = list(store._locks) == ["late"]
+        print(f"   计数键数量受限: {len(store._windows)} {'✅' if bounded_ok else '❌'}")
+        print(f"   计数键淘汰不解除锁定: {'✅' if lock_kept_ok else '❌'}")
+        print(f"   超出数量时清理已到期的锁定: {'✅' if lock_purged_ok else '❌'}")
+
+        return within_ok and slide_ok and bounded_ok and lock_kept_ok and lock_purged_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def test_code_lockout():
+    """测试激活码失败次数超限后锁定，且不打开数据库会话；成功的请求不计数"""
+    print("\n🔐 测试激活码锁定")
+    print("=" * 50)
+
+    limited = None
+    try:
+        code = _create_code()
+        missing_code = f"ACT{uuid.uuid4().hex[:16].upper()}"
+        limited = _LimitedApp(per_client=1000, per_code=3)
+        client = limited.client
+
+        statuses = [client.get(f"/api/v1/activation/verify/{missing_code}").status_code for _ in range(5)]
+        sessions_after_verify = limited.sessions
+        locked = client.post("/api/v1/activation/activate", json={"code": missing_code, "user_id": "u1"})
+        used = [client.post("/api/v1/activation/use", json={"code": code, "user_id": f"u{i}"}) for i in range(5)]
+
+        status_ok = statuses == [200, 200, 200, 429, 429]
+        session_ok = sessions_after_verify == 3
+        header_ok = locked.status_code == 429 and locked.headers.get("Retry-After") == "120"
+        success_ok = all(response.status_code == 200 and response.json()["success"] for response in used)
+        print(f"   失败尝试状态码: {statuses} {'✅' if status_ok else '❌'}")
+        print(f"   打开的数据库会话: {sessions_after_verify} (期望: 3) {'✅' if session_ok else '❌'}")
+        print(f"   其他接口同样锁定并返回 Retry-After: {'✅' if header_ok else '❌'}")
+        print(f"   多次激活的激活码连续成功使用 5 次不锁定: {'✅' if success_ok else '❌'}")
+
+        return status_ok and session_ok and header_ok and success_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+    finally:
+        if limited is not None:
+            limited.close()
+
+def test_client_limit():
+    """测试按客户端IP限流"""
+    print("\n🌐 测试客户端限流")
+    print("=" * 50)
+
+    limited = None
+    try:
+        code = _create_code()
+        limited = _LimitedApp(per_client=4, per_code=100)
+        client = limited.client
+
+        statuses = [
+            client.post("/api/v1/activation/verify/batch", json={"codes": [code]}).status_code
+            for _ in range(6)
+        ]
+        sessions = limited.sessions
+        unguarded = client.get("/api/v1/activation/products").status_code
+
+        limit_ok = statuses == [200, 200, 200, 200, 429, 429] and sessions == 4
+        unguarded_ok = unguarded == 200
+        print(f"   状态码: {statuses}，数据库会话: {sessions} {'✅' if limit_ok else '❌'}")
+        print(f"   其他接口不受影响: {'✅' if unguarded_ok else '❌'}")
+
+        return limit_ok and unguarded_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+    finally:
+        if limited is not None:
+            limited.close()
+
+def test_body_limit():
+    """测试请求体超出检查上限时不读取激活码，只按客户端IP限流"""
+    print("\n📦 测试请求体读取上限")
+    print("=" * 50)
+
+    limited = None
+    try:
+        import json
+        from app.middleware.rate_limit import MAX_INSPECTED_BODY
+
+        code = _create_code()
+        limited = _LimitedApp(per_client=1000, per_code=1)
+        client = limited.client
+
+        padded = json.dumps({"code": code, "user_id": "u1", "padding": "x" * (MAX_INSPECTED_BODY + 1)})
+        large = [client.post("/api/v1/activation/use", content=padded,
+                             headers={"Content-Type": "application/json"}).status_code for _ in range(3)]
+
+        def chunks():
+            # 未声明 Content-Length 的分块请求体
+            for start in range(0, len(padded), 1024):
+                yield padded[start:start + 1024].encode()
+
+        streamed = client.post("/api/v1/activation/use", content=chunks(),
+                               headers={"Content-Type": "application/json"})
+        missing_code = f"ACT{uuid.uuid4().hex[:16].upper()}"
+        small = [client.post("/api/v1/activation/use", json={"code": missing_code, "user_id": "u1"}).status_code for _ in range(2)]
+
+        large_ok = 429 not in large and streamed.status_code != 429 and streamed.json().get("success")
+        small_ok = small == [200, 429]
+        print(f"   超出上限的请求体: {large} / {streamed.status_code} {'✅' if large_ok else '❌'}")
+        print(f"   上限内的请求体按激活码限流: {small} {'✅' if small_ok else '❌'}")
+
+        return bool(large_ok) and small_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+    finally:
+        if limited is not None:
+            limited.close()
+
+def test_shared_store_fallback():
+    """测试共享计数不可用时退回进程内计数，锁定只针对失败的客户端"""
+    print("\n🔌 测试共享计数回退")
+    print("=" * 50)
+
+    try:
+        import asyncio
+        from app.services.rate_limit import MemoryRateLimitStore, RateLimiter, RedisRateLimitStore
+
+        limiter = RateLimiter(
+            MemoryRateLimitStore(100), per_client=2, per_code=2, lockout_seconds=30,
+            shared=RedisRateLimitStore("redis://127.0.0.1:1/0")
+        )
+
+        async def run():
+            clients = [await limiter.check_client("10.0.0.1") for _ in range(3)]
+            failures = [await limiter.record_code_failure("ACT_FALLBACK", "10.0.0.1") for _ in range(2)]
+            locked = await limiter.code_locked("ACT_FALLBACK", "10.0.0.1")
+            other = await limiter.code_locked("ACT_FALLBACK", "10.0.0.2")
+            return clients, failures, locked, other
+
+        clients, failures, locked, other = asyncio.run(run())
+        client_ok = clients[:2] == [0.0, 0.0] and clients[2] > 0
+        code_ok = failures == [0.0, 30] and 0 < locked <= 30
+        other_ok = other == 0.0
+        print(f"   客户端计数: {clients} {'✅' if client_ok else '❌'}")
+        print(f"   激活码锁定: {failures} {'✅' if code_ok else '❌'}")
+        print(f"   其他客户端不受锁定影响: {'✅' if other_ok else '❌'}")
+
+        return client_ok and code_ok and other_ok
+
+    except Exception as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+
+def main():
+    """主测试函数"""
+    from app.database import init_db
+
+    init_db()
+
+    print("🧪 限流测试")
+    print("=" * 60)
+
+    tests = [
+        test_sliding_window,
+        test_code_lockout,
+        test_client_limit,
+        test_body_limit,
+        test_shared_store_fallback
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test in tests:
+        if test():
+            passed += 1
+        print()
+
+    print("=" * 60)
+    print(f"📊 测试结果: {passed}/{total} 通过")
+
+    if passed == total:
+        print("🎉 所有测试通过！限流功能正常工作")
+        return True
+    else:
+        print("❌ 部分测试失败，请检查错误信息")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -6,6 +6,8 @@
 
 import requests
 import json
+import os
+import uuid
 import platform
 import hashlib
 import psutil
@@ -22,6 +24,10 @@ class ActivationCodeClient:
             'Content-Type': 'application/json',
             'User-Agent': 'ActivationCodeClient/1.0'
         })
+        # 服务端是否支持 /activate 合并接口（None 表示尚未探测）
+        self._supports_activate = None
+        # 许可令牌验证公钥（JWKS），首次验证时获取
+        self._license_jwks = None
     
     def generate_hardware_fingerprint(self) -> str:
         """生成硬件指纹"""
@@ -54,9 +60,50 @@ class ActivationCodeClient:
             fingerprint_data = json.dumps(fallback_info, sort_keys=True)
             return hashlib.sha256(fingerprint_data.encode()).hexdigest()
     
+    def generate_hardware_components(self) -> Dict[str, str]:
+        """
+        生成各硬件组件哈希（cpu/memory/disk/mac/board）
+        
+        服务端按组件匹配度验证硬件绑定，内存升级、系统补丁等部分变更不会导致绑定失效。
+        无法获取的组件不返回。
+        """
+        values = {}
+        try:
+            values['cpu'] = f"{psutil.cpu_count()}|{platform.machine()}|{platform.processor()}"
+            values['memory'] = str(psutil.virtual_memory().total)
+        except Exception:
+            pass
+        
+        try:
+            values['disk'] = str(psutil.disk_usage(os.path.abspath(os.sep)).total)
+        except Exception:
+            pass
+        
+        mac = uuid.getnode()
+        if not (mac >> 40) & 1:  # 组播位为 1 表示无法读取网卡地址时生成的随机值
+            values['mac'] = '%012X' % mac
+        
+        for path in ('/sys/class/dmi/id/board_serial', '/sys/class/dmi/id/product_uuid'):
+            try:
+                with open(path) as f:
+                    board = f.read().strip()
+                if board:
+                    values['board'] = board
+                    break
+            except OSError:
+                continue
+        
+        return {
+            name: hashlib.sha256(f"{name}:{value}".encode()).hexdigest()
+            for name, value in values.items()
+        }
+    
     def activate_software_license(self, activation_code: str, user_id: str = None) -> Dict[str, Any]:
         """
-        软件激活码激活（传统方式）
+        软件激活码激活
+        
+        优先调用 /activate 合并接口（一次请求完成验证和激活），
+        旧版服务端不支持时回退为 /verify + /use 两次请求。
         
         Args:
             activation_code: 激活码
@@ -65,6 +112,51 @@ class ActivationCodeClient:
         Returns:
             激活结果
         """
+        if self._supports_activate is not False:
+            result = self._activate_combined(activation_code, user_id)
+            if result is not None:
+                self._supports_activate = True
+                return result
+            self._supports_activate = False
+        
+        return self._activate_verify_then_use(activation_code, user_id)
+    
+    def _activate_combined(self, activation_code: str, user_id: str = None) -> Optional[Dict[str, Any]]:
+        """通过 /activate 合并接口激活，服务端不支持该接口时返回 None"""
+        try:
+            activate_url = f"{self.base_url}/api/v1/activation/activate"
+            response = self.session.post(activate_url, json={
+                "code": activation_code,
+                "user_id": user_id
+            })
+            
+            if response.status_code in (404, 405):
+                return None
+            
+            if response.status_code != 200:
+                return {
+                    "success": False,
+                    "message": f"激活失败: HTTP {response.status_code}"
+                }
+            
+            result = response.json()
+            return {
+                "success": result.get("success", False),
+                "message": result.get("message", "激活完成"),
+                "activation_type": "software",
+                "activation_code": result.get("activation_code"),
+                "remaining_activations": result.get("remaining_activations"),
+                "license_token": result.get("license_token")
+            }
+            
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"激活失败: {str(e)}"
+            }
+    
+    def _activate_verify_then_use(self, activation_code: str, user_id: str = None) -> Dict[str, Any]:
+        """传统方式激活：先验证再使用（兼容旧版服务端）"""
         try:
             # 验证激活码
             verify_url = f"{self.base_url}/api/v1/activation/verify/{activation_code}"
@@ -101,7 +193,8 @@ class ActivationCodeClient:
                 "success": use_result.get("success", False),
                 "message": use_result.get("message", "激活完成"),
                 "activation_type": "software",
-                "activation_code": verify_data.get("activation_code")
+                "activation_code": verify_data.get("activation_code"),
+                "license_token": use_result.get("license_token")
             }
             
         except Exception as e:
@@ -130,6 +223,7 @@ class ActivationCodeClient:
             bind_data = {
                 "activation_code": activation_code,
                 "hardware_fingerprint": hardware_fingerprint,
+                "hardware_components": self.generate_hardware_components(),
                 "user_id": user_id
             }
             
@@ -154,7 +248,8 @@ class ActivationCodeClient:
                 "message": "硬件绑定激活成功",
                 "activation_type": "hardware_bound",
                 "binding_info": bind_result.get("binding_info"),
-                "hardware_fingerprint": hardware_fingerprint
+                "hardware_fingerprint": hardware_fingerprint,
+                "license_token": bind_result.get("license_token")
             }
             
         except Exception as e:
@@ -181,7 +276,8 @@ class ActivationCodeClient:
             verify_url = f"{self.base_url}/api/v1/activation/hardware/verify"
             verify_data = {
                 "activation_code": activation_code,
-                "hardware_fingerprint": hardware_fingerprint
+                "hardware_fingerprint": hardware_fingerprint,
+                "hardware_components": self.generate_hardware_components()
             }
             
             verify_response = self.session.post(verify_url, json=verify_data)
@@ -197,7 +293,8 @@ class ActivationCodeClient:
             return {
                 "valid": verify_result.get("valid", False),
                 "message": verify_result.get("message", "验证失败"),
-                "binding_info": verify_result.get("binding_info")
+                "binding_info": verify_result.get("binding_info"),
+                "match_score": verify_result.get("match_score")
             }
             
         except Exception as e:
@@ -230,6 +327,7 @@ class ActivationCodeClient:
             if product_type == "hardware_bound":
                 hardware_fingerprint = self.generate_hardware_fingerprint()
                 request_data["hardware_fingerprint"] = hardware_fingerprint
+                request_data["hardware_components"] = self.generate_hardware_components()
             
             # 调用统一激活接口
             activate_url = f"{self.base_url}/api/v1/activation/unified/activate"
@@ -280,6 +378,89 @@ class ActivationCodeClient:
                 "message": f"获取产品列表失败: {str(e)}"
             }
     
+    def validate_license_token(self, license_token: str, hardware_fingerprint: str = None,
+                               hardware_components: Dict[str, str] = None) -> Dict[str, Any]:
+        """
+        本地验证离线许可令牌（启动时使用，无需调用 /verify）
+        
+        公钥只在首次验证时从服务端获取，之后可以离线验证。硬件绑定令牌的完整指纹不一致时，
+        按令牌中的组件哈希计算匹配度，达到令牌中的容差即视为同一设备。
+        
+        Args:
+            license_token: 激活时返回的许可令牌
+            hardware_fingerprint: 当前设备的硬件指纹（硬件绑定令牌必需）
+            hardware_components: 当前设备的组件哈希（默认在本机生成）
+            
+        Returns:
+            验证结果，needs_refresh 为 True 时应调用 refresh_license_token
+        """
+        try:
+            from jose import JWTError, jwt
+        except ImportError:
+            return {
+                "valid": False,
+                "message": "本地验证需要安装 python-jose[cryptography]"
+            }
+        
+        try:
+            if self._license_jwks is None:
+                response = self.session.get(f"{self.base_url}/api/v1/activation/license/jwks")
+                if response.status_code != 200:
+                    return {
+                        "valid": False,
+                        "message": f"获取验证公钥失败: HTTP {response.status_code}"
+                    }
+                self._license_jwks = response.json()
+            
+            claims = jwt.decode(license_token, self._license_jwks, algorithms=["ES256"], options={"verify_aud": False})
+        except JWTError as e:
+            return {
+                "valid": False,
+                "message": f"许可令牌无效: {str(e)}"
+            }
+        except Exception as e:
+            return {
+                "valid": False,
+                "message": f"许可令牌验证失败: {str(e)}"
+            }
+        
+        if claims.get("hwf") and claims["hwf"] != (hardware_fingerprint or self.generate_hardware_fingerprint()):
+            bound = claims.get("hwc") or {}
+            current = hardware_components if hardware_components is not None else self.generate_hardware_components()
+            score = sum(1 for name, value in bound.items() if current.get(name) == value) / len(bound) if bound else 0.0
+            if score < (claims.get("tol") or 1.0):
+                return {
+                    "valid": False,
+                    "message": "许可令牌与当前设备不匹配"
+                }
+        
+        return {
+            "valid": True,
+            "message": "许可令牌有效",
+            "claims": claims,
+            "needs_refresh": claims.get("rfa", 0) <= datetime.now().timestamp()
+        }
+    
+    def refresh_license_token(self, license_token: str) -> Dict[str, Any]:
+        """刷新离线许可令牌"""
+        try:
+            refresh_url = f"{self.base_url}/api/v1/activation/license/refresh"
+            response = self.session.post(refresh_url, json={"license_token": license_token})
+            
+            if response.status_code != 200:
+                return {
+                    "success": False,
+                    "message": f"刷新失败: HTTP {response.status_code}"
+                }
+            
+            return response.json()
+            
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"刷新失败: {str(e)}"
+            }
+    
     def get_security_info(self) -> Dict[str, Any]:
         """获取安全信息"""
         try: